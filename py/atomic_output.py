@@ -0,0 +1,121 @@
+import os
+import sys
+import hashlib
+import threading
+
+from merge_cache import file_digest
+
+# ===============================
+# 配置区：所有生成脚本共用的输出层
+# ===============================
+# 本次运行真正变化过的输出逐行追加到这里，工作流据此决定要不要 git add / commit / push
+CHANGES_FILE = os.environ.get("OUTPUT_CHANGES_FILE", os.path.join(".cache", "changed_outputs.txt"))
+
+_changes_lock = threading.Lock()
+_marked = set()
+
+
+def mark_changed(path):
+    """登记一个变化过的输出（新建、改写、追加或删除）；同一进程内每个路径只登记一次"""
+    path = os.path.normpath(path)
+    with _changes_lock:
+        if path in _marked:
+            return
+        _marked.add(path)
+        os.makedirs(os.path.dirname(CHANGES_FILE) or ".", exist_ok=True)
+        with open(CHANGES_FILE, "a", encoding="utf-8") as f:
+            f.write(path + "\n")
+
+
+def changed_outputs(path=CHANGES_FILE):
+    """本次运行登记过的输出（去重，保持登记顺序）"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return list(dict.fromkeys(line.strip() for line in f if line.strip()))
+    except OSError:
+        return []
+
+
+class AtomicWriter:
+    """
+    with AtomicWriter(path) as f: f.write(...)
+    先写到同目录的临时文件，边写边算哈希；退出时与现有文件比较，
+    内容相同则丢弃临时文件，不同则 os.replace 原子替换并登记变化。
+    中途出错时原文件保持不动，下游永远拿不到写了一半的文件。
+    退出后 sha1 / size 为写入内容的哈希与字节数（无论文件是否被替换）。
+    """
+
+    def __init__(self, path, encoding="utf-8"):
+        self.path = path
+        self.encoding = encoding
+        self.changed = False
+        self.sha1 = None
+        self.size = 0
+        directory, name = os.path.split(path)
+        self._tmp = os.path.join(directory, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        self._hash = hashlib.sha1()
+        self._size = 0
+        self._fp = None
+
+    def __enter__(self):
+        self._fp = open(self._tmp, "wb")
+        return self
+
+    def write(self, text):
+        data = text if isinstance(text, bytes) else text.encode(self.encoding)
+        self._hash.update(data)
+        self._size += len(data)
+        self._fp.write(data)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def __exit__(self, exc_type, exc, tb):
+        self._fp.close()
+        if exc_type is not None:
+            os.remove(self._tmp)
+            return False
+        self.sha1 = self._hash.hexdigest()
+        self.size = self._size
+        try:
+            same = os.path.getsize(self.path) == self._size and file_digest(self.path) == self.sha1
+        except OSError:
+            same = False
+        if same:
+            os.remove(self._tmp)
+        else:
+            os.replace(self._tmp, self.path)
+            mark_changed(self.path)
+            self.changed = True
+        return False
+
+
+def write_text(path, text, encoding="utf-8"):
+    """整段文本写入 path；返回是否真的改动了文件"""
+    with AtomicWriter(path, encoding) as f:
+        f.write(text)
+    return f.changed
+
+
+def remove(path):
+    """删除输出文件并登记；文件本来就不存在时返回 False"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return False
+    mark_changed(path)
+    return True
+
+
+def main():
+    """python py/atomic_output.py：列出本次运行变化过的输出；没有变化时退出码为 1，供工作流跳过提交"""
+    changed = changed_outputs()
+    for path in changed:
+        print(path)
+    print(f"📝 本次共 {len(changed)} 个输出有变化")
+    sys.exit(0 if changed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import os
+import json
+import random
+
+# ===============================
+# 配置区：基准测试用的合成语料（形状照搬仓库里真实的 zubo / hotel 文件）
+# ===============================
+# 1× 对应当前仓库规模：112 个组播文件（平均 ~235 条），85 个酒店文件（平均 ~98 条）
+ZUBO_FILES = 112
+ZUBO_CHANNELS = 235
+HOTEL_FILES = 85
+HOTEL_CHANNELS = 98
+MARKER = "corpus.json"
+
+HEADER = '#EXTM3U x-tvg-url="https://fy.188766.xyz/e.xml" tvg-shift="0"\n'
+LOGO = "https://gcore.jsdelivr.net/gh/taksssss/tv/icon/.png"
+
+REGIONS = [
+    ("上海", "上海市", ["杨浦区", "浦东新区", "闵行区"], ["电信", "联通", "移动"]),
+    ("北京", "北京市", ["朝阳区", "海淀区", "北京市"], ["电信", "联通", "移动"]),
+    ("天津", "天津市", ["滨海新区", "南开区"], ["联通", "电信"]),
+    ("重庆", "重庆市", ["九龙坡区", "渝北区"], ["电信", "联通"]),
+    ("广东", "广东省", ["中山市", "广州市天河区", "梅州市五华县"], ["电信", "移动"]),
+    ("江苏", "江苏省", ["扬州市邗江区", "南京市", "苏州市"], ["电信", "联通"]),
+    ("浙江", "浙江省", ["杭州市", "宁波市", "温州市"], ["电信", "联通"]),
+    ("陕西", "陕西省", ["西安市长安区", "宝鸡市"], ["电信", "联通"]),
+    ("四川", "四川省", ["成都市", "绵阳市"], ["电信", "移动"]),
+    ("河南", "河南省", ["郑州市", "洛阳市"], ["联通", "电信"]),
+    ("湖北", "湖北省", ["武汉市", "宜昌市"], ["电信"]),
+    ("湖南", "湖南省", ["长沙市", "株洲市"], ["电信"]),
+    ("吉林", "吉林省", ["吉林市", "松原市"], ["联通"]),
+    ("宁夏", "宁夏", ["中卫市沙坡头区", "银川市"], ["电信"]),
+]
+CCTV = ["CCTV1-综合", "CCTV2-财经", "CCTV3-综艺", "CCTV4-国际", "CCTV5-体育", "CCTV5+", "CCTV6-电影", "CCTV7-军农",
+        "CCTV8-电视剧", "CCTV9-纪录", "CCTV10-科教", "CCTV11", "CCTV12-社会与法", "CCTV13-新闻", "CCTV14", "CCTV15",
+        "CCTV16", "CCTV17", "CCTV4K", "CGTN"]
+SATELLITE = ["安徽", "湖南", "湖北", "河南", "江苏", "北京", "山东", "广东", "重庆", "辽宁", "山西", "东方", "江西", "浙江",
+             "黑龙江", "四川", "深圳", "广西", "河北", "天津", "陕西", "云南", "宁夏", "贵州", "吉林", "东南", "甘肃", "青海"]
+EXTRA = ["百事通画面", "信源检修", "全纪实", "东方购物", "BesTV4K电影", "BesTV4K动画", "上海新闻综合", "都市频道", "少儿频道"]
+# 显示名后缀：真实文件里同一个台常以 HD / 高清 / SD / 标清 / 4K 多种写法出现
+ZUBO_SUFFIXES = ["", "", "", "HD", "高清", "SD", "标清", "4K", "超清"]
+HOTEL_URLS = [
+    (60, "/tsfile/live/{id}_1.m3u8?key=txiptv&amp;playlive=1&amp;authid=0"),
+    (17, "/hls/{n}/index.m3u8"),
+    (3, "/tsfile/live/{id}_1.m3u8"),
+    (1, "/tsfile/live/faacts/{id}_1.m3u8?key=txiptv&amp;playlive=1&amp;authid=0"),
+    (1, "/tsfile/live/{id}_1.m3u8?key=txiptv&amp;playlive=1&amp;down=1"),
+]
+
+
+def channel_names():
+    return CCTV + [f"{s}卫视" for s in SATELLITE] + [f"{s}卫视4K" for s in SATELLITE[:10]] + EXTRA
+
+
+def random_ip(rng):
+    return f"{rng.randint(1, 223)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+
+
+def zubo_file(rng, isp_groups):
+    """一个组播文件：同一运营商的服务器共用一套组播地址，频道顺序与后缀随机"""
+    province, prefix, districts, carriers = rng.choice(REGIONS)
+    isp = f"{province}{rng.choice(carriers)}"
+    group = f"{prefix}{rng.choice(districts)}组播 {isp}"
+    ip, port = random_ip(rng), rng.choice([8188, 8222, 8888, 4000, 6636, 9999, 8001, 55555, 10000])
+    groups = isp_groups.setdefault(isp, {})
+    names = channel_names()
+    lines = [HEADER]
+    for _ in range(max(1, int(rng.gauss(ZUBO_CHANNELS, 60)))):
+        base = rng.choice(names)
+        name = base + rng.choice(ZUBO_SUFFIXES)
+        addr = groups.get(base)
+        if addr is None or rng.random() < 0.1:
+            addr = groups[base] = f"{rng.choice([233, 239])}.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}:{rng.choice([5140, 8000, 1234])}"
+        lines.append(f'#EXTINF:-1 tvg-id="{name}" tvg-logo="{LOGO}" group-title="{group}",{name}\n')
+        lines.append(f"http://{ip}:{port}/{'rtp' if rng.random() < 0.97 else 'udp'}/{addr}\n")
+    name = f"{isp}{rng.choice('-_')}{ip.replace('.', '_')}{rng.choice('-_')}{port}.m3u"
+    return name, "".join(lines)
+
+
+def hotel_file(rng):
+    """一个酒店文件：CCTV + 卫视顺序编号，URL 形状按真实占比抽取"""
+    province, prefix, districts, carriers = rng.choice(REGIONS)
+    isp = f"{province}{rng.choice(carriers)}"
+    group = f"{prefix}{rng.choice(districts)}酒店 {isp}" if rng.random() < 0.8 else isp
+    ip, port = random_ip(rng), rng.choice([85, 808, 9901, 9003, 8181, 9999, 80])
+    template = rng.choices([t for _, t in HOTEL_URLS], weights=[w for w, _ in HOTEL_URLS])[0]
+    names = CCTV + [f"{s}卫视" for s in SATELLITE] + EXTRA
+    lines = [HEADER]
+    for i in range(max(1, int(rng.gauss(HOTEL_CHANNELS, 25)))):
+        name = names[i % len(names)] + ("" if i < len(names) else f"{i // len(names)}")
+        host = f"http://{ip}:{port}" if port != 80 else f"http://{ip}"
+        url = host + template.format(id=f"{i + 1:04d}", n=i + 1)
+        lines.append(f'#EXTINF:-1 tvg-id="{name}" tvg-logo="{LOGO}" group-title="{group}",{name}\n')
+        lines.append(url + "\n")
+    name = f"{isp}_{ip}_{port}.m3u" if port != 80 else f"{isp}_{ip}.m3u"
+    return name, "".join(lines)
+
+
+def generate(directory, scale=1, seed=2024):
+    """
+    在 directory 下生成 zubo/ 与 hotel/ 两套语料（规模 = 当前仓库 × scale）。
+    同一 seed + scale 的语料已存在时直接复用。返回语料统计。
+    """
+    marker = os.path.join(directory, MARKER)
+    try:
+        with open(marker, "r", encoding="utf-8") as f:
+            stats = json.load(f)
+        if stats.get("seed") == seed and stats.get("scale") == scale:
+            return stats
+    except (OSError, ValueError):
+        pass
+
+    rng = random.Random(f"{seed}:{scale}")
+    stats = {"seed": seed, "scale": scale}
+    isp_groups = {}
+    for kind, count, make in (("zubo", ZUBO_FILES * scale, lambda: zubo_file(rng, isp_groups)),
+                              ("hotel", HOTEL_FILES * scale, lambda: hotel_file(rng))):
+        out = os.path.join(directory, kind)
+        os.makedirs(out, exist_ok=True)
+        for old in os.listdir(out):
+            if old.endswith(".m3u"):
+                os.remove(os.path.join(out, old))
+        files = lines = size = 0
+        while files < count:
+            name, text = make()
+            path = os.path.join(out, name)
+            if os.path.exists(path):
+                continue
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+            files += 1
+            lines += text.count("\n")
+            size += len(text.encode("utf-8"))
+        stats[kind] = {"files": files, "lines": lines, "bytes": size}
+
+    with open(marker, "w", encoding="utf-8") as f:
+        json.dump(stats, f, ensure_ascii=False)
+    return stats
@@ -0,0 +1,185 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import statistics
+import subprocess
+import contextlib
+
+try:
+    import resource
+except ImportError:  # Windows 上没有 resource，峰值内存记为 None
+    resource = None
+
+import bench_corpus
+
+# ===============================
+# 配置区：解析 / 合并链路的基准测试
+# ===============================
+PY_DIR = os.path.dirname(os.path.abspath(__file__))
+WORK_DIR = os.path.join(".cache", "bench")
+RESULT_FILE = "bench_results.json"
+SCALES = (1, 10, 100)
+REPEAT = 3
+SEED = 2024
+
+# 阶段名 -> (语料, 冷启动前要删掉的状态/产物)；*_warm 紧跟在对应的 *_cold 之后运行，复用其增量状态
+STAGES = {
+    "parse_zubo": ("zubo", []),
+    "parse_hotel": ("hotel", []),
+    "merge_zubo_cold": ("zubo", [".cache/merge_zubo.json", "zubo/zuboall.m3u", "zubo/zuboall_backup.m3u",
+                                "zubo/zuboall.m3u.gz", "zubo/shards", "zubo/delta"]),
+    "merge_zubo_warm": ("zubo", None),
+    "merge_m3u_cold": ("hotel", [".cache/merge_m3u.json", "hotel/hotel_all.m3u", "hotel/hotel_all.m3u.gz",
+                                "hotel/shards", "hotel/delta"]),
+    "merge_m3u_warm": ("hotel", None),
+    "zubo_rtp_cold": ("zubo", [".cache/rtp_index.sqlite", "py/rtp"]),
+    "zubo_rtp_warm": ("zubo", None),
+    "hotel_rules_cold": ("hotel", [".cache/hotel_rules.json", "py/hotel"]),
+    "hotel_rules_warm": ("hotel", None),
+}
+MERGED = {"zuboall.m3u", "zuboall_backup.m3u", "hotel_all.m3u"}
+
+
+def parse_all(directory):
+    from m3u_parser import iter_channels
+    count = 0
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".m3u") and name not in MERGED:
+            count += sum(1 for _ in iter_channels(os.path.join(directory, name)))
+    return count
+
+
+def stage_runner(name):
+    """在语料目录内执行一个阶段（模块在 chdir 之后才导入，让它们的相对路径指向语料）"""
+    base = name.rsplit("_", 1)[0] if name.endswith(("_cold", "_warm")) else name
+    if base == "parse_zubo":
+        return lambda: parse_all("zubo")
+    if base == "parse_hotel":
+        return lambda: parse_all("hotel")
+    if base == "merge_zubo":
+        import merge_zubo
+        return merge_zubo.main
+    if base == "merge_m3u":
+        import merge_m3u
+        return merge_m3u.main
+    if base == "zubo_rtp":
+        import zubo_rtp
+        return zubo_rtp.extract_and_classify
+    if base == "hotel_rules":
+        import hotel_rules
+        return hotel_rules.process_hotel_rules
+    raise KeyError(name)
+
+
+def run_child(name, workdir):
+    """子进程入口：只跑一个阶段，单独统计墙钟时间和峰值 RSS，结果以一行 JSON 输出"""
+    os.chdir(workdir)
+    sys.argv = [sys.argv[0]]
+    run = stage_runner(name)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        began = time.perf_counter()
+        run()
+        wall = time.perf_counter() - began
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else None
+    print(json.dumps({"wall_s": wall, "peak_rss_mb": peak}))
+
+
+def reset(workdir, paths):
+    for rel in paths:
+        path = os.path.join(workdir, rel)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+
+def measure(name, workdir):
+    env = dict(os.environ, OUTPUT_CHANGES_FILE=os.path.join(workdir, ".cache", "changed_outputs.txt"), IPTV_EVENTS="0")
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", name, workdir],
+                         check=True, capture_output=True, text=True, env=env).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def bench_scale(scale, stages, repeat, seed, work_dir):
+    workdir = os.path.abspath(os.path.join(work_dir, f"x{scale}"))
+    began = time.perf_counter()
+    corpus = bench_corpus.generate(workdir, scale, seed)
+    print(f"📦 {scale}× 语料: 组播 {corpus['zubo']['files']} 个文件 / {corpus['zubo']['lines']} 行，"
+          f"酒店 {corpus['hotel']['files']} 个文件 / {corpus['hotel']['lines']} 行 ({time.perf_counter() - began:.1f}s)")
+    samples = {name: [] for name in stages}
+    for _ in range(repeat):
+        for name in stages:
+            kind, paths = STAGES[name]
+            if paths is None:
+                cold = name[:-len("_warm")] + "_cold"
+                if cold not in stages:
+                    # 没有单独跑冷启动时，先补跑一次把增量状态建起来
+                    reset(workdir, STAGES[cold][1])
+                    measure(cold, workdir)
+            else:
+                reset(workdir, paths)
+            samples[name].append(measure(name, workdir))
+
+    results = {}
+    for name, runs in samples.items():
+        lines = corpus[STAGES[name][0]]["lines"]
+        walls = [r["wall_s"] for r in runs]
+        wall = statistics.median(walls)
+        peaks = [r["peak_rss_mb"] for r in runs if r["peak_rss_mb"] is not None]
+        results[name] = {"wall_s": round(wall, 4), "walls": [round(w, 4) for w in walls],
+                         "peak_rss_mb": round(max(peaks), 1) if peaks else None,
+                         "lines": lines, "lines_per_s": round(lines / wall) if wall else None}
+        print(f"  ⏱️  {name:<18} {wall:8.3f}s  {results[name]['lines_per_s'] or 0:>10} 行/s  "
+              f"峰值 {results[name]['peak_rss_mb']} MB")
+    return {"scale": scale, "corpus": corpus, "stages": results}
+
+
+def compare(old_path, report):
+    """与之前的结果文件逐阶段对比墙钟时间"""
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = {run["scale"]: run["stages"] for run in json.load(f)["runs"]}
+    print(f"📈 对比 {old_path}（比值 <1 表示变快）")
+    for run in report["runs"]:
+        for name, now in run["stages"].items():
+            before = old.get(run["scale"], {}).get(name)
+            if before and before["wall_s"]:
+                print(f"  {run['scale']:>3}× {name:<18} {before['wall_s']:8.3f}s -> {now['wall_s']:8.3f}s "
+                      f"({now['wall_s'] / before['wall_s']:.2f})")
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        return run_child(sys.argv[2], sys.argv[3])
+
+    parser = argparse.ArgumentParser(description="合成语料上的解析 / 合并基准测试")
+    parser.add_argument("--scales", default=",".join(map(str, SCALES)), help="语料规模倍数，逗号分隔")
+    parser.add_argument("--stages", default=",".join(STAGES), help="要跑的阶段，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="每个阶段重复次数，取中位数")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--work-dir", default=WORK_DIR, help="语料与中间状态目录")
+    parser.add_argument("--output", default=RESULT_FILE, help="结果 JSON")
+    parser.add_argument("--compare", help="与之前的结果 JSON 对比")
+    args = parser.parse_args()
+
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        parser.error(f"未知阶段: {', '.join(unknown)}")
+    report = {
+        "meta": {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "python": platform.python_version(),
+                 "platform": platform.platform(), "seed": args.seed, "repeat": args.repeat},
+        "runs": [bench_scale(int(s), stages, args.repeat, args.seed, args.work_dir) for s in args.scales.split(",")],
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"💾 结果已写入 {args.output}")
+    if args.compare:
+        compare(args.compare, report)
+
+
+if __name__ == "__main__":
+    main()
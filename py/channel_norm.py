@@ -0,0 +1,105 @@
+import re
+from functools import lru_cache
+
+from m3u_parser import ATTR_RE
+
+# ======================
+# 频道名 / 分组归一化引擎（merge_zubo 与 merge_m3u 共用）
+# ======================
+LOGO_BASE_URL = "https://gcore.jsdelivr.net/gh/kenye201/TVlog/img"
+CACHE_SIZE = 16384
+
+ISP_RE = re.compile(r'(电信|联通|移动|广电)')
+CCTV_RE = re.compile(r"(CCTV\d+)", re.I)
+HEAD_RE = re.compile(r'#EXTINF:[^\s,]*')
+# 显示名末尾的清晰度后缀：组播源多了 蓝光 / FHD
+ZUBO_SUFFIX_RE = re.compile(r'([-_\s]?(HD|高清|超清|SD|蓝光|FHD))$', re.I)
+HOTEL_SUFFIX_RE = re.compile(r'([-_\s]?(HD|高清|超清|SD))$', re.I)
+LOGO_REPLACEMENTS = (("-综合", ""), ("综合", ""), (" ", ""), ("中央", "CCTV"))
+
+
+def group_by_city(full):
+    """组播：取运营商前面最后一个词（通常是城市）+ 运营商，如 "杨浦区组播 上海电信" → "上海电信" """
+    m = ISP_RE.search(full)
+    if not m:
+        return None
+    isp = m.group(1)
+    parts = full[:full.find(isp)].strip().split()
+    return f"{parts[-1] if parts else ''}{isp}"
+
+
+def group_by_region(full):
+    """酒店：取前两个字 + 运营商，如 "广西壮族自治区... 广西联通" → "广西联通" """
+    m = ISP_RE.search(full)
+    if not m:
+        return None
+    return f"{full[:2]}{m.group(1)}"
+
+
+class Normalizer:
+    """
+    预编译规则 + LRU 缓存：
+    原始频道名 → (显示名, 台标键)，原始 group-title → [地名][运营商]，
+    并一次性重建整行 #EXTINF。
+    """
+
+    def __init__(self, suffix_re, group_rule, logo_base_url=LOGO_BASE_URL, cache_size=CACHE_SIZE):
+        self.suffix_re = suffix_re
+        self.group_rule = group_rule
+        self.logo_base_url = logo_base_url
+        self.name_info = lru_cache(maxsize=cache_size)(self._name_info)
+        self.group_info = lru_cache(maxsize=cache_size)(self._group_info)
+        self.rewrite = lru_cache(maxsize=cache_size)(self._rewrite)
+
+    def _name_info(self, raw_name):
+        """返回 (显示名, 台标键)"""
+        display_name = self.suffix_re.sub('', raw_name).strip()
+        clean = display_name
+        for old, new in LOGO_REPLACEMENTS:
+            clean = clean.replace(old, new)
+        cctv = CCTV_RE.search(clean)
+        if cctv:
+            clean = cctv.group(1).upper()
+        return display_name, clean
+
+    def _group_info(self, full):
+        return self.group_rule(full)
+
+    def logo_url(self, logo_key):
+        return f"{self.logo_base_url}/{logo_key}.png"
+
+    def _rewrite(self, line):
+        """清洗组名、显示名，并注入/覆盖 tvg-id 与 tvg-logo"""
+        if not line.startswith("#EXTINF"):
+            return line
+        head = HEAD_RE.match(line).group(0)
+        attrs = []
+        last_end = len(head)
+        for m in ATTR_RE.finditer(line, last_end):
+            attrs.append([m.group(1), m.group(2)])
+            last_end = m.end()
+        comma = line.find(",", last_end)
+        raw_name = line[comma + 1:].strip() if comma != -1 else ""
+
+        for attr in attrs:
+            if attr[0] == "group-title":
+                group = self.group_info(attr[1])
+                if group is not None:
+                    attr[1] = group
+
+        if raw_name:
+            display_name, logo_key = self.name_info(raw_name)
+            fixed = {"tvg-id": display_name, "tvg-logo": self.logo_url(logo_key)}
+            present = {attr[0] for attr in attrs}
+            front = [[key, value] for key, value in fixed.items() if key not in present]
+            for attr in attrs:
+                if attr[0] in fixed:
+                    attr[1] = fixed[attr[0]]
+            attrs = front + attrs
+            tail = f",{display_name}"
+        else:
+            tail = line[comma:] if comma != -1 else ""
+
+        body = " ".join(f'{key}="{value}"' for key, value in attrs)
+        return f"{head} {body}{tail}" if body else f"{head}{tail}"
+
@@ -1,8 +1,11 @@
 import os
-import re
-import requests
-import concurrent.futures
-import random   # ← 这里添加了！必须导入
+
+from liveness import check_files
+from stream_probe import probe_stream
+from probe_cache import ProbeCache
+from history_store import HistoryStore
+import atomic_output
+from merge_zubo import MERGED_FILES
 
 # ===============================
 # 配置区（针对你的组播目录）
@@ -10,56 +13,29 @@ import random   # ← 这里添加了！必须导入
 M3U_DIR = "zubo"         # 你的组播输出目录
 SAMPLE_COUNT = 3                   # 每个文件只抽测 3 个链接（节约资源）
 CHECK_TIMEOUT = 15                  # 超时时间（组播延迟高，8秒足够）
+MAX_CONNECTIONS = 32               # 所有文件一起并发检测时的全局连接上限
+PER_HOST_LIMIT = 2                 # 同一上游 host:port 的并发上限
+HISTORY_DIR = os.path.join(M3U_DIR, "history")   # 与扫描脚本共用的历史目录（本脚本写 cleanup_zubo 分段）
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 }
 
 def check_link(url):
-    try:
-        # 先 HEAD（最快）
-        response = requests.head(url, headers=HEADERS, timeout=CHECK_TIMEOUT, allow_redirects=True)
-        if response.status_code == 200:
-            return True
-        
-        # HEAD 不行再 GET（只读一点点）
-        response = requests.get(url, headers=HEADERS, timeout=CHECK_TIMEOUT, stream=True)
-        response.raw.read(1024)  # 读 1KB 就停
-        return response.status_code == 200
-    except:
-        return False
+    """读一小段数据校验 TS 同步字节（HTML 错误页不再算存活），返回 StreamMetrics"""
+    return probe_stream(url, headers=HEADERS, connect_timeout=CHECK_TIMEOUT, read_timeout=CHECK_TIMEOUT)
 
-def is_m3u_alive(file_path):
-    try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-        
-        if not content.strip() or "#EXTM3U" not in content:
-            print(f"  文件为空或非标准 m3u，判失效")
-            return False
-        
-        # 提取所有 http(s) 链接
-        links = re.findall(r'https?://[^\s\'"]+', content)
-        if not links:
-            print("  无任何链接，判失效")
-            return False
-        
-        # 随机打乱 + 抽样（防止总是测前几个失效的）
-        random.shuffle(links)
-        test_links = links[:SAMPLE_COUNT]
-        
-        print(f"  测试 {len(test_links)} 个链接... ", end="", flush=True)
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=SAMPLE_COUNT) as executor:
-            results = list(executor.map(check_link, test_links))
-        
-        alive = any(results)
-        print("通过" if alive else "全部失效")
-        return alive
-    
-    except Exception as e:
-        print(f"  处理出错: {e} → 判失效")
-        return False
+REASON_TEXT = {
+    "alive": "通过",
+    "dead": "全部失效",
+    "empty": "无任何链接，判失效",
+    "not_m3u": "文件为空或非标准 m3u，判失效",
+    "error": "处理出错 → 判失效",
+}
+
+def report(result):
+    print(f"📄 {os.path.basename(result.path)} ... 测试 {len(result.checked)} 个链接 "
+          f"{REASON_TEXT[result.reason]} {'✅ 保留' if result.alive else '❌ 删除'}", flush=True)
 
 def main():
     if not os.path.exists(M3U_DIR):
@@ -69,26 +45,41 @@ def main():
     print(f"🔍 开始清理失效的 M3U 文件 (目录: {M3U_DIR})...")
     print("-" * 60)
     
-    files = [f for f in os.listdir(M3U_DIR) if f.lower().endswith(".m3u")]
+    # 合并产物（zuboall.m3u 等）引用所有上游，既不该按单个源删除，其结论也不代表单个 ip:port
+    files = [f for f in os.listdir(M3U_DIR) if f.lower().endswith(".m3u") and f not in MERGED_FILES]
     files.sort()  # 按文件名排序，便于查看
     
     removed_count = 0
     kept_count = 0
     
-    for filename in files:
-        file_path = os.path.join(M3U_DIR, filename)
-        print(f"📄 {filename} ... ", end="", flush=True)
-        
-        if is_m3u_alive(file_path):
-            print("✅ 保留")
+    # 所有文件一起并发检测（随机抽样，防止总是测前几个失效的）
+    paths = [os.path.join(M3U_DIR, filename) for filename in files]
+    # 新鲜的历史结论（见 probe_cache 的正/负 TTL）直接复用，不再重复探测
+    cache = ProbeCache()
+    cache.prune()
+    stats = {}
+    results = check_files(paths, check_link, sample=SAMPLE_COUNT, shuffle=True, require_header=True,
+                          max_connections=MAX_CONNECTIONS, per_host=PER_HOST_LIMIT, on_result=report, stats=stats,
+                          cache=cache)
+    cache.close()
+    print(f"🔗 {stats['files']} 个文件共引用 {stats['hosts']} 个上游 host:port，实际探测 {stats['probes']} 次，命中缓存 {stats['cached']} 个")
+    
+    # 检测结论按 host 写回历史：失效的 ip:port 不再被扫描脚本当作"已存"跳过
+    history = HistoryStore(HISTORY_DIR, "cleanup_zubo")
+    verdicts = {}
+    for file_path in paths:
+        result = results[file_path]
+        verdicts.update(result.verdicts)
+        if result.alive:
             kept_count += 1
         else:
-            print("❌ 删除")
-            os.remove(file_path)
+            atomic_output.remove(file_path)
             removed_count += 1
+    history.record_verdicts(verdicts)
+    history.compact()
     
     print("-" * 60)
-    print(f"\n✨ 清理完成！")
+    print("\n✨ 清理完成！")
     print(f"  总文件数: {len(files)}")
     print(f"  保留有效: {kept_count}")
     print(f"  删除失效: {removed_count}")
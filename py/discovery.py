@@ -0,0 +1,190 @@
+import os
+import re
+import time
+import base64
+import sqlite3
+import threading
+
+# ===============================
+# 配置区：目标发现与持久化工作队列（zubo_final / hotel / zubobsk 共用）
+# ===============================
+LOCAL_SOURCE = "data/shushu_home.html"
+QUEUE_FILE = os.path.join(".cache", "work_queue.sqlite")
+LEASE_SECONDS = 3600          # 取走后超过该时长仍未回报的目标，视为扫描中断，重新放回队列
+RETRY_AFTER = 24 * 3600       # 扫过但没找到开放端口的目标，隔这么久才再次入队
+KINDS = ("hotel", "multicast")
+
+# 页面每行：gotoIP('<base64 ip>', 'hotel'|'multicast') + 节目数 / 类型 / 上线时间 / 更新时间 / 状态
+ROW_RE = re.compile(r"gotoIP\('([^']+)',\s*'(hotel|multicast)'\)(.*?)</tr>", re.S)
+CELL_RE = re.compile(r'data-label="([^":]+):?">(.*?)</td>', re.S)
+TAG_RE = re.compile(r"<[^>]+>")
+IP_RE = re.compile(r"^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue (
+    kind        TEXT NOT NULL,
+    ip          TEXT NOT NULL,
+    priority    REAL NOT NULL,
+    label       TEXT,
+    isp         TEXT,
+    state       TEXT NOT NULL,   -- pending / taken / done
+    found       INTEGER,
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    taken_at    REAL,
+    done_at     REAL,
+    PRIMARY KEY (kind, ip)
+)
+"""
+
+
+class Target:
+    """页面上的一个扫描目标"""
+    __slots__ = ("ip", "kind", "channels", "label", "isp", "online", "updated", "status", "position")
+
+    def __init__(self, ip, kind, channels=0, label="", online="", updated="", status="", position=0):
+        self.ip = ip
+        self.kind = kind            # hotel / multicast
+        self.channels = channels    # 节目数
+        self.label = label          # 类型，如 "广东省梅州市五华县酒店 广东电信"
+        self.isp = label.split()[-1] if label.split() else ""   # 地区运营商，如 "广东电信"
+        self.online = online        # 上线时间
+        self.updated = updated      # 更新时间
+        self.status = status        # 新上线 / ...
+        self.position = position    # 在页面中的位置
+
+    def priority(self):
+        """越大越先扫：新上线 > 更新时间新 > 节目数多 > 页面靠前"""
+        return ((1 if "新" in self.status else 0) * 1e12
+                + parse_time(self.updated) / 10
+                + min(self.channels, 999) * 1e-3
+                - self.position * 1e-6)
+
+    def __repr__(self):
+        return f"Target({self.kind}:{self.ip}, {self.isp}, {self.channels})"
+
+
+def parse_time(text):
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M"):
+        try:
+            return time.mktime(time.strptime(text.strip(), fmt))
+        except ValueError:
+            continue
+    return 0.0
+
+
+def decode_ip(b64_str):
+    try:
+        ip = base64.b64decode(b64_str + "=" * (-len(b64_str) % 4)).decode("utf-8")
+    except Exception:
+        return None
+    return ip if IP_RE.match(ip) else None
+
+
+def parse_targets(html, kinds=KINDS):
+    """一次扫描整页，解码所有 gotoIP 目标并带上类型与表格信息；按 (kind, ip) 去重，保持页面顺序"""
+    targets = []
+    seen = set()
+    for position, m in enumerate(ROW_RE.finditer(html)):
+        kind = m.group(2)
+        ip = decode_ip(m.group(1))
+        if ip is None or kind not in kinds or (kind, ip) in seen:
+            continue
+        seen.add((kind, ip))
+        cells = {k.strip(): TAG_RE.sub("", v).strip() for k, v in CELL_RE.findall(m.group(3))}
+        channels = cells.get("节目数", "")
+        targets.append(Target(ip, kind, int(channels) if channels.isdigit() else 0, cells.get("类型", ""),
+                              cells.get("上线时间", ""), cells.get("更新时间", ""), cells.get("状态", ""), position))
+    return targets
+
+
+def load_targets(path=LOCAL_SOURCE, kinds=KINDS):
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_targets(f.read(), kinds)
+
+
+class WorkQueue:
+    """
+    SQLite 持久队列：按 (kind, ip) 唯一，按优先级出队。
+    take() 以事务方式领取，多个扫描进程/线程可同时消费；
+    领取后长时间未 done() 的目标会在下次 take() 时重新放出。
+    """
+
+    def __init__(self, path=QUEUE_FILE, lease=LEASE_SECONDS, retry_after=RETRY_AFTER):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lease = lease
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(SCHEMA)
+
+    def push(self, targets, history=None):
+        """
+        入队并刷新优先级。已在 history 里有可用记录的跳过；
+        扫过没找到的，RETRY_AFTER 之内不重新入队。返回新入队（或重新入队）的数量。
+        """
+        now = time.time()
+        added = 0
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for t in targets:
+                    if history is not None and history.known(t.ip):
+                        continue
+                    row = self._db.execute("SELECT state, done_at FROM queue WHERE kind=? AND ip=?",
+                                           (t.kind, t.ip)).fetchone()
+                    if row is None:
+                        self._db.execute(
+                            "INSERT INTO queue (kind, ip, priority, label, isp, state, enqueued_at) "
+                            "VALUES (?, ?, ?, ?, ?, 'pending', ?)",
+                            (t.kind, t.ip, t.priority(), t.label, t.isp, now))
+                        added += 1
+                    elif row[0] == "done" and now - (row[1] or 0) >= self.retry_after:
+                        self._db.execute(
+                            "UPDATE queue SET state='pending', priority=?, label=?, isp=?, enqueued_at=? "
+                            "WHERE kind=? AND ip=?", (t.priority(), t.label, t.isp, now, t.kind, t.ip))
+                        added += 1
+                    elif row[0] == "pending":
+                        self._db.execute("UPDATE queue SET priority=?, label=?, isp=? WHERE kind=? AND ip=?",
+                                         (t.priority(), t.label, t.isp, t.kind, t.ip))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return added
+
+    def take(self, kind, budget):
+        """按优先级领取最多 budget 个目标，返回 [(ip, isp), ...]"""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("UPDATE queue SET state='pending' WHERE state='taken' AND taken_at < ?",
+                                 (now - self.lease,))
+                rows = self._db.execute(
+                    "SELECT ip, isp FROM queue WHERE kind=? AND state='pending' "
+                    "ORDER BY priority DESC LIMIT ?", (kind, max(0, budget))).fetchall()
+                self._db.executemany(
+                    "UPDATE queue SET state='taken', taken_at=?, attempts=attempts+1 WHERE kind=? AND ip=?",
+                    [(now, kind, ip) for ip, _ in rows])
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return rows
+
+    def done(self, kind, ip, found):
+        with self._lock:
+            self._db.execute("UPDATE queue SET state='done', found=?, done_at=? WHERE kind=? AND ip=?",
+                             (int(bool(found)), time.time(), kind, ip))
+
+    def pending(self, kind):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM queue WHERE kind=? AND state='pending'",
+                                    (kind,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
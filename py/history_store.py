@@ -0,0 +1,243 @@
+import os
+import time
+import threading
+
+import atomic_output
+
+try:
+    import fcntl
+except ImportError:  # Windows 本地调试时没有 fcntl，退化为进程内锁
+    fcntl = None
+
+# ===============================
+# 配置区：扫描 / 清理历史（替代 history.txt / hotel_history.txt）
+# ===============================
+HISTORY_TTL = 7 * 24 * 3600     # 每条记录自最后一次成功/失败起的有效期（秒），过期视为从未见过
+SEGMENT_SUFFIX = ".tsv"
+LOCK_NAME = ".lock"
+COLUMNS = ("key", "first_seen", "last_seen", "successes", "failures", "last_success", "last_failure", "expires")
+
+# 存储模型：目录下每个写入方（脚本）一个追加日志分段 <writer>.tsv，每行是一条增量记录；
+# 读取时把所有分段按 ip:port 折叠成一条；写入方只追加/压缩自己的分段，
+# 不同 workflow 不会改同一个文件，git 合并不再冲突。同机并发靠目录下的 .lock 文件锁。
+
+
+class HistoryEntry:
+    """一个 ip:port 的历史：首末次见到的时间、成功/失败次数、过期时间"""
+    __slots__ = ("ip", "port", "first_seen", "last_seen", "successes", "failures",
+                 "last_success", "last_failure", "expires")
+
+    def __init__(self, ip, port, first_seen=0, last_seen=0, successes=0, failures=0,
+                 last_success=0, last_failure=0, expires=0):
+        self.ip = ip
+        self.port = int(port)
+        self.first_seen = first_seen
+        self.last_seen = last_seen
+        self.successes = successes
+        self.failures = failures
+        self.last_success = last_success
+        self.last_failure = last_failure
+        self.expires = expires
+
+    @property
+    def key(self):
+        return f"{self.ip}:{self.port}"
+
+    @property
+    def alive(self):
+        """最近一次结论是成功"""
+        return self.successes > 0 and self.last_success >= self.last_failure
+
+    def expired(self, now=None):
+        return self.expires <= (now or time.time())
+
+    def merge(self, other):
+        """折叠另一条增量记录（来自同一分段的后续行或其他分段）"""
+        self.first_seen = min(self.first_seen, other.first_seen) if self.first_seen else other.first_seen
+        self.last_seen = max(self.last_seen, other.last_seen)
+        self.successes += other.successes
+        self.failures += other.failures
+        self.last_success = max(self.last_success, other.last_success)
+        self.last_failure = max(self.last_failure, other.last_failure)
+        self.expires = max(self.expires, other.expires)
+
+    def copy(self):
+        return HistoryEntry(self.ip, self.port, self.first_seen, self.last_seen, self.successes,
+                            self.failures, self.last_success, self.last_failure, self.expires)
+
+    def to_line(self):
+        return "\t".join([self.key] + [str(int(v)) for v in (
+            self.first_seen, self.last_seen, self.successes, self.failures,
+            self.last_success, self.last_failure, self.expires)]) + "\n"
+
+    @classmethod
+    def from_line(cls, line):
+        fields = line.rstrip("\n").split("\t")
+        if len(fields) != len(COLUMNS) or ":" not in fields[0]:
+            return None
+        ip, _, port = fields[0].rpartition(":")
+        try:
+            return cls(ip, int(port), *(int(v) for v in fields[1:]))
+        except ValueError:
+            return None
+
+    def __repr__(self):
+        return f"HistoryEntry({self.key}, ok={self.successes}, fail={self.failures}, alive={self.alive})"
+
+
+def read_segment(path):
+    """读取一个分段，按 ip:port 折叠成 {key: HistoryEntry}"""
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            entry = HistoryEntry.from_line(line)
+            if entry is None:
+                continue
+            if entry.key in entries:
+                entries[entry.key].merge(entry)
+            else:
+                entries[entry.key] = entry
+    return entries
+
+
+class HistoryStore:
+    """
+    按 ip 与 ip:port 的 O(1) 索引：
+      store.known(ip)        该 IP 是否有未过期且最近一次成功的记录（扫描时跳过）
+      store.get(ip, port)    单条 HistoryEntry
+      store.ports(ip)        该 IP 下所有记录
+    success()/failure() 更新索引并追加到本写入方的分段；compact() 折叠本分段并丢弃过期记录。
+    """
+
+    def __init__(self, directory, writer, ttl=HISTORY_TTL):
+        self.directory = directory
+        self.writer = writer
+        self.ttl = ttl
+        self.segment = os.path.join(directory, writer + SEGMENT_SUFFIX)
+        self._lock = threading.Lock()
+        self._by_key = {}
+        self._by_ip = {}
+        self.load()
+
+    # ---------- 读取 ----------
+    def load(self):
+        """重新读取目录下的全部分段"""
+        by_key = {}
+        if os.path.isdir(self.directory):
+            for name in sorted(os.listdir(self.directory)):
+                if not name.endswith(SEGMENT_SUFFIX):
+                    continue
+                for key, entry in read_segment(os.path.join(self.directory, name)).items():
+                    if key in by_key:
+                        by_key[key].merge(entry)
+                    else:
+                        by_key[key] = entry
+        with self._lock:
+            self._by_key = by_key
+            self._by_ip = {}
+            for entry in by_key.values():
+                self._by_ip.setdefault(entry.ip, {})[entry.port] = entry
+
+    def get(self, ip, port):
+        """返回未过期的 HistoryEntry，没有则 None"""
+        entry = self._by_key.get(f"{ip}:{int(port)}")
+        if entry is None or entry.expired():
+            return None
+        return entry
+
+    def ports(self, ip):
+        """该 IP 下所有未过期的记录"""
+        now = time.time()
+        return [e for e in self._by_ip.get(ip, {}).values() if not e.expired(now)]
+
+    def known(self, ip):
+        """该 IP 是否已有可用端口（扫描脚本据此跳过）"""
+        return any(e.alive for e in self.ports(ip))
+
+    def __contains__(self, key):
+        """支持 "ip" 与 "ip:port" 两种写法"""
+        if ":" in key:
+            ip, _, port = key.rpartition(":")
+            return port.isdigit() and self.get(ip, port) is not None
+        return bool(self.ports(key))
+
+    def entries(self, alive_only=False):
+        now = time.time()
+        return [e for e in self._by_key.values()
+                if not e.expired(now) and (e.alive or not alive_only)]
+
+    # ---------- 写入 ----------
+    def record(self, ip, port, ok, ttl=None, now=None):
+        """记一次成功/失败：更新内存索引，并把增量行追加到本分段"""
+        now = int(now or time.time())
+        delta = HistoryEntry(ip, port, now, now, 1 if ok else 0, 0 if ok else 1,
+                             now if ok else 0, 0 if ok else now, now + (self.ttl if ttl is None else ttl))
+        with self._lock:
+            entry = self._by_key.get(delta.key)
+            if entry is None:
+                entry = self._by_key[delta.key] = delta.copy()
+                self._by_ip.setdefault(entry.ip, {})[entry.port] = entry
+            else:
+                entry.merge(delta)
+            with self._file_lock():
+                with open(self.segment, "a", encoding="utf-8") as f:
+                    f.write(delta.to_line())
+            atomic_output.mark_changed(self.segment)
+        return entry
+
+    def success(self, ip, port, ttl=None):
+        return self.record(ip, port, True, ttl)
+
+    def failure(self, ip, port, ttl=None):
+        return self.record(ip, port, False, ttl)
+
+    def record_verdicts(self, verdicts, ttl=None):
+        """按 {"ip:port": 是否存活} 批量记录（清理脚本用 FileResult.verdicts），结论未定或没有端口的跳过"""
+        for host, ok in verdicts.items():
+            ip, _, port = host.rpartition(":")
+            if ok is not None and ip and port.isdigit():
+                self.record(ip, port, ok, ttl)
+
+    def compact(self):
+        """把本分段折叠成每个 ip:port 一行，丢弃已过期的记录；返回 (折叠前行数, 折叠后行数)"""
+        if not os.path.exists(self.segment):
+            return 0, 0
+        with self._lock, self._file_lock():
+            with open(self.segment, "r", encoding="utf-8") as f:
+                before = sum(1 for line in f if line.strip() and not line.startswith("#"))
+            now = time.time()
+            kept = [e for e in read_segment(self.segment).values() if not e.expired(now)]
+            kept.sort(key=lambda e: (e.first_seen, e.key))
+            with atomic_output.AtomicWriter(self.segment) as f:
+                f.write("# " + "\t".join(COLUMNS) + "\n")
+                f.writelines(e.to_line() for e in kept)
+        return before, len(kept)
+
+    def _file_lock(self):
+        return _FileLock(os.path.join(self.directory, LOCK_NAME))
+
+
+class _FileLock:
+    """目录级排他锁（fcntl.flock），保证同机多个进程追加/压缩分段时互不干扰"""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._fd = open(self.path, "a")
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._fd.close()
+        self._fd = None
+        return False
@@ -1,101 +1,80 @@
-import requests
 import re
 import os
-import time
-import base64
-import random
 import sys
 from datetime import datetime
 
+from scanner import run_batch, ProbeError
+from history_store import HistoryStore
+from discovery import load_targets
+import atomic_output
+import http_client
+from http_client import HttpError
+
 # ======================
 # 配置区
 # ======================
 LOCAL_SOURCE = "data/shushu_home.html"
 OUTPUT_DIR = "hotel"
-HISTORY_FILE = os.path.join(OUTPUT_DIR, "hotel_history.txt")
+# 历史记录：每个脚本一个追加分段，按 ip / ip:port 索引，过期时间见 history_store.HISTORY_TTL
+HISTORY_DIR = os.path.join(OUTPUT_DIR, "history")
+HISTORY_WRITER = "hotel"
 TIMEOUT = 25 
+# 先直连做 TCP 建连 + 酒店中间件指纹预筛，只把开放的端口交给限速的代理站（见 prefilter.py）
+PREFILTER = True
+# 每次运行从持久队列里按优先级领取的目标数（原先固定取网页前 6 个）
+SCAN_BUDGET = 6
 
-# 端口字典：根据你刚才的成功日志，85, 9901, 8888 都是大热门
+# 端口字典：根据你刚才的成功日志，85, 9901, 8888 都是大热门（实际顺序由 port_rank 按历史命中重排）
 PRIMARY_PORTS = [9999, 85, 9901, 8888, 8000, 8080, 9001, 8082, 888, 808, 8090, 8081, 50001]
 
 def log(msg):
     print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}")
     sys.stdout.flush()
 
+def probe_hotel(ip, port):
+    """通过代理站尝试下载 ip:port 的酒店源列表，成功返回内容"""
+    url = f"http://iptv.cqshushu.com/index.php?s={ip}:{port}&t=hotel&channels=1&download=m3u"
+    try:
+        headers = {"User-Agent": "Mozilla/5.0", "Referer": "http://iptv.cqshushu.com/"}
+        res = http_client.get(url, "proxy", headers=headers, timeout=TIMEOUT)
+        if res.status_code == 200 and "#EXTINF" in res.text:
+            log(f"  --> {ip}:{port} 【✅ 成功】")
+            return res.text
+        log(f"  --> {ip}:{port} ✕")
+        if "请稍候" in res.text or res.status_code >= 500:
+            # 被拦截/代理出错不代表端口关闭，不能记进断点
+            raise ProbeError("blocked" if res.status_code < 500 else f"http_{res.status_code}")
+    except HttpError as e:
+        log(f"  --> {ip}:{port} ⏰ {e.category}")
+        if e.category != http_client.READ_TIMEOUT:
+            raise ProbeError(e.category)
+    return None
+
+def save_result(ip, port, text, history):
+    m = re.search(r'group-title="([^"]+)"', text)
+    tag = re.sub(r'[\\/:*?"<>|]', '', m.group(1).split()[-1] if m else "Hotel")
+    
+    fn = f"{tag}_{ip.replace('.', '_')}_{port}.m3u"
+    atomic_output.write_text(os.path.join(OUTPUT_DIR, fn), text)
+    
+    history.success(ip, port)
+
 def main():
     if not os.path.exists(OUTPUT_DIR):
         os.makedirs(OUTPUT_DIR)
     
     # 加载黑名单
-    history_ips = set()
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-            for line in f:
-                if ":" in line:
-                    history_ips.add(line.split(':')[0].strip())
+    history = HistoryStore(HISTORY_DIR, HISTORY_WRITER)
     
     if not os.path.exists(LOCAL_SOURCE):
         log("❌ 源码文件缺失"); return
 
     try:
-        with open(LOCAL_SOURCE, "r", encoding="utf-8") as f:
-            content = f.read()
-
-        # 提取所有 IP
-        b64_list = re.findall(r"gotoIP\('([^']+)',\s*'hotel'\)", content)
-        all_found_ips = []
-        for b in b64_list:
-            try:
-                decoded = base64.b64decode(b).decode('utf-8')
-                if re.match(r"^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$", decoded) and decoded not in all_found_ips:
-                    all_found_ips.append(decoded)
-            except: continue
-
-        # 我们只看网页前 6 个 IP
-        target_ips = all_found_ips[:6]
-        log(f"🎯 网页识别到 {len(target_ips)} 个目标 IP")
-
-        for idx, ip in enumerate(target_ips, 1):
-            if ip in history_ips:
-                log(f"📡 [{idx}/6] IP: {ip} >> 【已在黑名单，跳过】")
-                continue
-            
-            log(f"📡 [{idx}/6] 正在探测新 IP: {ip}")
-            success = False
-            
-            for port in PRIMARY_PORTS:
-                # 实时显示正在尝试的端口，不换行
-                sys.stdout.write(f"  --> {port} ")
-                sys.stdout.flush()
-
-                url = f"http://iptv.cqshushu.com/index.php?s={ip}:{port}&t=hotel&channels=1&download=m3u"
-                try:
-                    time.sleep(random.uniform(2.0, 4.0)) # 适度延迟
-                    headers = {"User-Agent": "Mozilla/5.0", "Referer": "http://iptv.cqshushu.com/"}
-                    res = requests.get(url, headers=headers, timeout=TIMEOUT)
-                    
-                    if res.status_code == 200 and "#EXTINF" in res.text:
-                        sys.stdout.write("【✅ 成功】\n")
-                        m = re.search(r'group-title="([^"]+)"', res.text)
-                        tag = re.sub(r'[\\/:*?"<>|]', '', m.group(1).split()[-1] if m else "Hotel")
-                        
-                        fn = f"{tag}_{ip.replace('.', '_')}_{port}.m3u"
-                        with open(os.path.join(OUTPUT_DIR, fn), "w", encoding="utf-8") as f:
-                            f.write(res.text)
-                        
-                        with open(HISTORY_FILE, "a", encoding="utf-8") as hf:
-                            hf.write(f"{ip}:{port}\n")
-                        success = True
-                        break
-                    else:
-                        sys.stdout.write("✕ ")
-                except:
-                    sys.stdout.write("⏰ ")
-                sys.stdout.flush()
-            
-            if not success:
-                print(f"\n❌ {ip} 扫描结束，无响应")
-            time.sleep(5)
+        # 解析页面里所有 hotel 目标，与历史比对后放进持久队列，再按优先级领取 SCAN_BUDGET 个（流程见 scanner.run_batch）
+        targets = load_targets(LOCAL_SOURCE, ("hotel",))
+        run_batch("hotel", HISTORY_WRITER, targets, probe_hotel, PRIMARY_PORTS, history, OUTPUT_DIR,
+                  on_hit=lambda ip, port, text: save_result(ip, port, text, history),
+                  budget=SCAN_BUDGET, prefilter=PREFILTER, log=log)
 
     except Exception as e:
         log(f"❌ 运行异常: {e}")
@@ -1,20 +1,39 @@
 import os
 import re
+from urllib.parse import urlsplit
+from collections import defaultdict
+
+import merge_cache
+import atomic_output
+from m3u_parser import iter_channels
+import m3u_parser
+from port_rank import FILENAME_RE
+import port_rank
 
 # ================= 配置区 ================
 SOURCE_DIR = "hotel"      # 酒店原始 M3U 存放目录
 TARGET_DIR = "py/hotel"     # 规律总结存放目录
 MAPPING_LOG = "py/hotel/酒店提取日志.txt"
+# 索引：源文件 -> (size / mtime / 内容哈希, 生成的规律文件)；源文件没变就不重写
+# 和其他清单一样放在不入库的 .cache 目录（Actions 里由 actions/cache 跨次保留）
+INDEX_FILE = os.path.join(".cache", "hotel_rules.json")
+# 合并产物，不是单个酒店源
+SKIP_FILES = {"hotel_all.m3u"}
 
-def get_unique_filename(base_path):
-    """如果文件已存在，自动增加数字后缀"""
-    if not os.path.exists(base_path):
-        return base_path
-    name, ext = os.path.splitext(base_path)
-    counter = 1
-    while os.path.exists(f"{name}_{counter}{ext}"):
-        counter += 1
-    return f"{name}_{counter}{ext}"
+def output_name(category, filename, url):
+    """
+    规律文件按 分类 + 源文件名里的 ip[_port] 命名，同一个源每次都落到同一个文件。
+    同一台主机可能有多个源（如 吉林联通_122.137.28.229.m3u 与 吉林联通_122.137.28.229_9901.m3u），
+    所以按源文件而不是按频道 URL 的 host:port 取名，免得后一个覆盖前一个；
+    文件名不符合 {运营商}_{ip}[_{port}].m3u 时才退回用第一个频道 URL 的 host:port
+    """
+    m = FILENAME_RE.match(filename)
+    if m:
+        ip = m.group("ip").replace("_", ".")
+        return f"{category}_{ip}_{m.group('port')}.txt" if m.group("port") else f"{category}_{ip}.txt"
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    return f"{category}_{parts.hostname}_{port}.txt"
 
 def extract_id_from_url(url):
     """从 URL 中提取频道数字 ID (例如 0001_1 或 0002)"""
@@ -22,6 +41,51 @@ def extract_id_from_url(url):
     match = re.search(r'/live/(\w+)\.m3u8', url)
     return match.group(1) if match else "未知ID"
 
+def build_rules(file_path):
+    """为一个酒店源整理规律，返回 (规律文件名, 内容行列表)；没有可用频道时返回 (None, None)"""
+    filename = os.path.basename(file_path)
+    # 提取当前文件的 IP
+    ip_match = re.search(r'(\d+\.\d+\.\d+\.\d+)', filename)
+    ip_addr = ip_match.group(1) if ip_match else "UnknownIP"
+
+    try:
+        matches = [(ch.group, ch.name, ch.url) for ch in iter_channels(file_path)
+                   if ch.line and ch.url.startswith("http")]
+
+        if not matches:
+            return None, None
+
+        # 确定生成的分类文件名 (例如: 河南电信.txt)
+        info_sample = matches[0][0]
+        category_name = info_sample.split()[-1] if info_sample.split() else "酒店源"
+        
+        # 准备本次提取的数据列表
+        results = []
+        results.append(f"数据来源 IP: {ip_addr}")
+        results.append(f"详细描述: {info_sample}")
+        results.append("-" * 50)
+        results.append(f"{'频道名':<15} | {'数字ID':<10} | {'完整链接及Key'}")
+
+        for info, ch_name, url in matches:
+            ch_id = extract_id_from_url(url)
+            # 提取完整 URL（含 Key 信息）
+            results.append(f"{ch_name.strip():<15} | {ch_id:<10} | {url.strip()}")
+
+        # 同一个源文件 + 分类固定落到同一个文件名
+        return output_name(category_name, filename, matches[0][2]), results
+
+    except Exception as e:
+        print(f"处理文件 {filename} 出错: {e}")
+        return None, None
+
+def group_by_output(manifest):
+    """清单 → {规律文件名: [源文件名...]}（源文件名有序）"""
+    groups = defaultdict(list)
+    for name, item in sorted(manifest.items()):
+        if item["entries"]:
+            groups[item["entries"]["output"]].append(name)
+    return groups
+
 def process_hotel_rules():
     if not os.path.exists(TARGET_DIR):
         os.makedirs(TARGET_DIR, exist_ok=True)
@@ -30,53 +94,43 @@ def process_hotel_rules():
         print(f"错误: 找不到源目录 {SOURCE_DIR}")
         return
 
-    for filename in os.listdir(SOURCE_DIR):
-        if not filename.endswith(".m3u"):
+    files = sorted(f for f in os.listdir(SOURCE_DIR) if f.endswith(".m3u") and f not in SKIP_FILES)
+    rules = merge_cache.rules_fingerprint(__file__, merge_cache.__file__, m3u_parser.__file__, port_rank.__file__)
+    previous = merge_cache.load_manifest(INDEX_FILE, rules)
+    # 规律文件被手动删掉的源，当作变化重新生成
+    previous = {name: item for name, item in previous.items()
+                if not item["entries"] or os.path.exists(os.path.join(TARGET_DIR, item["entries"]["output"]))}
+
+    # 解析阶段只记下每个源落到哪个规律文件，内容先留在内存里
+    built = {}
+
+    def describe(file_path):
+        output, lines = build_rules(file_path)
+        if output is None:
+            return {}
+        built[os.path.basename(file_path)] = lines
+        return {"output": output}
+
+    index, stats = merge_cache.collect(SOURCE_DIR, files, previous, describe)
+    merge_cache.save_manifest(INDEX_FILE, rules, index)
+
+    # 同一主机的多个源（如 ip.m3u 与 ip_9901.m3u、点号与下划线两种写法）可能落到同一个规律文件：
+    # 按规律文件归组，组里有源变化、增删时整组重写，各源的内容依次拼在一起，不会互相覆盖
+    old_groups = group_by_output(previous)
+    for output, names in group_by_output(index).items():
+        if names == old_groups.get(output) and all(index[n]["sha1"] == previous[n]["sha1"] for n in names):
             continue
-        
-        file_path = os.path.join(SOURCE_DIR, filename)
-        # 提取当前文件的 IP
-        ip_match = re.search(r'(\d+\.\d+\.\d+\.\d+)', filename)
-        ip_addr = ip_match.group(1) if ip_match else "UnknownIP"
-
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # 正则匹配
-            pattern = re.compile(r'#EXTINF:-1.*?group-title="(.*?)",(.*?)\n(http.*)')
-            matches = pattern.findall(content)
-
-            if not matches:
-                continue
-
-            # 确定生成的分类文件名 (例如: 河南电信.txt)
-            info_sample = matches[0][0]
-            category_name = info_sample.split()[-1] if info_sample.split() else "酒店源"
-            
-            # 准备本次提取的数据列表
-            results = []
-            results.append(f"数据来源 IP: {ip_addr}")
-            results.append(f"详细描述: {info_sample}")
-            results.append("-" * 50)
-            results.append(f"{'频道名':<15} | {'数字ID':<10} | {'完整链接及Key'}")
-
-            for info, ch_name, url in matches:
-                ch_id = extract_id_from_url(url)
-                # 提取完整 URL（含 Key 信息）
-                results.append(f"{ch_name.strip():<15} | {ch_id:<10} | {url.strip()}")
-
-            # 写入文件，处理重名
-            base_target = os.path.join(TARGET_DIR, f"{category_name}.txt")
-            final_target = get_unique_filename(base_target)
-            
-            with open(final_target, 'w', encoding='utf-8') as f:
-                f.write("\n".join(results))
-            
-            print(f"✅ 已生成规律文件: {os.path.basename(final_target)}")
-
-        except Exception as e:
-            print(f"处理文件 {filename} 出错: {e}")
+        blocks = [built[n] if n in built else build_rules(os.path.join(SOURCE_DIR, n))[1] for n in names]
+        atomic_output.write_text(os.path.join(TARGET_DIR, output), "\n\n".join("\n".join(b) for b in blocks if b))
+        print(f"✅ 已生成规律文件: {output}" + (f"（合并 {len(names)} 个源）" if len(names) > 1 else ""))
+
+    # 清掉不再对应任何源的规律文件（包括旧版留下的 分类_1.txt、分类_2.txt ...）
+    keep = {item["entries"]["output"] for item in index.values() if item["entries"]}
+    stale = [f for f in os.listdir(TARGET_DIR)
+             if f.endswith(".txt") and f not in keep and os.path.join(TARGET_DIR, f) != MAPPING_LOG]
+    for f in stale:
+        atomic_output.remove(os.path.join(TARGET_DIR, f))
+    print(f"♻️  未变 {stats['reused']} 个 / 重新生成 {stats['parsed']} 个 / 清理 {len(stale)} 个过期规律文件")
 
 if __name__ == "__main__":
     process_hotel_rules()
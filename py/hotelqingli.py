@@ -1,42 +1,26 @@
 import os
-import re
-import requests
-import time
 import sys
 
+from liveness import check_files
+from stream_probe import probe_stream
+from probe_cache import ProbeCache
+from history_store import HistoryStore
+import atomic_output
+
 # ===============================
 # 配置区
 # ===============================
 M3U_DIR = "hotel"
-HISTORY_FILE = os.path.join(M3U_DIR, "hotel_history.txt")
+HISTORY_DIR = os.path.join(M3U_DIR, "history")   # 与 hotel.py 共用的历史目录（本脚本写 hotelqingli 分段）
 SAMPLE_COUNT = 3
 CHECK_TIMEOUT = 10
+MAX_CONNECTIONS = 32           # 所有文件一起并发检测时的全局连接上限
+PER_HOST_LIMIT = 2             # 同一酒店服务器的并发上限
 HEADERS = {"User-Agent": "Mozilla/5.0"}
 
 def check_link(url):
-    """检测单个直播源链接"""
-    try:
-        # stream=True 配合实时读取少量字节，判断是否真正有流
-        response = requests.get(url, headers=HEADERS, timeout=CHECK_TIMEOUT, stream=True)
-        return response.status_code == 200
-    except:
-        return False
-
-def is_m3u_alive(file_path):
-    """判断 m3u 文件是否还有效"""
-    try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-        links = re.findall(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', content)
-        if not links: return False
-        
-        # 顺序抽测，只要有一个通了就返回 True
-        for link in links[:SAMPLE_COUNT]:
-            if check_link(link):
-                return True
-        return False
-    except:
-        return False
+    """检测单个直播源链接：m3u8 会跟到分片，校验 TS 同步字节，返回 StreamMetrics"""
+    return probe_stream(url, headers=HEADERS, connect_timeout=CHECK_TIMEOUT, read_timeout=CHECK_TIMEOUT)
 
 def main():
     if not os.path.exists(M3U_DIR):
@@ -46,40 +30,45 @@ def main():
     print(f"🔍 开始清理酒店源 (目录: {M3U_DIR})...")
     files = [f for f in os.listdir(M3U_DIR) if f.endswith(".m3u")]
     
-    removed_ips = []
     removed_count = 0
 
-    for filename in files:
-        # 实时打印正在处理的文件名，不换行
-        sys.stdout.write(f"📡 正在检测: {filename} ... ")
+    def report(result):
+        # 每个文件一得出结论就实时打印
+        status = "✅ 有效" if result.alive else "❌ 失效 (已删除)"
+        sys.stdout.write(f"📡 检测: {os.path.basename(result.path)} ... {status}\n")
         sys.stdout.flush()
 
-        file_path = os.path.join(M3U_DIR, filename)
-        if not is_m3u_alive(file_path):
-            # 提取 IP
-            parts = filename.split('_')
-            if len(parts) >= 5:
-                ip = ".".join(parts[-5:-1])
-                removed_ips.append(ip)
-            
-            os.remove(file_path)
-            sys.stdout.write("❌ 失效 (已删除)\n")
-            removed_count += 1
-        else:
-            sys.stdout.write("✅ 有效\n")
-        sys.stdout.flush()
-        # 稍微停顿一下，防止请求过快
-        time.sleep(0.5)
+    # 所有文件一起并发检测，每个文件顺序抽测，只要有一个通了就算有效
+    paths = [os.path.join(M3U_DIR, filename) for filename in files]
+    # 新鲜的历史结论（见 probe_cache 的正/负 TTL）直接复用，不再重复探测
+    cache = ProbeCache()
+    cache.prune()
+    stats = {}
+    results = check_files(paths, check_link, sample=SAMPLE_COUNT,
+                          max_connections=MAX_CONNECTIONS, per_host=PER_HOST_LIMIT, on_result=report, stats=stats,
+                          cache=cache)
+    cache.close()
+    print(f"🔗 {stats['files']} 个文件共引用 {stats['hosts']} 个上游 host:port，实际探测 {stats['probes']} 次，命中缓存 {stats['cached']} 个")
 
-    # --- 同步清理黑名单 ---
-    if removed_ips and os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-        with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-            for line in lines:
-                if not any(ip in line for ip in removed_ips):
-                    f.write(line)
-        print(f"♻️  同步清理黑名单记录: {len(removed_ips)} 条")
+    # --- 同步黑名单 ---
+    # 按上游 ip:port 精确记一次失败（旧版按子串删行，会误删前缀相同的其他 IP）；
+    # 最近一次是失败的 IP 不再被 hotel.py 当作"已存"跳过
+    # 按每个 ip:port 自己的结论记录：同一文件里一个 host 通了不代表其他 host 也通
+    history = HistoryStore(HISTORY_DIR, "hotelqingli")
+    verdicts = {}
+    for file_path in paths:
+        result = results[file_path]
+        if os.path.basename(file_path) != "hotel_all.m3u":
+            # 合集引用所有上游，不写入历史
+            verdicts.update(result.verdicts)
+        if not result.alive:
+            atomic_output.remove(file_path)
+            removed_count += 1
+    history.record_verdicts(verdicts)
+    history.compact()
+    failed_hosts = sum(1 for ok in verdicts.values() if ok is False)
+    if failed_hosts:
+        print(f"♻️  同步黑名单记录: {failed_hosts} 个 ip:port 标记为失效")
 
     print(f"\n✨ 清理完成！共删除 {removed_count} 个失效文件。")
 
@@ -0,0 +1,325 @@
+import os
+import time
+import random
+import socket
+import threading
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+import instrument
+
+# ===============================
+# 配置区：共享 HTTP 客户端（所有联网脚本共用）
+# ===============================
+POOL_HOSTS = 64             # 连接池最多缓存多少个 host 的连接
+POOL_PER_HOST = 8           # 每个 host 保持的长连接数（与扫描/检测的单 host 并发对齐即可）
+RETRY_STATUS = {429, 500, 502, 503, 504}
+RETRY_AFTER_CAP = 30.0      # 429/503 带 Retry-After 时最多等待的秒数
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+# 离线替身服务器（py/sim_server.py）：设置后所有请求都经它代理，https 降为 http 以便它看到完整 URL
+SIM_URL = os.environ.get("IPTV_SIM_URL", "").rstrip("/")
+
+# 错误类别
+DNS = "dns"
+CONNECT = "connect"
+CONNECT_TIMEOUT = "connect_timeout"
+READ_TIMEOUT = "read_timeout"
+TLS = "tls"
+HTTP = "http"
+PROTOCOL = "protocol"
+OTHER = "other"
+TRANSIENT = frozenset((DNS, CONNECT, CONNECT_TIMEOUT, READ_TIMEOUT, TLS, HTTP, PROTOCOL))
+# 非幂等请求（POST 等）只在请求肯定没发出去时重试，避免 Cloudflare 重复建记录
+NOT_SENT = frozenset((DNS, CONNECT, CONNECT_TIMEOUT, TLS))
+IDEMPOTENT = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+
+
+class Profile:
+    """一类请求的超时与重试策略"""
+    __slots__ = ("name", "connect", "first_byte", "read", "retries", "backoff_base", "backoff_cap", "retry_on")
+
+    def __init__(self, name, connect, first_byte, read=None, retries=0, backoff_base=0.5, backoff_cap=8.0,
+                 retry_on=TRANSIENT):
+        self.name = name
+        self.connect = connect          # 建连超时（秒）
+        self.first_byte = first_byte    # 发出请求到收到响应头的超时（秒）
+        self.read = read or first_byte  # 读响应体时两次数据之间的超时（秒）
+        self.retries = retries          # 最多重试次数（不含首次）
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.retry_on = frozenset(retry_on)
+
+    @property
+    def timeout(self):
+        return (self.connect, self.first_byte)
+
+
+PROFILES = {
+    # 经 cqshushu 代理站探测 ip:port：代理超时通常意味着目标端口不通，只对代理站本身的网络问题重试
+    "proxy": Profile("proxy", 10, 25, retries=1, retry_on=(DNS, CONNECT, TLS, HTTP)),
+    # fofa / 首页等网页抓取
+    "page": Profile("page", 10, 15, retries=2),
+    # 直播流探测：清理脚本本身会抽测多条，不再重试
+    "stream": Profile("stream", 10, 10, 10, retries=0),
+    # Cloudflare API：必须成功，多重试几次
+    "api": Profile("api", 10, 10, retries=3),
+    # 下载 IP 列表等一次性文件
+    "download": Profile("download", 15, 15, retries=2),
+}
+
+
+class HttpError(Exception):
+    """统一的网络错误：category 为上面的错误类别之一，HTTP 错误带 status"""
+
+    def __init__(self, category, message="", url=None, status=None):
+        super().__init__(f"[{category}] {message}" if message else f"[{category}]")
+        self.category = category
+        self.url = url
+        self.status = status
+
+
+def classify(exc):
+    """把 requests / urllib3 / socket 异常归类"""
+    text = str(exc)
+    if isinstance(exc, HttpError):
+        return exc.category
+    if isinstance(exc, requests.exceptions.ConnectTimeout):
+        return CONNECT_TIMEOUT
+    # 直接读 response.raw（stream_probe）时抛出的是 urllib3 自己的异常
+    if isinstance(exc, (requests.exceptions.ReadTimeout, urllib3.exceptions.ReadTimeoutError, socket.timeout)):
+        return READ_TIMEOUT
+    if isinstance(exc, requests.exceptions.SSLError):
+        return TLS
+    if isinstance(exc, (requests.exceptions.ChunkedEncodingError, requests.exceptions.ContentDecodingError,
+                        requests.exceptions.InvalidURL, requests.exceptions.InvalidSchema,
+                        requests.exceptions.MissingSchema, requests.exceptions.TooManyRedirects,
+                        urllib3.exceptions.ProtocolError, urllib3.exceptions.DecodeError)):
+        return PROTOCOL
+    if isinstance(exc, requests.exceptions.ConnectionError):
+        if ("NameResolution" in text or "Name or service not known" in text
+                or "getaddrinfo failed" in text or "Temporary failure in name resolution" in text):
+            return DNS
+        if "Read timed out" in text:
+            return READ_TIMEOUT
+        return CONNECT
+    if isinstance(exc, requests.exceptions.HTTPError):
+        return HTTP
+    return OTHER
+
+
+def backoff_delay(attempt, profile):
+    """带抖动的指数退避（full jitter）：[0, min(cap, base * 2^attempt)]"""
+    return random.uniform(0, min(profile.backoff_cap, profile.backoff_base * (2 ** attempt)))
+
+
+def retry_after(response):
+    value = response.headers.get("Retry-After", "")
+    return min(float(value), RETRY_AFTER_CAP) if value.isdigit() else None
+
+
+def is_ip(host):
+    try:
+        socket.inet_pton(socket.AF_INET6 if ":" in host else socket.AF_INET, host)
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+class TimedConnectionMixin:
+    """新建连接时把 DNS 解析与 TCP 建连分开计时，写进当前线程的计时槽（复用的长连接不会走到这里）"""
+
+    def _new_conn(self):
+        timing = instrument.current_timing()
+        if timing is None:
+            return super()._new_conn()
+        host = self._dns_host
+        began = time.perf_counter()
+        if not is_ip(host):
+            try:
+                # 先自己解析一次以便单独计时；解析失败时交回 urllib3，由它抛出带类别的异常
+                self._dns_host = socket.getaddrinfo(host, self.port, 0, socket.SOCK_STREAM)[0][4][0]
+            except OSError:
+                pass
+        resolved = time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            self._dns_host = host
+            timing["dns"] += resolved - began
+            timing["connect"] += time.perf_counter() - resolved
+            timing["new_conn"] += 1
+
+
+class TimedHTTPConnection(TimedConnectionMixin, urllib3.connection.HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnectionMixin, urllib3.connection.HTTPSConnection):
+    pass
+
+
+class TimedHTTPConnectionPool(urllib3.HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(urllib3.HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+POOL_CLASSES = {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+
+
+class TimedAdapter(HTTPAdapter):
+    """连接池改用带计时的连接类（直连与经代理两种池都替换）"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = POOL_CLASSES
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        manager.pool_classes_by_scheme = POOL_CLASSES
+        return manager
+
+
+def record(method, url, profile, began, attempt_began, timing, attempts, response=None, error=None):
+    """请求结束（或流式响应关闭）时写一条 http 事件"""
+    now = time.perf_counter()
+    event = {"method": method, "host": urllib3.util.parse_url(url).netloc or "", "profile": profile,
+             "attempts": attempts, "dns": round(timing["dns"], 4), "connect": round(timing["connect"], 4),
+             "reused": timing["new_conn"] == 0, "total": round(now - began, 4)}
+    nbytes = 0
+    if response is not None:
+        headers_at = attempt_began + response.elapsed.total_seconds()
+        event["status"] = response.status_code
+        event["outcome"] = "ok" if response.status_code < 400 else f"http_{response.status_code}"
+        event["first_byte"] = round(max(0.0, headers_at - attempt_began - timing["dns"] - timing["connect"]), 4)
+        event["body"] = round(max(0.0, now - headers_at), 4)
+        nbytes = timing.get("bytes", 0)
+        event["bytes"] = nbytes
+    else:
+        event["outcome"] = error.category
+    instrument.add_io(now - attempt_began, nbytes)
+    instrument.emit("http", **event)
+
+
+class Client:
+    """
+    共享的 requests.Session：按 host 复用长连接（keep-alive），
+    按用途套用超时/重试策略，失败统一抛 HttpError。
+    """
+
+    def __init__(self, pool_hosts=POOL_HOSTS, pool_per_host=POOL_PER_HOST, user_agent=USER_AGENT):
+        self.session = requests.Session()
+        adapter = TimedAdapter(pool_connections=pool_hosts, pool_maxsize=pool_per_host)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = user_agent
+
+    def request(self, method, url, profile="page", retries=None, raise_for_status=False, **kwargs):
+        """
+        发出请求；连接类错误与 429/5xx 按策略退避重试。
+        返回 requests.Response；网络错误（或 raise_for_status=True 时的 4xx/5xx）抛 HttpError。
+        """
+        prof = PROFILES[profile] if isinstance(profile, str) else profile
+        retries = prof.retries if retries is None else retries
+        kwargs.setdefault("timeout", prof.timeout)
+        if SIM_URL:
+            if url.startswith("https://"):
+                url = "http://" + url[len("https://"):]
+            kwargs["proxies"] = {"http": SIM_URL, "https": SIM_URL}
+        idempotent = method.upper() in IDEMPOTENT
+        retry_on = prof.retry_on if idempotent else prof.retry_on & NOT_SENT
+        retry_status = RETRY_STATUS if idempotent else {429}
+        attempt = 0
+        began = time.perf_counter()
+        while True:
+            delay = None
+            timing = instrument.start_timing()
+            attempt_began = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                error = HttpError(classify(e), str(e), url)
+                if attempt >= retries or error.category not in retry_on:
+                    instrument.end_timing()
+                    record(method, url, prof.name, began, attempt_began, timing, attempt + 1, error=error)
+                    raise error
+            else:
+                instrument.end_timing()
+                status = response.status_code
+                if status in retry_status and HTTP in prof.retry_on and attempt < retries:
+                    delay = retry_after(response)
+                    response.close()
+                else:
+                    self._track(response, method, url, prof.name, began, attempt_began, timing, attempt + 1,
+                                kwargs.get("stream", False))
+                    if raise_for_status and status >= 400:
+                        response.close()
+                        raise HttpError(HTTP, f"HTTP {status}", url, status)
+                    return response
+            instrument.end_timing()
+            instrument.sleep(delay if delay is not None else backoff_delay(attempt, prof), "backoff")
+            attempt += 1
+
+    @staticmethod
+    def _track(response, method, url, profile, began, attempt_began, timing, attempts, stream):
+        """非流式请求此时正文已读完，直接记录；流式请求等调用方 close() 时按实际读到的字节数记录"""
+        if not stream:
+            timing["bytes"] = len(response.content)
+            record(method, url, profile, began, attempt_began, timing, attempts, response)
+            return
+        close = response.close
+        state = {"done": False}
+
+        def tracked_close():
+            if not state["done"]:
+                state["done"] = True
+                try:
+                    timing["bytes"] = response.raw.tell()
+                except Exception:
+                    pass
+                record(method, url, profile, began, attempt_began, timing, attempts, response)
+            close()
+
+        response.close = tracked_close
+
+    def get(self, url, profile="page", **kwargs):
+        return self.request("GET", url, profile, **kwargs)
+
+    def post(self, url, profile="page", **kwargs):
+        return self.request("POST", url, profile, **kwargs)
+
+    def delete(self, url, profile="page", **kwargs):
+        return self.request("DELETE", url, profile, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def client():
+    """进程内共享的 Client（懒加载）"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = Client()
+    return _client
+
+
+def get(url, profile="page", **kwargs):
+    return client().get(url, profile, **kwargs)
+
+
+def post(url, profile="page", **kwargs):
+    return client().post(url, profile, **kwargs)
+
+
+def delete(url, profile="page", **kwargs):
+    return client().delete(url, profile, **kwargs)
@@ -0,0 +1,228 @@
+import os
+import sys
+import json
+import time
+import atexit
+import functools
+import threading
+import contextlib
+from collections import defaultdict
+
+# ===============================
+# 配置区：结构化计时埋点（所有联网 / 生成脚本共用）
+# ===============================
+# 每次网络请求、每个流水线阶段各写一行 JSON；进程退出时再写一行本次运行的汇总
+EVENTS_FILE = os.environ.get("IPTV_EVENTS_FILE", os.path.join(".cache", "events.jsonl"))
+ENABLED = os.environ.get("IPTV_EVENTS", "1") != "0"
+MAX_BYTES = 64 * 1024 * 1024    # 本地累积超过这个大小时轮转为 .1
+# 同一次工作流里的多个脚本共用一个运行 ID；本地可用 IPTV_RUN_ID 把几个脚本归为一次
+RUN_ID = os.environ.get("IPTV_RUN_ID") or (
+    f"{os.environ['GITHUB_RUN_ID']}.{os.environ.get('GITHUB_RUN_ATTEMPT', '1')}"
+    if os.environ.get("GITHUB_RUN_ID") else time.strftime("%Y%m%d%H%M%S"))
+SCRIPT = os.path.splitext(os.path.basename(sys.argv[0] or "python"))[0]
+
+_lock = threading.Lock()
+_local = threading.local()
+_fp = None
+_started = time.perf_counter()
+# 本进程的累计量：各类等待（sleep）与真正在做网络 I/O 的时间分开统计
+_counters = defaultdict(float)
+
+
+def _open():
+    global _fp
+    if _fp is None:
+        os.makedirs(os.path.dirname(EVENTS_FILE) or ".", exist_ok=True)
+        try:
+            if os.path.getsize(EVENTS_FILE) > MAX_BYTES:
+                os.replace(EVENTS_FILE, EVENTS_FILE + ".1")
+        except OSError:
+            pass
+        _fp = open(EVENTS_FILE, "a", encoding="utf-8", buffering=1)
+    return _fp
+
+
+def emit(kind, **fields):
+    """写一条事件：{"type": kind, "ts", "run", "script", ...fields}"""
+    if not ENABLED:
+        return
+    event = {"type": kind, "ts": round(time.time(), 3), "run": RUN_ID, "script": SCRIPT}
+    event.update(fields)
+    line = json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n"
+    with _lock:
+        _open().write(line)
+
+
+# ---------- 请求阶段计时（http_client 调用） ----------
+def start_timing():
+    """为当前线程的下一次请求准备计时槽：dns / connect 由新建连接时填入"""
+    timing = {"dns": 0.0, "connect": 0.0, "new_conn": 0}
+    _local.timing = timing
+    return timing
+
+
+def current_timing():
+    return getattr(_local, "timing", None)
+
+
+def end_timing():
+    _local.timing = None
+
+
+def add_io(seconds, nbytes=0):
+    with _lock:
+        _counters["io_s"] += seconds
+        _counters["bytes"] += nbytes
+        _counters["requests"] += 1
+
+
+# ---------- 等待计时 ----------
+def add_sleep(seconds, kind="sleep"):
+    """记一段主动等待（限速 / 退避 / 人工节奏），按类别累计"""
+    if seconds > 0:
+        with _lock:
+            _counters["sleep_s"] += seconds
+            _counters[f"sleep_{kind}_s"] += seconds
+
+
+def sleep(seconds, kind="sleep"):
+    time.sleep(seconds)
+    add_sleep(seconds, kind)
+
+
+@contextlib.contextmanager
+def stage(name, **fields):
+    """with stage("scan"): ... 记录一个流水线阶段的墙钟时间，以及期间新增的等待与网络时间"""
+    with _lock:
+        before = dict(_counters)
+    began = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except BaseException as e:
+        outcome = type(e).__name__
+        raise
+    finally:
+        with _lock:
+            after = dict(_counters)
+        emit("stage", name=name, wall=round(time.perf_counter() - began, 4), outcome=outcome,
+             sleep=round(after.get("sleep_s", 0) - before.get("sleep_s", 0), 4),
+             io=round(after.get("io_s", 0) - before.get("io_s", 0), 4), **fields)
+
+
+def timed(name):
+    """装饰器：把整个函数调用记为一个阶段"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _finish():
+    global _fp
+    if not ENABLED or _fp is None and not _counters:
+        return
+    with _lock:
+        counters = {k: round(v, 4) for k, v in _counters.items()}
+    emit("run", wall=round(time.perf_counter() - _started, 4), **counters)
+    with _lock:
+        if _fp is not None:
+            _fp.close()
+            _fp = None
+
+
+atexit.register(_finish)
+
+
+# ---------- 汇总 ----------
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    pos = (len(values) - 1) * q
+    lo = int(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+def fmt(seconds):
+    if seconds is None:
+        return "-"
+    return f"{seconds * 1000:.0f}ms" if seconds < 1 else f"{seconds:.2f}s"
+
+
+def load_events(path=EVENTS_FILE, run=None):
+    """读取事件；run 缺省时取文件里最后出现的那次运行"""
+    events = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        return []
+    if run is None and events:
+        run = events[-1]["run"]
+    return [e for e in events if e.get("run") == run]
+
+
+def summarize(events, top=10):
+    if not events:
+        print("📭 没有埋点事件")
+        return
+    print(f"📊 运行 {events[0]['run']} 的埋点汇总")
+    for e in (e for e in events if e["type"] == "run"):
+        busy = e["wall"] or 1
+        print(f"  🧾 {e['script']}: 墙钟 {fmt(e['wall'])}，等待 {fmt(e.get('sleep_s', 0))} "
+              f"({e.get('sleep_s', 0) / busy:.0%})，网络 I/O {fmt(e.get('io_s', 0))}，"
+              f"请求 {int(e.get('requests', 0))} 次，{e.get('bytes', 0) / 1e6:.1f} MB")
+        kinds = {k[len("sleep_"):-2]: v for k, v in e.items() if k.startswith("sleep_") and k != "sleep_s"}
+        if kinds:
+            print("     等待构成: " + "，".join(f"{k} {fmt(v)}" for k, v in sorted(kinds.items(), key=lambda x: -x[1])))
+
+    stages = defaultdict(lambda: [0, 0.0, 0.0, 0.0])
+    for e in (e for e in events if e["type"] == "stage"):
+        s = stages[(e["script"], e["name"])]
+        s[0] += 1
+        s[1] += e["wall"]
+        s[2] += e.get("sleep", 0)
+        s[3] += e.get("io", 0)
+    if stages:
+        print("  ⏱️  阶段耗时:")
+        for (script, name), (count, wall, slept, io) in sorted(stages.items(), key=lambda x: -x[1][1]):
+            print(f"     {script}.{name:<14} {fmt(wall):>8}  ×{count}  等待 {fmt(slept)}  网络 {fmt(io)}")
+
+    http = [e for e in events if e["type"] == "http"]
+    if not http:
+        return
+    print(f"  🌐 请求 {len(http)} 次")
+    for phase in ("total", "dns", "connect", "first_byte", "body"):
+        values = [e[phase] for e in http if e.get(phase) is not None]
+        print(f"     {phase:<10} p50 {fmt(percentile(values, 0.5)):>8}  p90 {fmt(percentile(values, 0.9)):>8}  "
+              f"p99 {fmt(percentile(values, 0.99)):>8}  max {fmt(max(values) if values else None):>8}")
+    outcomes = defaultdict(int)
+    for e in http:
+        outcomes[e["outcome"]] += 1
+    print("     结果: " + "，".join(f"{k} {v}" for k, v in sorted(outcomes.items(), key=lambda x: -x[1])))
+    hosts = defaultdict(list)
+    for e in http:
+        hosts[e["host"]].append(e["total"])
+    print(f"  🐢 最耗时的 {min(top, len(hosts))} 个 host:")
+    for host, values in sorted(hosts.items(), key=lambda x: -sum(x[1]))[:top]:
+        print(f"     {host:<28} 合计 {fmt(sum(values)):>8}  ×{len(values)}  p90 {fmt(percentile(values, 0.9))}")
+
+
+def main():
+    """python py/instrument.py [events.jsonl] [运行 ID]：汇总一次运行（缺省为最近一次）"""
+    path = sys.argv[1] if len(sys.argv) > 1 else EVENTS_FILE
+    run = sys.argv[2] if len(sys.argv) > 2 else None
+    summarize(load_events(path, run))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import random
+import threading
+import time
+import concurrent.futures
+from urllib.parse import urlsplit
+
+from m3u_parser import iter_urls, read_header
+import instrument
+
+# ===============================
+# 配置区（cleanup_zubo / zubo_cleanup / hotelqingli 共用的存活检测引擎）
+# ===============================
+MAX_CONNECTIONS = 32      # 全局同时在飞的检测连接数
+PER_HOST_LIMIT = 2        # 同一 host:port 同时在飞的连接数
+SAMPLE_COUNT = 3          # 每个文件抽测的链接数
+
+
+class FileResult:
+    """单个 m3u 文件的检测结论"""
+    __slots__ = ("path", "alive", "reason", "hosts", "verdicts", "checked", "metrics", "elapsed")
+
+    def __init__(self, path):
+        self.path = path
+        self.alive = False
+        self.reason = ""       # alive / dead / empty / not_m3u / error
+        self.hosts = []        # 该文件抽样链接涉及的上游 host:port
+        self.verdicts = {}     # {host:port: 该 host 自己的结论}，全部检测结束后填入；文件存活不代表每个 host 都存活
+        self.checked = []      # [(url, 是否通过)]，含其他文件在同一 host 上的检测
+        self.metrics = []      # check_url 返回的结构化结果（首字节时间、码率等）
+        self.elapsed = 0.0     # 从开始检测到得出结论的耗时（秒）
+
+    def __repr__(self):
+        return f"FileResult({self.path!r}, {self.reason})"
+
+
+class HostState:
+    """同一上游 host:port 的检测状态：一次运行内只测一轮，结论由所有引用它的文件共享"""
+    __slots__ = ("links", "pending", "verdict", "checked", "metrics", "files")
+
+    def __init__(self):
+        self.links = []        # 去重后的抽样链接（来自所有引用该 host 的文件）
+        self.pending = 0
+        self.verdict = None    # None=未定 / True=存活 / False=失效
+        self.checked = []
+        self.metrics = []
+        self.files = []
+
+
+def host_of(url):
+    """host:port，用于按上游服务器限流"""
+    parts = urlsplit(url)
+    return parts.netloc.rsplit("@", 1)[-1].lower()
+
+
+def sample_links(path, sample=SAMPLE_COUNT, shuffle=False):
+    """抽样：默认取前 sample 条；shuffle=True 时从全部链接中随机抽"""
+    if not shuffle:
+        links = []
+        for url in iter_urls(path):
+            links.append(url)
+            if len(links) >= sample:
+                break
+        return links
+    links = list(iter_urls(path))
+    random.shuffle(links)
+    return links[:sample]
+
+
+def unpack(value):
+    """
+    check_url 的返回值可以是 bool、(是否可用, HTTP 状态码)，
+    或 stream_probe.StreamMetrics 这类带 ok / status 属性的结构化结果。
+    返回 (是否可用, 状态码, 结构化结果或 None)
+    """
+    if hasattr(value, "ok"):
+        return bool(value.ok), getattr(value, "status", None), value
+    if isinstance(value, tuple):
+        return bool(value[0]), (value[1] if len(value) > 1 else None), None
+    return bool(value), None, None
+
+
+@instrument.timed("check")
+def check_files(paths, check_url, sample=SAMPLE_COUNT, shuffle=False, require_header=False,
+                max_connections=MAX_CONNECTIONS, per_host=PER_HOST_LIMIT, on_result=None, stats=None,
+                cache=None):
+    """
+    并发检测一批 m3u 文件是否存活，返回 {path: FileResult}。
+
+    先把所有文件的抽样链接按上游 host:port 归组：每个 host 最多测 sample 条（跨文件去重），
+    任意一条通过即判该 host 存活，结论共享给所有引用它的文件；
+    文件只要有一个 host 存活就判存活。
+    check_url(url) 返回真值（或 (真值, 状态码)）即视为该链接可用。
+    cache 为 probe_cache.ProbeCache 时：host / url 的新鲜结论直接复用不再探测，
+    新的探测结果（状态码、耗时）与 host 结论写回缓存。
+    全局连接数受 max_connections 限制，同一 host:port 受 per_host 限制。
+    on_result(result) 在每个文件得出结论时被串行调用（可用于实时打印）。
+    文件得出结论后其余 host 仍会测完，返回前每个文件的 verdicts 填入各 host 自己的结论（写历史应按 host 记）。
+    stats 若传入 dict，会填入 files / hosts / probes / cached 计数。
+    """
+    start = time.monotonic()
+    results = {}
+    hosts = {}
+    lock = threading.Lock()
+
+    def finish(res, alive, reason):
+        # 调用方持有 lock
+        res.alive = alive
+        res.reason = reason
+        res.elapsed = time.monotonic() - start
+        if on_result:
+            on_result(res)
+
+    for path in paths:
+        res = FileResult(path)
+        results[path] = res
+        try:
+            if require_header and read_header(path) is None:
+                finish(res, False, "not_m3u")
+                continue
+            links = sample_links(path, sample, shuffle)
+        except Exception:
+            finish(res, False, "error")
+            continue
+        if not links:
+            finish(res, False, "empty")
+            continue
+        for url in links:
+            host = host_of(url)
+            state = hosts.get(host)
+            if state is None:
+                state = hosts[host] = HostState()
+            if host not in res.hosts:
+                res.hosts.append(host)
+                state.files.append(res)
+            if url not in state.links and len(state.links) < sample:
+                state.links.append(url)
+
+    if stats is not None:
+        stats.update(files=len(results), hosts=len(hosts), probes=0, cached=0)
+    host_slots = {host: threading.BoundedSemaphore(per_host) for host in hosts}
+
+    def settle(host, state, verdict, status=None, latency=None, bitrate=None, from_cache=False):
+        # 调用方持有 lock：host 得出结论后，更新所有引用它的文件
+        state.verdict = verdict
+        if cache is not None and not from_cache:
+            cache.put_host(host, verdict, status, latency, bitrate)
+        for res in state.files:
+            if res.reason:
+                continue
+            res.checked = [c for h in res.hosts for c in hosts[h].checked]
+            res.metrics = [m for h in res.hosts for m in hosts[h].metrics]
+            if verdict:
+                finish(res, True, "alive")
+            elif all(hosts[h].verdict is False for h in res.hosts):
+                finish(res, False, "dead")
+
+    # 先查缓存：host 有新鲜结论的直接采用；url 有新鲜结论的不再重复探测
+    tasks = []
+    for host, state in hosts.items():
+        if cache is not None:
+            record = cache.get_host(host)
+            if record is not None:
+                state.checked.append((host, record.ok))
+                settle(host, state, record.ok, from_cache=True)
+                if stats is not None:
+                    stats["cached"] += 1
+                continue
+            fresh = [(url, cache.get_url(url)) for url in state.links]
+            hit = next((r for _, r in fresh if r is not None and r.ok), None)
+            if hit is not None:
+                state.checked.append((hit.key, True))
+                settle(host, state, True, hit.status, hit.latency, hit.bitrate)
+                if stats is not None:
+                    stats["cached"] += 1
+                continue
+            state.checked.extend((url, False) for url, r in fresh if r is not None)
+            state.links = [url for url, r in fresh if r is None]
+            if not state.links:
+                settle(host, state, False)
+                if stats is not None:
+                    stats["cached"] += 1
+                continue
+        # 按抽样名次在 host 之间轮转，先让每个 host 都测到第一条
+        state.pending = len(state.links)
+        for rank, url in enumerate(state.links):
+            tasks.append((rank, host, url))
+    tasks.sort(key=lambda t: t[0])
+
+    def run(host, url):
+        state = hosts[host]
+        ok, status, latency, bitrate = False, None, None, None
+        if state.verdict is None:
+            with host_slots[host]:
+                if state.verdict is None:
+                    began = time.monotonic()
+                    metrics = None
+                    try:
+                        ok, status, metrics = unpack(check_url(url))
+                    except Exception:
+                        ok = False
+                    latency = time.monotonic() - began
+                    if metrics is not None:
+                        # 结构化结果里的首字节时间比整次探测耗时更能代表响应速度
+                        latency = metrics.ttfb if getattr(metrics, "ttfb", None) is not None else latency
+                        bitrate = getattr(metrics, "bitrate", None)
+                    if cache is not None:
+                        cache.put_url(url, ok, status, latency, bitrate)
+                    with lock:
+                        state.checked.append((url, ok))
+                        if metrics is not None:
+                            state.metrics.append(metrics)
+                        if stats is not None:
+                            stats["probes"] += 1
+        with lock:
+            state.pending -= 1
+            if state.verdict is not None:
+                return
+            if ok:
+                settle(host, state, True, status, latency, bitrate)
+            elif state.pending == 0:
+                settle(host, state, False, status, latency, bitrate)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_connections)) as executor:
+        for _, host, url in tasks:
+            executor.submit(run, host, url)
+    for res in results.values():
+        res.verdicts = {host: hosts[host].verdict for host in res.hosts}
+    return results
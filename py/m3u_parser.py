@@ -0,0 +1,85 @@
+import re
+
+# ======================
+# 通用 M3U 流式解析器（合并、提取、清理脚本共用）
+# ======================
+# 属性分词器：key="value"，key 允许 tvg-id / group-title 这类带连字符的写法
+ATTR_RE = re.compile(r'([A-Za-z0-9_-]+)="([^"]*)"')
+
+
+class Channel:
+    """一条频道记录：#EXTINF 解析结果 + 紧随其后的播放地址"""
+    __slots__ = ("name", "group", "attrs", "url", "line")
+
+    def __init__(self, name, group, attrs, url, line):
+        self.name = name        # 逗号后的显示名
+        self.group = group      # group-title 原值
+        self.attrs = attrs      # 其余属性（tvg-id / tvg-logo / tvg-name ...）
+        self.url = url          # 播放地址
+        self.line = line        # 原始 #EXTINF 行（已去掉首尾空白）
+
+    def __repr__(self):
+        return f"Channel({self.name!r}, {self.group!r}, {self.url!r})"
+
+
+def parse_extinf(line):
+    """解析单行 #EXTINF，返回 (显示名, group-title, 其余属性)"""
+    attrs = {}
+    group = ""
+    last_end = 0
+    for m in ATTR_RE.finditer(line):
+        key, value = m.group(1), m.group(2)
+        if key == "group-title":
+            group = value
+        else:
+            attrs[key] = value
+        last_end = m.end()
+    comma = line.find(",", last_end)
+    name = line[comma + 1:].strip() if comma != -1 else ""
+    return name, group, attrs
+
+
+def iter_lines(source):
+    """source 可以是文件路径，也可以是任意可迭代的文本行"""
+    if isinstance(source, str):
+        with open(source, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                yield line
+    else:
+        for line in source:
+            yield line
+
+
+def iter_channels(source):
+    """
+    逐行读取，边读边产出 Channel，不把整个文件读进内存。
+    一条 #EXTINF 后跟多个地址时，每个地址都沿用这条 #EXTINF。
+    """
+    name, group, attrs, inf = "", "", {}, ""
+    for raw in iter_lines(source):
+        line = raw.strip()
+        if not line:
+            continue
+        if line.startswith("#EXTINF"):
+            name, group, attrs = parse_extinf(line)
+            inf = line
+        elif line.startswith("#"):
+            continue
+        else:
+            yield Channel(name, group, attrs, line, inf)
+
+
+def iter_urls(source, prefixes=("http://", "https://")):
+    """只要播放地址时的便捷写法（默认只取 http/https）"""
+    for ch in iter_channels(source):
+        if ch.url.startswith(prefixes):
+            yield ch.url
+
+
+def read_header(source):
+    """返回首个非空行（若它是 #EXTM3U 头），否则 None"""
+    for raw in iter_lines(source):
+        line = raw.strip()
+        if line:
+            return line if line.startswith("#EXTM3U") else None
+    return None
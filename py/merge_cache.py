@@ -0,0 +1,81 @@
+import os
+import json
+import hashlib
+
+import instrument
+
+# ======================
+# 合并脚本的增量清单：记录每个输入文件的 size / mtime / 内容哈希及其解析结果
+# ======================
+MANIFEST_VERSION = 1
+
+
+def file_digest(path):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def rules_fingerprint(*paths):
+    """合并规则（脚本源码）的指纹：规则一变，清单整体失效"""
+    h = hashlib.sha1()
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                h.update(f.read())
+        except OSError:
+            h.update(path.encode("utf-8"))
+    return h.hexdigest()
+
+
+def load_manifest(path, rules):
+    """读取清单；版本或规则指纹不一致时视为空清单"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if data.get("version") != MANIFEST_VERSION or data.get("rules") != rules:
+        return {}
+    return data.get("files", {})
+
+
+def save_manifest(path, rules, files):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "rules": rules, "files": files},
+                  f, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    os.replace(tmp, path)
+
+
+@instrument.timed("parse")
+def collect(input_dir, filenames, manifest, parse_file):
+    """
+    返回 (新清单, 统计)。
+    只有新增或内容变化的文件才会调用 parse_file(path) 重新解析；
+    已删除的文件不会出现在新清单里，其贡献自然被丢弃。
+    """
+    files = {}
+    stats = {"reused": 0, "parsed": 0, "removed": 0}
+    for name in filenames:
+        path = os.path.join(input_dir, name)
+        st = os.stat(path)
+        old = manifest.get(name)
+        if old and old["size"] == st.st_size and old["mtime"] == st.st_mtime_ns:
+            files[name] = old
+            stats["reused"] += 1
+            continue
+        digest = file_digest(path)
+        if old and old["sha1"] == digest:
+            # 内容未变（例如 git checkout 刷新了 mtime），只更新时间戳
+            files[name] = dict(old, size=st.st_size, mtime=st.st_mtime_ns)
+            stats["reused"] += 1
+            continue
+        files[name] = {"size": st.st_size, "mtime": st.st_mtime_ns, "sha1": digest,
+                       "entries": parse_file(path)}
+        stats["parsed"] += 1
+    stats["removed"] = len(set(manifest) - set(files))
+    return files, stats
@@ -1,50 +1,39 @@
 import os
-import re
+import sys
+
+from m3u_parser import iter_channels
+import m3u_parser
+import merge_cache
+import channel_norm
+import mirror_rank
+import playlist_shards
+import playlist_delta
 
 INPUT_DIR = "hotel"
 OUTPUT_FILE = "hotel/hotel_all.m3u"
 LOGO_BASE_URL = "https://gcore.jsdelivr.net/gh/kenye201/TVlog/img"
+HEADER = '#EXTM3U x-tvg-url="https://fy.188766.xyz/e.xml"\n'
+# 合集另按运营商 / 地区拆成分片写到 hotel/shards/（附 index.json），见 playlist_shards.py
+SHARDS = True
+# 与上一次发布的合集比较，把新增/删除/变化的条目写成带版本号的增量（hotel/delta/），见 playlist_delta.py
+DELTA = True
+# 组名/显示名/台标/ID 的清洗规则（预编译 + LRU 缓存），见 channel_norm.py
+NORMALIZER = channel_norm.Normalizer(channel_norm.HOTEL_SUFFIX_RE, channel_norm.group_by_region, LOGO_BASE_URL)
+# 增量清单：只重新解析新增/变化的文件；命令行加 --full 强制全量重建
+# 清单放在不入库的 .cache 目录（Actions 里由 actions/cache 跨次保留）
+MANIFEST_FILE = os.path.join(".cache", "merge_m3u.json")
+INCREMENTAL = "--full" not in sys.argv
+# 同名频道的镜像按探测缓存里的实测速度排序，低于质量下限的丢弃（阈值见 mirror_rank.py）
+# 命令行加 --probe 时先对没有测速记录的上游补测一轮
+PROBE_MISSING = "--probe" in sys.argv
 
-def clean_group_title(line):
-    """提取 [地名][运营商]，例如: 广西联通"""
-    match = re.search(r'group-title="(.*?)"', line)
-    if match:
-        full = match.group(1)
-        isp_match = re.search(r'(电信|联通|移动|广电)', full)
-        if isp_match:
-            isp = isp_match.group(1)
-            region = full[:2] # 取前两个字
-            return re.sub(r'group-title=".*?"', f'group-title="{region}{isp}"', line)
-    return line
-
-def fix_content(line):
-    """修复台标、ID，并清洗频道显示名称"""
-    if not line.startswith("#EXTINF"): return line
-    name_match = re.search(r",([^,\n\r]+)$", line)
-    if not name_match: return line
-    
-    raw_name = name_match.group(1).strip()
-    
-    # --- 新增：清洗显示名称（去掉末尾的 HD、高清、超清等） ---
-    # 使用正则匹配末尾的干扰词，忽略大小写
-    display_name = re.sub(r'([-_\s]?(HD|高清|超清|SD))$', '', raw_name, flags=re.I).strip()
-    # 将清洗后的名字应用回 line 的末尾（逗号后面）
-    line = line.replace(f",{raw_name}", f",{display_name}")
-    # ---------------------------------------------------
-
-    # 归一化频道名用于匹配台标 (逻辑保持不变)
-    clean = display_name.replace("-综合","").replace("综合","").replace(" ","").replace("中央","CCTV")
-    cctv = re.search(r"(CCTV\d+)", clean, re.I)
-    if cctv: clean = cctv.group(1).upper()
-
-    logo = f'tvg-logo="{LOGO_BASE_URL}/{clean}.png"'
-    # ID 建议使用清洗后的名字，匹配 EPG 更准确
-    tid = f'tvg-id="{display_name}"'
-    
-    line = re.sub(r'tvg-logo=".*?"', logo, line) if 'tvg-logo="' in line else line.replace("#EXTINF:-1", f"#EXTINF:-1 {logo}")
-    line = re.sub(r'tvg-id=".*?"', tid, line) if 'tvg-id="' in line else line.replace("#EXTINF:-1", f"#EXTINF:-1 {tid}")
-    
-    return line
+def parse_file(file_path):
+    """解析单个酒店文件，返回 [[url, 清洗后的 #EXTINF], ...]（文件内按 URL 去重）"""
+    entries = {}
+    for ch in iter_channels(file_path):
+        if ch.url.startswith("http") and ch.url not in entries:
+            entries[ch.url] = NORMALIZER.rewrite(ch.line) if ch.line else ""
+    return [[url, inf] for url, inf in entries.items()]
 
 def main():
     all_channels = {} # 使用字典按 URL 去重
@@ -55,26 +44,36 @@ def main():
     files = [f for f in os.listdir(INPUT_DIR) if f.endswith(".m3u") and f != "hotel_all.m3u"]
     print(f"🔄 正在融合 {len(files)} 个文件...")
 
+    # 指纹覆盖所有影响解析结果的模块：脚本自身、清单、归一化规则、M3U 解析器
+    rules = merge_cache.rules_fingerprint(os.path.abspath(__file__), merge_cache.__file__,
+                                           channel_norm.__file__, m3u_parser.__file__)
+    manifest = merge_cache.load_manifest(MANIFEST_FILE, rules) if INCREMENTAL else {}
+    parsed, stats = merge_cache.collect(INPUT_DIR, files, manifest, parse_file)
+    print(f"♻️  复用 {stats['reused']} 个 / 重新解析 {stats['parsed']} 个 / 移除 {stats['removed']} 个")
+
     for filename in files:
-        with open(os.path.join(INPUT_DIR, filename), "r", encoding="utf-8") as f:
-            current_inf = ""
-            for line in f:
-                line = line.strip()
-                if line.startswith("#EXTINF"):
-                    line = clean_group_title(line)
-                    current_inf = fix_content(line)
-                elif line.startswith("http"):
-                    # 如果 URL 已经存在，则不覆盖（保留先发现的那个，或者你可以根据需要调整）
-                    if line not in all_channels:
-                        all_channels[line] = current_inf
+        for url, inf in parsed[filename]["entries"]:
+            # 如果 URL 已经存在，则不覆盖（保留先发现的那个，或者你可以根据需要调整）
+            if url not in all_channels:
+                all_channels[url] = inf
+
+    merge_cache.save_manifest(MANIFEST_FILE, rules, parsed)
+
+    ranker = mirror_rank.open_ranker(PROBE_MISSING, all_channels)
+    ranked, dropped = ranker.order(list(all_channels.items()))
+    ranker.close()
+    if dropped:
+        print(f"🐢 丢弃 {dropped} 条低于质量下限的镜像")
 
     # 写入最终的合集
-    with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-        f.write('#EXTM3U x-tvg-url="https://fy.188766.xyz/e.xml"\n')
-        for url, inf in all_channels.items():
-            f.write(f"{inf}\n{url}\n")
-    
-    print(f"✨ 融合完成！总计唯一频道数: {len(all_channels)}")
+    previous = playlist_delta.snapshot(OUTPUT_FILE) if DELTA else None
+    full = playlist_shards.write_playlist(OUTPUT_FILE, ranked, HEADER)
+    print(f"✨ 融合完成！总计唯一频道数: {len(ranked)}")
+    if DELTA:
+        print(playlist_delta.report(playlist_delta.publish(INPUT_DIR, previous, ranked, full), full))
+    if SHARDS:
+        index = playlist_shards.publish(INPUT_DIR, ranked, HEADER, full)
+        print(f"🗂️  分片: 运营商 {len(index['shards']['isp'])} 个 / 地区 {len(index['shards']['region'])} 个")
 
 if __name__ == "__main__":
     main()
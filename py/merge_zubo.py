@@ -1,63 +1,81 @@
 import os
 import re
+import sys
+
+from m3u_parser import iter_channels
+import m3u_parser
+import merge_cache
+import channel_norm
+import mirror_rank
+import atomic_output
+import playlist_shards
+import playlist_delta
 
 # ===============================
 # 配置区
 # ===============================
 BASE_DIR = os.getcwd()
 INPUT_DIR = os.path.join(BASE_DIR, "zubo")
-OUTPUT_FILE = os.path.join(INPUT_DIR, "zuboall.m3u")
+# 合并产物：总表与备用列表（超出 TOP_MIRRORS 的镜像，作为故障切换的备用源）。
+# 它们和地区文件同在 zubo/ 下，清理、RTP 提取等逐文件处理的脚本都按这个名单排除
+MERGED_FILES = ("zuboall.m3u", "zuboall_backup.m3u")
+OUTPUT_FILE = os.path.join(INPUT_DIR, MERGED_FILES[0])
+BACKUP_FILE = os.path.join(INPUT_DIR, MERGED_FILES[1])
 LOGO_BASE_URL = "https://gcore.jsdelivr.net/gh/kenye201/TVlog/img"
+HEADER = '#EXTM3U x-tvg-url="https://fy.188766.xyz/e.xml" tvg-shift="0"\n'
+# 主列表另按运营商 / 地区拆成分片写到 zubo/shards/（附 index.json），见 playlist_shards.py
+SHARDS = True
+# 与上一次发布的总表比较，把新增/删除/变化的条目写成带版本号的增量（zubo/delta/），见 playlist_delta.py
+DELTA = True
+# 组名/显示名/台标/ID 的清洗规则（预编译 + LRU 缓存），见 channel_norm.py
+NORMALIZER = channel_norm.Normalizer(channel_norm.ZUBO_SUFFIX_RE, channel_norm.group_by_city, LOGO_BASE_URL)
+# 增量清单：只重新解析新增/变化的文件；命令行加 --full 强制全量重建
+# 清单放在不入库的 .cache 目录（Actions 里由 actions/cache 跨次保留）
+MANIFEST_FILE = os.path.join(BASE_DIR, ".cache", "merge_zubo.json")
+INCREMENTAL = "--full" not in sys.argv
+# 同名频道的镜像按探测缓存里的实测速度排序，低于质量下限的丢弃（阈值见 mirror_rank.py）
+# 命令行加 --probe 时先对没有测速记录的上游补测一轮
+PROBE_MISSING = "--probe" in sys.argv
+# 频道级去重：按 (清洗后的频道名, 组播地址) 归并，同一组播只保留最快的 TOP_MIRRORS 个上游
+DEDUP_BY_GROUP = True
+TOP_MIRRORS = 3
+GROUP_RE = re.compile(r'(?:/(?:rtp|udp)/|(?:rtp|udp)://)@?(\d{1,3}(?:\.\d{1,3}){3}:\d+)', re.I)
 
-def clean_group_title(line):
-    """提取 [地名][运营商]"""
-    match = re.search(r'group-title="(.*?)"', line)
-    if match:
-        full = match.group(1)
-        # 兼容处理：有些源可能已经很简洁，有些则很长
-        isp_match = re.search(r'(电信|联通|移动|广电)', full)
-        if isp_match:
-            isp = isp_match.group(1)
-            # 找到运营商前面的部分
-            prefix = full[:full.find(isp)].strip()
-            # 取空格后的最后一个词，通常是城市名
-            parts = prefix.split()
-            simple_prefix = parts[-1] if parts else ""
-            return re.sub(r'group-title=".*?"', f'group-title="{simple_prefix}{isp}"', line)
-    return line
+def parse_file(file_path):
+    """解析单个组播文件，返回 [[url, 清洗后的 #EXTINF], ...]（文件内按 URL 去重）"""
+    entries = {}
+    if os.path.getsize(file_path) == 0:
+        return []
+    for ch in iter_channels(file_path):
+        url = ch.url
+        if (url.startswith("rtp://") or url.startswith("http")) and url not in entries:
+            # 清洗组名和台标
+            entries[url] = NORMALIZER.rewrite(ch.line) if ch.line else ""
+    return [[url, inf] for url, inf in entries.items()]
 
-def fix_content(line):
-    """修复台标、ID，并清洗频道显示名称"""
-    if not line.startswith("#EXTINF"): return line
-    name_match = re.search(r",([^,\n\r]+)$", line)
-    if not name_match: return line
-    
-    raw_name = name_match.group(1).strip()
-    # 移除 HD, 高清等字样
-    display_name = re.sub(r'([-_\s]?(HD|高清|超清|SD|蓝光|FHD))$', '', raw_name, flags=re.I).strip()
-    line = line.replace(f",{raw_name}", f",{display_name}")
-    
-    # 台标匹配逻辑
-    clean = display_name.replace("-综合","").replace("综合","").replace(" ","").replace("中央","CCTV")
-    cctv = re.search(r"(CCTV\d+)", clean, re.I)
-    if cctv: 
-        clean = cctv.group(1).upper()
-    
-    logo = f'tvg-logo="{LOGO_BASE_URL}/{clean}.png"'
-    tid = f'tvg-id="{display_name}"'
-    
-    # 注入台标和ID
-    if 'tvg-logo="' in line:
-        line = re.sub(r'tvg-logo=".*?"', logo, line)
-    else:
-        line = line.replace("#EXTINF:-1", f"#EXTINF:-1 {logo}")
-        
-    if 'tvg-id="' in line:
-        line = re.sub(r'tvg-id=".*?"', tid, line)
-    else:
-        line = line.replace("#EXTINF:-1", f"#EXTINF:-1 {tid}")
-    
-    return line
+def rtp_group(url):
+    """从播放地址里取组播地址，如 http://x:8222/rtp/233.18.204.188:5140 → 233.18.204.188:5140"""
+    m = GROUP_RE.search(url)
+    return m.group(1) if m else None
+
+def split_mirrors(entries, top_n=TOP_MIRRORS):
+    """
+    entries 已按速度排好序；同一 (分组, 频道名, 组播地址) 的前 top_n 条进主列表，其余进备用列表。
+    分组即清洗后的 group-title（地区运营商）：同一组播地址在不同运营商里是不同的流，不能互相挤占。
+    解析不出组播地址的条目仍按 URL 区分，全部进主列表。
+    """
+    primary, backup = [], []
+    seen = {}
+    for url, inf in entries:
+        addr = rtp_group(url)
+        if addr is None:
+            primary.append((url, inf))
+            continue
+        title, name = mirror_rank.channel_key(inf)
+        key = (title, name, addr)
+        seen[key] = seen.get(key, 0) + 1
+        (primary if seen[key] <= top_n else backup).append((url, inf))
+    return primary, backup
 
 def main():
     all_channels = {} # 使用字典去重：URL 作为 Key
@@ -67,39 +85,53 @@ def main():
         return
     
     # 【核心修正】：匹配所有 .m3u 文件，排除汇总文件本身和黑名单文件
-    files = [f for f in os.listdir(INPUT_DIR) 
-             if f.endswith(".m3u") and f != "zuboall.m3u"]
+    files = [f for f in os.listdir(INPUT_DIR) if f.endswith(".m3u") and f not in MERGED_FILES]
     
     print(f"🔄 正在融合 {len(files)} 个组播地区文件...")
     
     # 排序确保合并顺序稳定
     files.sort()
     
+    # 指纹覆盖所有影响解析结果的模块：脚本自身、清单、归一化规则、M3U 解析器
+    rules = merge_cache.rules_fingerprint(os.path.abspath(__file__), merge_cache.__file__,
+                                           channel_norm.__file__, m3u_parser.__file__)
+    manifest = merge_cache.load_manifest(MANIFEST_FILE, rules) if INCREMENTAL else {}
+    parsed, stats = merge_cache.collect(INPUT_DIR, files, manifest, parse_file)
+    print(f"♻️  复用 {stats['reused']} 个 / 重新解析 {stats['parsed']} 个 / 移除 {stats['removed']} 个")
+    
     for filename in files:
-        file_path = os.path.join(INPUT_DIR, filename)
-        if os.path.getsize(file_path) == 0:
-            continue
-            
-        with open(file_path, "r", encoding="utf-8") as f:
-            current_inf = ""
-            for line in f:
-                line = line.strip()
-                if line.startswith("#EXTINF"):
-                    # 清洗组名和台标
-                    line = clean_group_title(line)
-                    current_inf = fix_content(line)
-                elif line.startswith("rtp://") or line.startswith("http"):
-                    # 只有当 URL 不在字典中时才添加，实现去重
-                    if line not in all_channels:
-                        all_channels[line] = current_inf
+        for url, inf in parsed[filename]["entries"]:
+            # 只有当 URL 不在字典中时才添加，实现去重
+            if url not in all_channels:
+                all_channels[url] = inf
+    
+    merge_cache.save_manifest(MANIFEST_FILE, rules, parsed)
+    
+    ranker = mirror_rank.open_ranker(PROBE_MISSING, all_channels)
+    ranked, dropped = ranker.order(list(all_channels.items()))
+    ranker.close()
+    if dropped:
+        print(f"🐢 丢弃 {dropped} 条低于质量下限的镜像")
+    
+    backup = []
+    if DEDUP_BY_GROUP:
+        ranked, backup = split_mirrors(ranked)
     
-    if all_channels:
-        with open(OUTPUT_FILE, "w", encoding="utf-8") as f:
-            f.write('#EXTM3U x-tvg-url="https://fy.188766.xyz/e.xml" tvg-shift="0"\n')
-            for url, inf in all_channels.items():
-                f.write(f"{inf}\n{url}\n")
+    if ranked:
+        previous = playlist_delta.snapshot(OUTPUT_FILE) if DELTA else None
+        full = playlist_shards.write_playlist(OUTPUT_FILE, ranked, HEADER)
         print(f"✨ 融合完成！生成文件: {OUTPUT_FILE}")
-        print(f"📊 总计唯一频道数: {len(all_channels)}")
+        print(f"📊 总计唯一频道数: {len(ranked)}")
+        if DELTA:
+            print(playlist_delta.report(playlist_delta.publish(INPUT_DIR, previous, ranked, full), full))
+        if SHARDS:
+            index = playlist_shards.publish(INPUT_DIR, ranked, HEADER, full)
+            print(f"🗂️  分片: 运营商 {len(index['shards']['isp'])} 个 / 地区 {len(index['shards']['region'])} 个")
+        if backup:
+            playlist_shards.write_playlist(BACKUP_FILE, backup, HEADER, gz=False)
+            print(f"🧩 同一组播超过 {TOP_MIRRORS} 个上游的 {len(backup)} 条写入备用列表: {BACKUP_FILE}")
+        else:
+            atomic_output.remove(BACKUP_FILE)
     else:
         print("⚠️ 未发现有效频道，跳过合并步骤")
 
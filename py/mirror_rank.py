@@ -0,0 +1,155 @@
+import time
+import concurrent.futures
+
+from m3u_parser import parse_extinf
+from liveness import host_of
+from probe_cache import ProbeCache
+from stream_probe import probe_stream
+import instrument
+
+# ===============================
+# 配置区：同名频道的多个镜像按实测速度排序（merge_zubo / merge_m3u 共用）
+# ===============================
+MIN_BITRATE = 500 * 1000    # 持续码率低于该值（bit/s）的上游直接丢弃
+MAX_LATENCY = 5.0           # 首字节时间超过该值（秒）的上游直接丢弃
+RECORD_MAX_AGE = 24 * 3600  # 超过该时长的测速记录不再参考，视为未测
+PROBE_CONNECTIONS = 16      # --probe 时补测的并发连接数
+PROBE_TIMEOUT = 5           # --probe 时单条补测的超时（秒）
+
+
+class EndpointScore:
+    """单个上游 host:port 的测速结论"""
+    __slots__ = ("host", "measured", "ok", "latency", "bitrate")
+
+    def __init__(self, host, measured=False, ok=False, latency=None, bitrate=None):
+        self.host = host
+        self.measured = measured    # 是否有可参考的测速记录
+        self.ok = ok
+        self.latency = latency      # 秒：首字节时间
+        self.bitrate = bitrate      # bit/s：持续码率
+
+    def __repr__(self):
+        return f"EndpointScore({self.host}, measured={self.measured}, ok={self.ok})"
+
+
+def channel_key(inf):
+    """
+    镜像归组的键：(清洗后的 group-title, 显示名)。
+    不同地区运营商的同名频道是不同的流，不能互相当作镜像排序
+    """
+    if not inf:
+        return ("", "")
+    name, group, _ = parse_extinf(inf)
+    return (group, name)
+
+
+class MirrorRanker:
+    """
+    读取探测缓存里的 host 记录（清理脚本的拉流探测 / --probe 补测写入），给每个上游打分：
+    实测可用的按 (首字节时间, -码率) 排在前面，未测的保持原顺序排在其后，
+    实测失效或低于质量下限的丢弃。
+    """
+
+    def __init__(self, cache=None, min_bitrate=MIN_BITRATE, max_latency=MAX_LATENCY,
+                 max_age=RECORD_MAX_AGE):
+        self.cache = cache
+        self.min_bitrate = min_bitrate
+        self.max_latency = max_latency
+        self.max_age = max_age
+        self._scores = {}
+
+    def score(self, host):
+        score = self._scores.get(host)
+        if score is None:
+            score = EndpointScore(host)
+            record = self.cache.get("host", host, fresh_only=False) if self.cache is not None else None
+            if record is not None and time.time() - record.checked_at < self.max_age:
+                score = EndpointScore(host, True, record.ok, record.latency, record.bitrate)
+            self._scores[host] = score
+        return score
+
+    def passes(self, score):
+        """未测的一律保留；实测的需可用且满足首字节时间与码率下限"""
+        if not score.measured:
+            return True
+        if not score.ok:
+            return False
+        if score.latency is not None and score.latency > self.max_latency:
+            return False
+        if score.bitrate is not None and score.bitrate < self.min_bitrate:
+            return False
+        return True
+
+    def sort_key(self, score):
+        if not score.measured:
+            return (1, 0.0, 0.0)
+        return (0, score.latency if score.latency is not None else self.max_latency,
+                -(score.bitrate or 0.0))
+
+    def unmeasured(self, urls):
+        """返回 {host: 样本 url}：没有可参考记录的上游，供 --probe 补测"""
+        samples = {}
+        for url in urls:
+            host = host_of(url)
+            if host and host not in samples and not self.score(host).measured:
+                samples[host] = url
+        return samples
+
+    @instrument.timed("measure")
+    def measure(self, urls, probe=None, max_connections=PROBE_CONNECTIONS):
+        """对未测的上游各抽一条补测，结果写回缓存；返回补测的 host 数"""
+        samples = self.unmeasured(urls)
+        if not samples:
+            return 0
+        probe = probe or (lambda url: probe_stream(url, connect_timeout=PROBE_TIMEOUT,
+                                                   read_timeout=PROBE_TIMEOUT))
+
+        def run(host, url):
+            try:
+                metrics = probe(url)
+            except Exception:
+                metrics = None
+            ok = bool(metrics)
+            latency = getattr(metrics, "ttfb", None)
+            bitrate = getattr(metrics, "bitrate", None)
+            if self.cache is not None:
+                self.cache.put_host(host, ok, getattr(metrics, "status", None), latency, bitrate)
+            self._scores[host] = EndpointScore(host, True, ok, latency, bitrate)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, max_connections)) as executor:
+            for host, url in samples.items():
+                executor.submit(run, host, url)
+        return len(samples)
+
+    @instrument.timed("rank")
+    def order(self, entries, key_of=channel_key):
+        """
+        entries: [(url, #EXTINF), ...]，已按 URL 去重。
+        同一频道的镜像聚在该频道首次出现的位置，按得分排序；返回 (保留的条目, 丢弃数)。
+        """
+        groups = {}
+        dropped = 0
+        for index, (url, inf) in enumerate(entries):
+            score = self.score(host_of(url))
+            if not self.passes(score):
+                dropped += 1
+                continue
+            groups.setdefault(key_of(inf), []).append((self.sort_key(score), index, url, inf))
+        ordered = []
+        for mirrors in groups.values():
+            mirrors.sort(key=lambda m: (m[0], m[1]))
+            ordered.extend((url, inf) for _, _, url, inf in mirrors)
+        return ordered, dropped
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+
+
+def open_ranker(probe=False, urls=()):
+    """打开探测缓存并构造排序器；probe=True 时先对未测的上游补测一轮"""
+    ranker = MirrorRanker(ProbeCache())
+    if probe:
+        count = ranker.measure(urls)
+        print(f"⏱️  补测 {count} 个未测速的上游")
+    return ranker
@@ -0,0 +1,125 @@
+import os
+import json
+import hashlib
+
+import atomic_output
+from m3u_parser import iter_channels
+
+# ===============================
+# 配置区：相邻两次发布之间的增量（merge_zubo / merge_m3u 共用）
+# ===============================
+# 上一次发布的总表本身就是快照：合并前先读出来，写完新表后与之比较，
+# 把新增 / 删除 / 变化的条目写成 <目录>/delta/<版本>.json，并在 delta/index.json 里登记版本链
+DELTA_DIR = "delta"
+INDEX_NAME = "index.json"
+FORMAT = 1
+KEEP = 48       # 保留最近多少个增量（每小时一次约两天）；落后更多的客户端直接拉全量
+
+
+def snapshot(path):
+    """
+    写新总表之前调用：返回当前已发布总表的 (sha1, 原始内容)；文件不存在时为 (None, b"")。
+    只读字节不解析，总表没变时（大多数运行）不花解析的时间。
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None, b""
+    return hashlib.sha1(data).hexdigest(), data
+
+
+def parse_snapshot(data):
+    """快照内容 → {url: #EXTINF}"""
+    entries = {}
+    for ch in iter_channels(data.decode("utf-8", "replace").splitlines()):
+        entries.setdefault(ch.url, ch.line)
+    return entries
+
+
+def entries_digest(entries):
+    """与顺序无关的内容哈希：sha1(按 URL 排序后的 "url\\t#EXTINF\\n")，客户端套用增量后可据此校验"""
+    h = hashlib.sha1()
+    for url, inf in sorted(entries.items()):
+        h.update(f"{url}\t{inf}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def diff(old, new):
+    """以 URL 为键比较两版条目：返回 (新增 [[url, inf]], 删除 [url], 变化 [[url, inf]])"""
+    added = [[url, inf] for url, inf in new.items() if url not in old]
+    removed = [url for url in old if url not in new]
+    changed = [[url, inf] for url, inf in new.items() if url in old and old[url] != inf]
+    return added, removed, changed
+
+
+def load_index(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return index if index.get("format") == FORMAT else {}
+
+
+def dump(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), sort_keys=True) + "\n"
+
+
+def publish(output_dir, previous, entries, full):
+    """
+    previous 为 snapshot() 的结果，entries 为本次写进总表的 [(url, inf)]，full 为 playlist_shards.write_playlist 的返回值。
+    总表没变时什么都不写；变了则版本号 +1，写出 delta/<版本>.json 并更新 delta/index.json，返回索引。
+    快照的哈希与索引登记的不一致（首次发布、文件被手工改过）时版本链断开：
+    旧增量全部作废，只登记新版本，客户端需重新拉一次全量。
+    增量只描述条目集合（以 URL 为键）；镜像顺序的变化不计入，需要逐字节一致的客户端拉全量并用 sha1 校验。
+    """
+    delta_dir = os.path.join(output_dir, DELTA_DIR)
+    index_path = os.path.join(delta_dir, INDEX_NAME)
+    index = load_index(index_path)
+    if index.get("sha1") == full["sha1"]:
+        return index
+
+    os.makedirs(delta_dir, exist_ok=True)
+    base_sha1, data = previous
+    new = dict(entries)
+    digest = entries_digest(new)
+    version = index.get("version", 0) + 1
+    deltas = index.get("deltas", [])
+    if index and base_sha1 == index.get("sha1"):
+        added, removed, changed = diff(parse_snapshot(data), new)
+        name = f"{version}.json"
+        path = os.path.join(delta_dir, name)
+        atomic_output.write_text(path, dump({
+            "format": FORMAT, "from": index["version"], "to": version,
+            "base_sha1": base_sha1, "sha1": full["sha1"], "entries_sha1": digest,
+            "added": added, "removed": removed, "changed": changed,
+        }))
+        deltas = deltas + [{"from": index["version"], "to": version, "file": name, "bytes": os.path.getsize(path),
+                            "added": len(added), "removed": len(removed), "changed": len(changed)}]
+    else:
+        deltas = []
+    keep = deltas[-KEEP:]
+    kept = {d["file"] for d in keep}
+    for name in os.listdir(delta_dir):
+        if name != INDEX_NAME and name.endswith(".json") and name not in kept:
+            atomic_output.remove(os.path.join(delta_dir, name))
+
+    relative = lambda path: os.path.relpath(path, delta_dir).replace(os.sep, "/")
+    index = {"format": FORMAT, "version": version, "sha1": full["sha1"], "entries_sha1": digest,
+             "channels": len(new), "full": relative(full["path"]), "bytes": full["bytes"], "deltas": keep}
+    if "gz" in full:
+        index.update(gz=relative(full["gz"]), gz_bytes=full["gz_bytes"])
+    atomic_output.write_text(index_path, json.dumps(index, ensure_ascii=False, indent=1, sort_keys=True) + "\n")
+    return index
+
+
+def report(index, full):
+    """给日志用的一句话"""
+    if not full["changed"]:
+        return f"🔁 总表没有变化，版本保持 {index['version']}"
+    last = index["deltas"][-1] if index["deltas"] else None
+    if last is None or last["to"] != index["version"]:
+        return f"🔁 版本 {index['version']}: 没有可用的上一版快照，只发布全量"
+    return (f"🔁 版本 {index['version']}: 新增 {last['added']} / 删除 {last['removed']} / 变化 {last['changed']} 条，"
+            f"增量 {last['bytes']} 字节（全量 {index['bytes']} 字节）")
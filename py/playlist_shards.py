@@ -0,0 +1,91 @@
+import os
+import re
+import gzip
+import json
+
+import atomic_output
+from channel_norm import ISP_RE
+
+# ===============================
+# 配置区：按运营商 / 地区拆分的分片播放列表（merge_zubo / merge_m3u 共用）
+# ===============================
+# 分片直接由合并脚本内存里排好序的条目分桶得到，与总表出自同一次解析；
+# 播放器只下载自己那一片，总表再大启动也不受影响
+SHARD_DIR = "shards"
+INDEX_NAME = "index.json"
+INDEX_VERSION = 1
+KINDS = ("isp", "region")       # isp: 上海电信 / region: 上海
+OTHER = "其他"                  # 没有 group-title 的条目
+# 总表与分片旁边各写一份 .gz（mtime 固定为 0，内容不变时字节也不变，不会产生无意义的提交）
+GZIP = True
+GZIP_LEVEL = 9
+GROUP_TITLE_RE = re.compile(r'group-title="([^"]*)"')
+UNSAFE_RE = re.compile(r'[\\/:*?"<>|\s]')
+
+
+def shard_keys(inf):
+    """清洗后的 #EXTINF → {"isp": "上海电信", "region": "上海"}（group-title 已由 channel_norm 归一为 [地名][运营商]）"""
+    m = GROUP_TITLE_RE.search(inf)
+    group = UNSAFE_RE.sub("", m.group(1)) if m else ""
+    carrier = ISP_RE.search(group)
+    region = group[:carrier.start()] if carrier else group
+    return {"isp": group or OTHER, "region": region or OTHER}
+
+
+def split(entries):
+    """一次遍历把 [(url, inf)] 分进各类分片，保持原有（按速度排好的）顺序"""
+    shards = {kind: {} for kind in KINDS}
+    for url, inf in entries:
+        for kind, key in shard_keys(inf).items():
+            shards[kind].setdefault(key, []).append((url, inf))
+    return shards
+
+
+def write_playlist(path, entries, header, gz=GZIP):
+    """
+    写一个播放列表（内容不变时不改动文件），gz=True 时旁边再写一份 .gz。
+    返回 {"path", "sha1", "bytes", "changed"[, "gz", "gz_bytes"]}
+    """
+    data = (header + "".join(f"{inf}\n{url}\n" for url, inf in entries)).encode("utf-8")
+    with atomic_output.AtomicWriter(path) as f:
+        f.write(data)
+    info = {"path": path, "sha1": f.sha1, "bytes": f.size, "changed": f.changed}
+    if gz:
+        gz_path = path + ".gz"
+        if f.changed or not os.path.exists(gz_path):
+            with atomic_output.AtomicWriter(gz_path) as z:
+                z.write(gzip.compress(data, GZIP_LEVEL, mtime=0))
+        info.update(gz=gz_path, gz_bytes=os.path.getsize(gz_path))
+    return info
+
+
+def publish(output_dir, entries, header, full):
+    """
+    在 output_dir/shards 下写 isp/、region/ 两类分片与 index.json，返回索引。
+    full 为同一批条目写总表时 write_playlist 的返回值，一并登记进索引；
+    索引里每一项给出相对路径、条目数、sha1 与字节数（及 .gz 路径与字节数），不再出现的分片会被删除。
+    """
+    shard_dir = os.path.join(output_dir, SHARD_DIR)
+    relative = lambda path: os.path.relpath(path, shard_dir).replace(os.sep, "/")
+
+    def describe(info, count):
+        item = {"file": relative(info["path"]), "channels": count, "sha1": info["sha1"], "bytes": info["bytes"]}
+        if "gz" in info:
+            item.update(gz=relative(info["gz"]), gz_bytes=info["gz_bytes"])
+        return item
+
+    index = {"version": INDEX_VERSION, "full": describe(full, len(entries)), "shards": {}}
+    for kind, buckets in split(entries).items():
+        directory = os.path.join(shard_dir, kind)
+        os.makedirs(directory, exist_ok=True)
+        index["shards"][kind] = {}
+        for key, items in buckets.items():
+            info = write_playlist(os.path.join(directory, f"{key}.m3u"), items, header)
+            index["shards"][kind][key] = describe(info, len(items))
+        wanted = {f"{key}.m3u{ext}" for key in buckets for ext in ("", ".gz") if ext == "" or GZIP}
+        for name in os.listdir(directory):
+            if name.endswith((".m3u", ".m3u.gz")) and name not in wanted:
+                atomic_output.remove(os.path.join(directory, name))
+    atomic_output.write_text(os.path.join(shard_dir, INDEX_NAME),
+                             json.dumps(index, ensure_ascii=False, indent=1, sort_keys=True) + "\n")
+    return index
@@ -0,0 +1,137 @@
+import os
+import re
+from collections import Counter, defaultdict
+
+# ======================
+# 配置区
+# ======================
+# 各层级命中的权重：同 /24 网段 > 同地区运营商 > 同 /16 网段 > 同运营商 > 全局
+LEVEL_WEIGHTS = {"net24": 16.0, "isp": 8.0, "net16": 4.0, "carrier": 2.0, "global": 1.0}
+CARRIERS = ("电信", "联通", "移动", "广电")
+
+# 兼容三种历史命名：{ISP}-{ip}-{port}.m3u / {ISP}_{ip}_{port}.m3u / {ISP}_{ip}.m3u（ip 可用 . 或 _ 分隔）
+FILENAME_RE = re.compile(r'^(?P<isp>[^-_]+)[-_](?P<ip>\d+[._]\d+[._]\d+[._]\d+)(?:[-_](?P<port>\d+))?\.m3u$')
+URL_HOST_RE = re.compile(r'https?://(\d+\.\d+\.\d+\.\d+):(\d+)')
+
+
+def carrier_of(isp):
+    """从 "上海电信" 这类标签中取出运营商"""
+    if not isp:
+        return None
+    for c in CARRIERS:
+        if c in isp:
+            return c
+    return None
+
+
+def level_keys(ip, isp=None):
+    """一个目标所属的各个统计层级"""
+    parts = ip.split(".")
+    keys = {
+        "net24": ".".join(parts[:3]),
+        "net16": ".".join(parts[:2]),
+        "global": "*",
+    }
+    if isp:
+        keys["isp"] = isp
+        carrier = carrier_of(isp)
+        if carrier:
+            keys["carrier"] = carrier
+    return keys
+
+
+class PortRanker:
+    """根据历史命中记录，为新目标给出端口探测顺序"""
+
+    def __init__(self):
+        self.hits = defaultdict(Counter)   # (层级, 键) -> Counter(port)
+        self.seen = set()                  # 已计入的 (ip, port)，避免历史文件与文件名重复计数
+        self.isp_of = {}                   # ip -> 已知的地区运营商
+
+    def add(self, ip, port, isp=None):
+        port = int(port)
+        if isp:
+            self.isp_of.setdefault(ip, isp)
+        if (ip, port) in self.seen:
+            return
+        self.seen.add((ip, port))
+        for level, key in level_keys(ip, isp or self.isp_of.get(ip)).items():
+            self.hits[(level, key)][port] += 1
+
+    def scores(self, ip, isp=None):
+        """每个端口的加权命中率"""
+        result = Counter()
+        for level, key in level_keys(ip, isp or self.isp_of.get(ip)).items():
+            counter = self.hits.get((level, key))
+            if not counter:
+                continue
+            total = sum(counter.values())
+            for port, n in counter.items():
+                result[port] += LEVEL_WEIGHTS[level] * n / total
+        return result
+
+    def rank(self, ip, ports, isp=None, learned=True):
+        """
+        返回该目标的端口探测顺序：按加权命中率降序，分数相同保持 ports 原顺序。
+        learned=True 时，同网段/同运营商命中过但不在 ports 里的端口也会加入候选。
+        """
+        scores = self.scores(ip, isp)
+        candidates = list(dict.fromkeys(int(p) for p in ports))
+        if learned:
+            known = set(candidates)
+            for level, key in level_keys(ip, isp or self.isp_of.get(ip)).items():
+                if level == "global":
+                    continue
+                for port in self.hits.get((level, key), ()):
+                    if port not in known:
+                        known.add(port)
+                        candidates.append(port)
+        order = {p: i for i, p in enumerate(candidates)}
+        return sorted(candidates, key=lambda p: (-scores.get(p, 0.0), order[p]))
+
+
+def first_url_host(file_path):
+    """文件名里没有端口时，读到第一条链接为止取 ip:port"""
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            for line in f:
+                m = URL_HOST_RE.match(line.strip())
+                if m:
+                    return m.group(1), int(m.group(2))
+    except OSError:
+        pass
+    return None
+
+
+def learn_from_dir(ranker, directory):
+    if not os.path.isdir(directory):
+        return
+    for filename in os.listdir(directory):
+        m = FILENAME_RE.match(filename)
+        if not m:
+            continue
+        ip = m.group("ip").replace("_", ".")
+        # "组播源" 之类的兜底标签不带运营商信息，不参与运营商层级
+        isp = m.group("isp") if carrier_of(m.group("isp")) else None
+        port = m.group("port")
+        if port is None:
+            host = first_url_host(os.path.join(directory, filename))
+            if not host or host[0] != ip:
+                continue
+            port = host[1]
+        ranker.add(ip, port, isp)
+
+
+def learn_from_history(ranker, history):
+    """history 为 history_store.HistoryStore：只学习最近一次成功的 ip:port"""
+    for entry in history.entries(alive_only=True):
+        ranker.add(entry.ip, entry.port)
+
+
+def load_ranker(directory, history=None):
+    """从输出目录的文件名与历史记录训练一个排序器（先读文件名以拿到运营商标签）"""
+    ranker = PortRanker()
+    learn_from_dir(ranker, directory)
+    if history is not None:
+        learn_from_history(ranker, history)
+    return ranker
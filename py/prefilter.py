@@ -0,0 +1,150 @@
+import time
+import errno
+import socket
+import selectors
+import concurrent.futures
+
+import http_client
+import instrument
+from http_client import HttpError, Profile
+
+# ===============================
+# 配置区：代理探测前的直连预筛（zubo_final / hotel / zubobsk 共用）
+# ===============================
+CONNECT_TIMEOUT = 3.0       # TCP 建连超时（秒）
+MAX_SOCKETS = 256           # 同时在飞的非阻塞连接数
+FINGERPRINT = True          # 端口开放后再做一次轻量 HTTP 指纹
+FINGERPRINT_WORKERS = 32
+STRICT_FINGERPRINT = False  # True：只放行识别出 udpxy / msd_lite / 酒店中间件的端口；False：任意 HTTP 服务都放行
+FINGERPRINT_PROFILE = Profile("fingerprint", 3, 3, retries=0)
+
+# 各类型的指纹：依次请求的路径 + 响应头/正文里的特征
+SIGNATURES = {
+    "multicast": (
+        ("/status", (("udpxy", "udpxy"), ("msd_lite", "msd_lite"), ("Multi stream daemon", "msd_lite"))),
+        ("/stat", (("msd_lite", "msd_lite"), ("Multi stream daemon", "msd_lite"), ("udpxy", "udpxy"))),
+    ),
+    "hotel": (
+        ("/", (("ZHGXTV", "hotel"), ("智慧光迅", "hotel"), ("iptv", "hotel"), ("IPTV", "hotel"),
+               ("酒店", "hotel"), ("hotel", "hotel"), ("newlive", "hotel"))),
+    ),
+}
+IN_PROGRESS = {errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY, getattr(errno, "WSAEWOULDBLOCK", 10035)}
+
+
+def sim_tcp_scan(pairs):
+    """替身服务器模式：端口开放与否由它的场景决定"""
+    res = http_client.post(f"{http_client.SIM_URL}/__sim/tcp", "api", raise_for_status=True,
+                           json={"pairs": [[ip, int(port)] for ip, port in pairs]})
+    wanted = {(ip, int(port)): (ip, port) for ip, port in pairs}
+    return {wanted[(ip, port)] for ip, port in res.json()["open"]}
+
+
+def tcp_scan(pairs, timeout=CONNECT_TIMEOUT, max_sockets=MAX_SOCKETS):
+    """非阻塞批量 TCP 建连：返回能建立连接的 {(ip, port)}"""
+    if http_client.SIM_URL:
+        return sim_tcp_scan(pairs)
+    pending = list(dict.fromkeys(pairs))
+    pending.reverse()
+    opened = set()
+    inflight = {}
+    sel = selectors.DefaultSelector()
+
+    def finish(sock):
+        sel.unregister(sock)
+        inflight.pop(sock, None)
+        sock.close()
+
+    try:
+        while pending or inflight:
+            while pending and len(inflight) < max_sockets:
+                ip, port = pending.pop()
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.setblocking(False)
+                try:
+                    code = sock.connect_ex((ip, int(port)))
+                except OSError:
+                    sock.close()
+                    continue
+                if code == 0:
+                    opened.add((ip, port))
+                    sock.close()
+                elif code in IN_PROGRESS:
+                    sel.register(sock, selectors.EVENT_WRITE)
+                    inflight[sock] = (ip, port, time.monotonic() + timeout)
+                else:
+                    sock.close()
+            if not inflight:
+                continue
+            wait = max(0.0, min(deadline for _, _, deadline in inflight.values()) - time.monotonic())
+            for key, _ in sel.select(timeout=wait):
+                sock = key.fileobj
+                ip, port, _ = inflight[sock]
+                if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                    opened.add((ip, port))
+                finish(sock)
+            now = time.monotonic()
+            for sock in [s for s, (_, _, deadline) in inflight.items() if deadline <= now]:
+                finish(sock)
+    finally:
+        for sock in list(inflight):
+            finish(sock)
+        sel.close()
+    return opened
+
+
+def fingerprint(ip, port, kind):
+    """
+    轻量 HTTP 指纹：返回 udpxy / msd_lite / hotel（识别出已知服务）、http（普通 HTTP 服务）
+    或 None（不是 HTTP 服务，或无响应）
+    """
+    label = None
+    for path, markers in SIGNATURES.get(kind, ()):
+        try:
+            res = http_client.get(f"http://{ip}:{port}{path}", FINGERPRINT_PROFILE, stream=True)
+        except HttpError:
+            continue
+        try:
+            text = res.headers.get("Server", "") + "\n" + res.raw.read(4096, decode_content=True).decode("utf-8", "replace")
+        except Exception:
+            text = res.headers.get("Server", "")
+        finally:
+            res.close()
+        label = "http"
+        for marker, name in markers:
+            if marker in text:
+                return name
+    return label
+
+
+@instrument.timed("prefilter")
+def filter_ports(targets, ports_for, kind, fingerprint_ports=FINGERPRINT, strict=STRICT_FINGERPRINT, stats=None):
+    """
+    对每个目标的候选端口先做 TCP 预筛（可选 HTTP 指纹），
+    返回 ({ip: [放行的端口，保持原顺序]}, TCP 能建连的 {(ip, port)})：
+    没放行的端口里，能建连、只是指纹不符的并没有关闭，调用方据此区分记录。
+    stats 若传入 dict，会填入 candidates / open / passed 计数与各端口的指纹结果 labels。
+    """
+    plan = {ip: list(dict.fromkeys(ports_for(ip))) for ip in targets}
+    pairs = [(ip, port) for ip, ports in plan.items() for port in ports]
+    opened = tcp_scan(pairs)
+    labels = {}
+    if fingerprint_ports and opened:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=FINGERPRINT_WORKERS) as executor:
+            futures = {executor.submit(fingerprint, ip, port, kind): (ip, port) for ip, port in opened}
+            for future in concurrent.futures.as_completed(futures):
+                labels[futures[future]] = future.result()
+
+    def passes(pair):
+        if pair not in opened:
+            return False
+        if not fingerprint_ports:
+            return True
+        label = labels.get(pair)
+        return label is not None and (label != "http" or not strict)
+
+    allowed = {ip: [port for port in ports if passes((ip, port))] for ip, ports in plan.items()}
+    if stats is not None:
+        stats.update(candidates=len(pairs), open=len(opened),
+                     passed=sum(len(p) for p in allowed.values()), labels=labels)
+    return allowed, opened
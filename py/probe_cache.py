@@ -0,0 +1,110 @@
+import os
+import time
+import sqlite3
+import threading
+
+# ===============================
+# 配置区：探测结果的持久缓存（清理脚本与扫描脚本共用）
+# ===============================
+CACHE_FILE = os.path.join(".cache", "liveness.sqlite")
+POSITIVE_TTL = 6 * 3600     # "可用" 结论的有效期（秒）
+NEGATIVE_TTL = 3600         # "失效" 结论的有效期（秒），短一些以免误杀刚恢复的源
+PRUNE_AGE = 7 * 24 * 3600   # 超过该时长的旧记录在 prune() 时删除
+
+# kind: url=单条播放地址 / host=上游 host:port
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS probe (
+    kind       TEXT NOT NULL,
+    key        TEXT NOT NULL,
+    checked_at REAL NOT NULL,
+    ok         INTEGER NOT NULL,
+    status     INTEGER,
+    latency    REAL,
+    bitrate    REAL,
+    PRIMARY KEY (kind, key)
+)
+"""
+
+
+class ProbeRecord:
+    __slots__ = ("kind", "key", "checked_at", "ok", "status", "latency", "bitrate")
+
+    def __init__(self, kind, key, checked_at, ok, status, latency, bitrate=None):
+        self.kind = kind
+        self.key = key
+        self.checked_at = checked_at
+        self.ok = bool(ok)
+        self.status = status
+        self.latency = latency      # 秒：首字节时间（没有时为整次探测耗时）
+        self.bitrate = bitrate      # bit/s：持续码率（仅流探测有）
+
+    def __repr__(self):
+        return f"ProbeRecord({self.kind}:{self.key}, ok={self.ok}, status={self.status})"
+
+
+class ProbeCache:
+    """SQLite 存储：按 (kind, key) 记录最近一次检测结论，读取时按正/负 TTL 判断是否仍新鲜"""
+
+    def __init__(self, path=CACHE_FILE, positive_ttl=POSITIVE_TTL, negative_ttl=NEGATIVE_TTL):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(probe)")}
+        if "bitrate" not in columns:
+            # 兼容旧版缓存库
+            self._db.execute("ALTER TABLE probe ADD COLUMN bitrate REAL")
+        self._db.commit()
+
+    def is_fresh(self, record, now=None):
+        ttl = self.positive_ttl if record.ok else self.negative_ttl
+        return (now or time.time()) - record.checked_at < ttl
+
+    def get(self, kind, key, fresh_only=True):
+        """返回 ProbeRecord；fresh_only=True 时过期记录视为不存在"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT kind, key, checked_at, ok, status, latency, bitrate FROM probe WHERE kind=? AND key=?",
+                (kind, key)).fetchone()
+        if row is None:
+            return None
+        record = ProbeRecord(*row)
+        if fresh_only and not self.is_fresh(record):
+            return None
+        return record
+
+    def put(self, kind, key, ok, status=None, latency=None, bitrate=None, checked_at=None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO probe (kind, key, checked_at, ok, status, latency, bitrate) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, key, checked_at or time.time(), int(bool(ok)), status, latency, bitrate))
+            self._db.commit()
+
+    def get_url(self, url):
+        return self.get("url", url)
+
+    def get_host(self, host):
+        return self.get("host", host)
+
+    def put_url(self, url, ok, status=None, latency=None, bitrate=None):
+        self.put("url", url, ok, status, latency, bitrate)
+
+    def put_host(self, host, ok, status=None, latency=None, bitrate=None):
+        self.put("host", host, ok, status, latency, bitrate)
+
+    def prune(self, max_age=PRUNE_AGE):
+        """删除早于 max_age 的记录，防止库无限增长"""
+        cutoff = time.time() - max_age
+        with self._lock:
+            cur = self._db.execute("DELETE FROM probe WHERE checked_at < ?", (cutoff,))
+            self._db.commit()
+        return cur.rowcount
+
+    def close(self):
+        with self._lock:
+            self._db.close()
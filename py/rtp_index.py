@@ -0,0 +1,181 @@
+import os
+import sys
+import time
+import sqlite3
+
+import merge_cache
+import instrument
+
+# ===============================
+# 配置区：组播地址索引（zubo_rtp 维护，也可直接命令行查询）
+# ===============================
+INDEX_FILE = os.path.join(".cache", "rtp_index.sqlite")
+PRUNE_AGE = 30 * 24 * 3600   # 已从所有文件消失、且超过该时长没再出现的 seen 记录在 prune() 时删除
+USAGE = """用法:
+  python py/rtp_index.py group 239.3.1.241:8000   哪些服务器在转发这个组播
+  python py/rtp_index.py isp 上海电信              这个运营商有哪些组播"""
+
+# source:  每个 zubo 文件的 size / mtime / 内容哈希，没变的文件不重新解析
+# channel: 当前每个文件贡献的 (运营商, 组播地址, 服务器, 频道名)，pos 为文件内顺序
+# seen:    (运营商, 组播地址, 服务器) 的首次/最近出现时间，文件删除后仍保留，超过 PRUNE_AGE 由 prune() 清理
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS source (
+    file  TEXT PRIMARY KEY,
+    size  INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    sha1  TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS channel (
+    file   TEXT NOT NULL,
+    pos    INTEGER NOT NULL,
+    isp    TEXT NOT NULL,
+    addr   TEXT NOT NULL,
+    server TEXT NOT NULL,
+    name   TEXT NOT NULL,
+    PRIMARY KEY (file, pos)
+);
+CREATE INDEX IF NOT EXISTS channel_addr ON channel (addr);
+CREATE INDEX IF NOT EXISTS channel_isp ON channel (isp, addr);
+CREATE TABLE IF NOT EXISTS seen (
+    isp        TEXT NOT NULL,
+    addr       TEXT NOT NULL,
+    server     TEXT NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen  REAL NOT NULL,
+    PRIMARY KEY (isp, addr, server)
+);
+"""
+
+
+class RtpIndex:
+    """
+    (运营商, rtp 组播地址:端口) -> 频道名 / 承载服务器 / 首次与最近出现时间。
+    sync() 只重新解析新增或内容变化的 zubo 文件，并返回受影响的运营商，
+    调用方只需重写这些运营商的列表。
+    """
+
+    def __init__(self, path=INDEX_FILE):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.executescript(SCHEMA)
+
+    @instrument.timed("index")
+    def sync(self, source_dir, filenames, parse_file, rules=""):
+        """
+        parse_file(path) 返回 [(运营商, 组播地址, 服务器, 频道名), ...]。
+        rules 为解析规则指纹，变化时整库重建。返回 (受影响的运营商集合, 统计)。
+        """
+        db = self._db
+        now = time.time()
+        stats = {"reused": 0, "parsed": 0, "removed": 0}
+        row = db.execute("SELECT value FROM meta WHERE key='rules'").fetchone()
+        if row is None or row[0] != rules:
+            db.execute("DELETE FROM source")
+            db.execute("DELETE FROM channel")
+            db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('rules', ?)", (rules,))
+        known = {file: (size, mtime, sha1) for file, size, mtime, sha1 in db.execute("SELECT * FROM source")}
+        affected = set()
+
+        def drop(file):
+            affected.update(isp for (isp,) in db.execute("SELECT DISTINCT isp FROM channel WHERE file=?", (file,)))
+            db.execute("DELETE FROM channel WHERE file=?", (file,))
+            db.execute("DELETE FROM source WHERE file=?", (file,))
+
+        for file in filenames:
+            path = os.path.join(source_dir, file)
+            st = os.stat(path)
+            old = known.get(file)
+            if old and old[:2] == (st.st_size, st.st_mtime_ns):
+                stats["reused"] += 1
+                continue
+            digest = merge_cache.file_digest(path)
+            if old and old[2] == digest:
+                db.execute("UPDATE source SET size=?, mtime=? WHERE file=?", (st.st_size, st.st_mtime_ns, file))
+                stats["reused"] += 1
+                continue
+            rows = parse_file(path)
+            drop(file)
+            db.execute("INSERT INTO source (file, size, mtime, sha1) VALUES (?, ?, ?, ?)",
+                       (file, st.st_size, st.st_mtime_ns, digest))
+            db.executemany("INSERT INTO channel (file, pos, isp, addr, server, name) VALUES (?, ?, ?, ?, ?, ?)",
+                           [(file, pos) + tuple(r) for pos, r in enumerate(rows)])
+            db.executemany("INSERT INTO seen (isp, addr, server, first_seen, last_seen) VALUES (?, ?, ?, ?, ?) "
+                           "ON CONFLICT (isp, addr, server) DO UPDATE SET last_seen=excluded.last_seen",
+                           {(isp, addr, server, now, now) for isp, addr, server, _ in rows})
+            affected.update(isp for isp, _, _, _ in rows)
+            stats["parsed"] += 1
+
+        for file in set(known) - set(filenames):
+            drop(file)
+            stats["removed"] += 1
+        # 仍在文件里的地址都算本次见过
+        db.execute("UPDATE seen SET last_seen=? WHERE EXISTS (SELECT 1 FROM channel c "
+                   "WHERE c.isp=seen.isp AND c.addr=seen.addr AND c.server=seen.server)", (now,))
+        db.commit()
+        return affected, stats
+
+    def isp_channels(self, isp):
+        """某运营商的 {组播地址: [频道名, ...]}，频道名按文件名、文件内顺序排列"""
+        result = {}
+        for addr, name in self._db.execute("SELECT addr, name FROM channel WHERE isp=? ORDER BY file, pos", (isp,)):
+            result.setdefault(addr, []).append(name)
+        return result
+
+    def servers(self, addr):
+        """承载某组播地址的服务器：[(运营商, 服务器, 首次出现, 最近出现)]，最近出现的在前"""
+        return self._db.execute(
+            "SELECT s.isp, s.server, s.first_seen, s.last_seen FROM seen s "
+            "WHERE s.addr=? AND EXISTS (SELECT 1 FROM channel c "
+            "WHERE c.isp=s.isp AND c.addr=s.addr AND c.server=s.server) "
+            "ORDER BY s.last_seen DESC", (addr,)).fetchall()
+
+    def groups(self, isp):
+        """某运营商当前的组播地址：[(组播地址, 频道名, 服务器数)]"""
+        return self._db.execute(
+            "SELECT addr, MIN(name), COUNT(DISTINCT server) FROM channel WHERE isp=? GROUP BY addr ORDER BY addr",
+            (isp,)).fetchall()
+
+    def prune(self, max_age=PRUNE_AGE):
+        """删除早于 max_age、且已不在任何文件里的 seen 记录，防止库无限增长"""
+        cutoff = time.time() - max_age
+        cur = self._db.execute(
+            "DELETE FROM seen WHERE last_seen < ? AND NOT EXISTS (SELECT 1 FROM channel c "
+            "WHERE c.isp=seen.isp AND c.addr=seen.addr AND c.server=seen.server)", (cutoff,))
+        self._db.commit()
+        return cur.rowcount
+
+    def close(self):
+        self._db.close()
+
+
+def fmt_time(ts):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(ts))
+
+
+def main():
+    if len(sys.argv) != 3 or sys.argv[1] not in ("group", "isp"):
+        print(USAGE)
+        return
+    index = RtpIndex()
+    try:
+        if sys.argv[1] == "group":
+            addr = sys.argv[2].replace("rtp://", "")
+            rows = index.servers(addr)
+            for isp, server, first_seen, last_seen in rows:
+                print(f"{isp}\t{server}\t首次 {fmt_time(first_seen)}\t最近 {fmt_time(last_seen)}")
+            print(f"共 {len(rows)} 个服务器")
+        else:
+            rows = index.groups(sys.argv[2])
+            for addr, name, servers in rows:
+                print(f"{name}\trtp://{addr}\t{servers} 个服务器")
+            print(f"共 {len(rows)} 个组播地址")
+    finally:
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
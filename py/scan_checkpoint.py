@@ -0,0 +1,146 @@
+import os
+import time
+import sqlite3
+import threading
+
+# ===============================
+# 配置区：扫描断点续跑（zubo_final / hotel / zubobsk 共用）
+# ===============================
+CHECKPOINT_FILE = os.path.join(".cache", "scan_checkpoint.sqlite")
+CLOSED_WINDOW = 24 * 3600       # 某 ip:port 判为关闭后，这段时间内不再探测
+RESUME_MAX_AGE = 12 * 3600      # 超过该时长的中断运行不再续跑
+PRUNE_AGE = 3 * 24 * 3600       # 超过该时长的探测记录与运行记录在 prune() 时删除
+CLOSED_OUTCOMES = ("closed", "tcp_closed")
+
+# outcome: hit=拿到列表 / closed=代理返回无内容 / tcp_closed=直连预筛建连失败 / error=探测异常
+#          no_fingerprint=端口能建连但指纹不符（端口是开的，不算关闭，不进 CLOSED_OUTCOMES）
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attempt (
+    ip         TEXT NOT NULL,
+    port       INTEGER NOT NULL,
+    outcome    TEXT NOT NULL,
+    elapsed    REAL,
+    checked_at REAL NOT NULL,
+    run_id     INTEGER,
+    PRIMARY KEY (ip, port)
+);
+CREATE TABLE IF NOT EXISTS run (
+    run_id      INTEGER PRIMARY KEY AUTOINCREMENT,
+    scope       TEXT NOT NULL,
+    started_at  REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS target (
+    run_id  INTEGER NOT NULL,
+    ip      TEXT NOT NULL,
+    isp     TEXT,
+    state   TEXT NOT NULL,   -- pending / done
+    found   INTEGER,
+    PRIMARY KEY (run_id, ip)
+);
+"""
+
+
+class ScanCheckpoint:
+    """
+    每次探测都即时落盘：目标、试过的端口、结论、耗时。
+    任务被超时杀掉或代理开始拦截时，下次运行 resume() 取回未扫完的目标，
+    is_closed() 跳过窗口期内已判关闭的端口，从中断处继续。
+    scope 区分不同扫描脚本（各自续跑自己的目标），端口结论则所有脚本共享。
+    """
+
+    def __init__(self, scope, path=CHECKPOINT_FILE, closed_window=CLOSED_WINDOW):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.scope = scope
+        self.closed_window = closed_window
+        self.run_id = None
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        self._db.commit()
+
+    # ---------- 运行与目标 ----------
+    def resume(self, max_age=RESUME_MAX_AGE):
+        """返回本 scope 近期中断运行里尚未扫完的目标 [(ip, isp)]，并把那些运行标记为结束"""
+        cutoff = time.time() - max_age
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT t.ip, t.isp FROM target t JOIN run r ON r.run_id = t.run_id "
+                "WHERE r.scope=? AND r.finished_at IS NULL AND r.started_at >= ? AND t.state='pending' "
+                "ORDER BY r.started_at, t.rowid", (self.scope, cutoff)).fetchall()
+            self._db.execute("UPDATE run SET finished_at=? WHERE scope=? AND finished_at IS NULL",
+                             (time.time(), self.scope))
+            self._db.commit()
+        return list(dict.fromkeys((ip, isp) for ip, isp in rows))
+
+    def begin(self, targets):
+        """登记本次运行的目标 [(ip, isp)]"""
+        with self._lock:
+            cur = self._db.execute("INSERT INTO run (scope, started_at) VALUES (?, ?)", (self.scope, time.time()))
+            self.run_id = cur.lastrowid
+            self._db.executemany("INSERT OR IGNORE INTO target (run_id, ip, isp, state) VALUES (?, ?, ?, 'pending')",
+                                 [(self.run_id, ip, isp) for ip, isp in targets])
+            self._db.commit()
+        return self.run_id
+
+    def target_done(self, ip, found):
+        with self._lock:
+            self._db.execute("UPDATE target SET state='done', found=? WHERE run_id=? AND ip=?",
+                             (int(bool(found)), self.run_id, ip))
+            self._db.commit()
+
+    def finish(self):
+        with self._lock:
+            self._db.execute("UPDATE run SET finished_at=? WHERE run_id=?", (time.time(), self.run_id))
+            self._db.commit()
+
+    # ---------- 端口结论 ----------
+    def is_closed(self, ip, port, now=None):
+        """该 ip:port 在窗口期内已判关闭"""
+        with self._lock:
+            row = self._db.execute("SELECT outcome, checked_at FROM attempt WHERE ip=? AND port=?",
+                                   (ip, int(port))).fetchone()
+        return (row is not None and row[0] in CLOSED_OUTCOMES
+                and (now or time.time()) - row[1] < self.closed_window)
+
+    def record(self, ip, port, outcome, elapsed=None):
+        self.record_many([(ip, port)], outcome, elapsed)
+
+    def record_many(self, pairs, outcome, elapsed=None):
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO attempt (ip, port, outcome, elapsed, checked_at, run_id) "
+                "VALUES (?, ?, ?, ?, ?, ?)", [(ip, int(port), outcome, elapsed, now, self.run_id) for ip, port in pairs])
+            self._db.commit()
+
+    def record_prefilter(self, candidates, allowed, opened):
+        """
+        记下直连预筛没放行的端口：candidates / allowed 为 {ip: [端口...]}，opened 为 TCP 能建连的 {(ip, port)}。
+        建连失败的记 tcp_closed（窗口期内跳过）；能建连、只是指纹不符的记 no_fingerprint，下次仍会预筛
+        """
+        rejected = [(ip, p) for ip, ports in candidates.items() for p in ports if p not in allowed[ip]]
+        self.record_many([pair for pair in rejected if pair not in opened], "tcp_closed")
+        self.record_many([pair for pair in rejected if pair in opened], "no_fingerprint")
+
+    def summary(self):
+        """本次运行的探测统计：{outcome: (次数, 总耗时)}"""
+        with self._lock:
+            rows = self._db.execute("SELECT outcome, COUNT(*), COALESCE(SUM(elapsed), 0) FROM attempt "
+                                    "WHERE run_id=? GROUP BY outcome", (self.run_id,)).fetchall()
+        return {outcome: (count, total) for outcome, count, total in rows}
+
+    def prune(self, max_age=PRUNE_AGE):
+        """删除过旧的探测记录，以及已结束或过旧的运行与其目标"""
+        cutoff = time.time() - max_age
+        with self._lock:
+            self._db.execute("DELETE FROM attempt WHERE checked_at < ?", (cutoff,))
+            self._db.execute("DELETE FROM run WHERE started_at < ? OR (finished_at IS NOT NULL AND run_id != ?)",
+                             (cutoff, self.run_id or -1))
+            self._db.execute("DELETE FROM target WHERE run_id NOT IN (SELECT run_id FROM run)")
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,315 @@
+import threading
+import time
+import random
+from collections import Counter, defaultdict
+
+import instrument
+import scheduler
+from port_rank import load_ranker
+from probe_cache import ProbeCache
+from discovery import WorkQueue
+from prefilter import filter_ports
+from scan_checkpoint import ScanCheckpoint
+
+# ======================
+# 配置区（zubo_final / hotel / zubobsk 共用的扫描引擎）
+# ======================
+MAX_WORKERS = 8             # 同时在飞的探测请求数
+GLOBAL_RATE = 1.0           # 全局每秒放行的请求数（对代理站的礼貌速率）
+GLOBAL_JITTER = 0.5         # 全局放行间隔的随机抖动（秒），模拟人工节奏
+PER_HOST_RATE = 0.5         # 单个目标 IP 每秒放行的请求数
+PER_HOST_CONCURRENCY = 2    # 单个目标 IP 同时探测的端口数
+
+
+class ProbeError(Exception):
+    """
+    probe 无法判断端口是否开放时抛出（代理拦截 / 代理本身出错）：
+    不算命中，也不会被断点记录为"关闭"，下次运行仍会重试
+    """
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class RateLimiter:
+    """间隔式限速器：保证相邻两次放行至少间隔 1/rate 秒（可附加随机抖动）"""
+
+    def __init__(self, rate, jitter=0.0):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self.jitter = jitter
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self, cancel=None):
+        """阻塞到下一个可用时间片；若 cancel 事件在等待期间被触发则返回 False"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval + (random.uniform(0, self.jitter) if self.jitter else 0)
+        delay = slot - time.monotonic()
+        if delay <= 0:
+            return not (cancel is not None and cancel.is_set())
+        began = time.monotonic()
+        try:
+            if cancel is not None:
+                return not cancel.wait(delay)
+            time.sleep(delay)
+            return True
+        finally:
+            instrument.add_sleep(time.monotonic() - began, "rate_limit")
+
+
+def unique_ports(ports):
+    """端口去重并保持原有顺序"""
+    return list(dict.fromkeys(ports))
+
+
+def build_plan(targets, ports, ports_for=None, order=None):
+    """
+    生成探测顺序：按端口名次在各目标之间轮转 (ip1:p1, ip2:p1, ..., ip1:p2, ...)
+    这样单个 IP 的限速不会拖住整体进度。
+    order({ip: [端口...]}) 可给出别的全局顺序（如 scheduler.value_order 按期望收益排序）
+    """
+    per_target = {ip: unique_ports(ports_for(ip) if ports_for else ports) for ip in targets}
+    if order is not None:
+        return order(per_target)
+    plan = []
+    depth = max((len(p) for p in per_target.values()), default=0)
+    for rank in range(depth):
+        for ip in targets:
+            if rank < len(per_target[ip]):
+                plan.append((ip, per_target[ip][rank]))
+    return plan
+
+
+@instrument.timed("scan")
+def scan_targets(targets, ports, probe, on_hit=None, ports_for=None,
+                 max_workers=MAX_WORKERS, global_rate=GLOBAL_RATE, global_jitter=GLOBAL_JITTER,
+                 per_host_rate=PER_HOST_RATE, per_host_concurrency=PER_HOST_CONCURRENCY, cache=None,
+                 checkpoint=None, order=None, deadline=None, stats=None):
+    """
+    并发扫描一批 (ip, port) 组合。
+
+    probe(ip, port) 返回非空内容即视为命中；同一 IP 一旦命中，其余尚未发出的端口全部取消。
+    on_hit(ip, port, content) 在命中时被串行调用（可安全写文件/写历史）。
+    ports_for(ip) 可为每个目标给出专属端口顺序，缺省时全部使用 ports。
+    cache 为 probe_cache.ProbeCache 时：清理脚本新近判为失效的 ip:port 直接跳过。
+    代理站的列表命中不代表上游真能出流，所以这里只读缓存、不写；存活结论只来自真实的拉流探测。
+    checkpoint 为 scan_checkpoint.ScanCheckpoint 时：窗口期内已判关闭的端口跳过，
+    每次探测的结论与耗时即时落盘，目标扫完（命中，或所有端口都有明确结论）时标记完成。
+    order 见 build_plan。deadline 为 scheduler.Deadline 时：剩余时间不够再发一次探测就停止派发，
+    没发出的 (ip, port) 留在断点里（目标保持未完成）。
+    stats 若传入 dict，会填入 probed 次数、unprobed 列表（不含已命中的目标），
+    以及 inconclusive：端口都探过、但有端口被拦截/出错而没得出结论的 IP（不含已命中和仍有 unprobed 的）。
+    这两类目标在断点里都保持未完成，调用方不能结束本次运行，也不能把它们标记为已处理。
+    返回 {ip: (port, content)}
+    """
+    targets = list(dict.fromkeys(targets))
+    pending = build_plan(targets, ports, ports_for, order)
+    remaining = Counter(ip for ip, _ in pending)
+    inconclusive = Counter()
+    unprobed = []
+    probed = Counter()
+    results = {}
+    found = {ip: threading.Event() for ip in targets}
+    active = defaultdict(int)
+    cond = threading.Condition()
+    hit_lock = threading.Lock()
+    global_limiter = RateLimiter(global_rate, global_jitter)
+    host_limiters = {ip: RateLimiter(per_host_rate) for ip in targets}
+
+    def take():
+        with cond:
+            while True:
+                # 丢弃已命中目标的剩余端口
+                if any(found[ip].is_set() for ip, _ in pending):
+                    pending[:] = [item for item in pending if not found[item[0]].is_set()]
+                if not pending:
+                    return None
+                if deadline is not None and not deadline.allows():
+                    return None
+                for idx, (ip, port) in enumerate(pending):
+                    if active[ip] < per_host_concurrency:
+                        del pending[idx]
+                        active[ip] += 1
+                        return ip, port
+                cond.wait()
+
+    def worker():
+        while True:
+            item = take()
+            if item is None:
+                return
+            ip, port = item
+            try:
+                cancel = found[ip]
+                if cache is not None:
+                    record = cache.get_host(f"{ip}:{port}")
+                    if record is not None and not record.ok:
+                        continue
+                if checkpoint is not None and checkpoint.is_closed(ip, port):
+                    continue
+                if not host_limiters[ip].wait(cancel) or not global_limiter.wait(cancel):
+                    continue
+                if deadline is not None and not deadline.allows():
+                    # 限速等待期间到点了：这个端口留给下次
+                    with cond:
+                        unprobed.append((ip, port))
+                        inconclusive[ip] += 1
+                    continue
+                began = time.monotonic()
+                try:
+                    content = probe(ip, port)
+                    outcome = "hit" if content else "closed"
+                except ProbeError as e:
+                    content, outcome = None, e.reason
+                except Exception:
+                    content, outcome = None, "error"
+                with cond:
+                    probed[ip] += 1
+                elapsed = time.monotonic() - began
+                if deadline is not None:
+                    deadline.observe(elapsed)
+                if checkpoint is not None:
+                    checkpoint.record(ip, port, outcome, elapsed)
+                if outcome not in ("hit", "closed"):
+                    with cond:
+                        inconclusive[ip] += 1
+                if not content:
+                    continue
+                with hit_lock:
+                    if cancel.is_set():
+                        continue
+                    cancel.set()
+                    results[ip] = (port, content)
+                    if on_hit:
+                        on_hit(ip, port, content)
+                    if checkpoint is not None:
+                        checkpoint.target_done(ip, True)
+            finally:
+                with cond:
+                    active[ip] -= 1
+                    remaining[ip] -= 1
+                    # 有端口因拦截/异常没得出结论的目标保持未完成，下次 resume() 时补扫
+                    exhausted = remaining[ip] == 0 and not found[ip].is_set() and not inconclusive[ip]
+                    cond.notify_all()
+                if exhausted and checkpoint is not None:
+                    checkpoint.target_done(ip, False)
+
+    if checkpoint is not None:
+        # 没有任何端口要探测的目标（预筛全关 / 窗口期内都判过关闭）直接算扫完
+        for ip in targets:
+            if not remaining[ip]:
+                checkpoint.target_done(ip, False)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, min(max_workers, len(pending))))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if stats is not None:
+        left = [(ip, port) for ip, port in unprobed + pending if ip not in results]
+        left_ips = {ip for ip, _ in left}
+        stats.update(probed=sum(probed.values()), unprobed=left,
+                     inconclusive=[ip for ip in targets
+                                   if inconclusive[ip] and ip not in results and ip not in left_ips])
+    return results
+
+
+def run_batch(kind, scope, targets, probe, ports, history, output_dir, on_hit=None, budget=10,
+              deadline=None, prefilter=True, known_ports=None, log=print):
+    """
+    扫描脚本共用的一轮流程，脚本只需给出探测函数、端口表与命中处理：
+    页面目标入持久队列并按优先级领取 budget 个 → 续跑上次没扫完的目标 → 跳过历史里已存的 IP →
+    端口按 port_rank 排序并跳过窗口期内已判关闭的 → 直连预筛 → 按期望收益排序 → scan_targets。
+    没探完、或有端口被拦截/出错结论未定的目标留在断点与队列里下次续跑，其余在队列里标记为已处理。
+
+    kind 为目标类型（multicast / hotel），scope 为断点与 deadline 事件的作用域（即历史分段名）。
+    targets 为 discovery.Target 列表，history 为 HistoryStore，output_dir 供 port_rank 学习已有文件名。
+    deadline 缺省时从调用时开始计时；脚本在调用前还有耗时步骤的，应在启动时建好再传进来。
+    known_ports(ips, novelty, deadline) 可返回 {ip: [已知开放的端口]}（如 fofa 结果），
+    这些端口排在端口表前面，并按 http 指纹参与期望收益排序。
+    log 为脚本自己的日志函数。返回 {ip: (port, content)}
+    """
+    deadline = deadline or scheduler.Deadline()
+    queue = WorkQueue()
+    added = queue.push(targets, history)
+    batch = queue.take(kind, budget)
+    log(f"📊 页面共 {len(targets)} 个 {kind} 目标，新入队 {added} 个，本次领取 {len(batch)} 个，"
+        f"队列剩余 {queue.pending(kind)} 个")
+
+    # 上次被超时杀掉/中断时没扫完的目标排在最前面续跑
+    checkpoint = ScanCheckpoint(scope)
+    resumed = checkpoint.resume()
+    if resumed:
+        log(f"♻️  续跑上次中断的 {len(resumed)} 个目标")
+
+    isp_of = {}
+    pending_ips = []
+    for ip, isp in resumed + batch:
+        if ip in isp_of:
+            continue
+        if history.known(ip):
+            log(f"⏭️  跳过已存 IP: {ip}")
+            queue.done(kind, ip, True)
+            continue
+        isp_of[ip] = isp or None
+        pending_ips.append(ip)
+    checkpoint.begin([(ip, isp_of[ip]) for ip in pending_ips])
+
+    novelty = scheduler.novelty_of(targets, resumed)
+    known = known_ports(pending_ips, novelty, deadline) if known_ports else {}
+    ranker = load_ranker(output_dir, history)
+
+    def ports_for(ip):
+        first = known.get(ip, [])
+        ranked = first + [p for p in ranker.rank(ip, ports, isp=isp_of[ip]) if p not in first]
+        # 窗口期内已判关闭的端口不再试
+        return [p for p in ranked if not checkpoint.is_closed(ip, p)]
+
+    candidates = {ip: ports_for(ip) for ip in pending_ips}
+    pre = {}
+    if prefilter:
+        allowed, opened = filter_ports(pending_ips, candidates.get, kind, stats=pre)
+        checkpoint.record_prefilter(candidates, allowed, opened)
+        candidates = allowed
+        log(f"🧲 直连预筛: 候选 {pre['candidates']} 个端口，开放 {pre['open']} 个，放行 {pre['passed']} 个")
+
+    labels = dict(pre.get("labels", {}))
+    for ip, open_ports in known.items():
+        for port in open_ports:
+            labels.setdefault((ip, port), "http")
+    log(f"📡 并发扫描 {len(pending_ips)} 个目标 × {len(ports)} 个端口")
+    # 按期望收益（目标新颖度 × 端口命中概率）排序，预算先花在最有希望的探测上
+    order = scheduler.value_order(ranker, isp_of, novelty, labels)
+    cache = ProbeCache()
+    stats = {}
+    found = scan_targets(pending_ips, ports, probe, on_hit=on_hit, ports_for=candidates.get,
+                         cache=cache, checkpoint=checkpoint, order=order, deadline=deadline, stats=stats)
+    cache.close()
+    history.compact()
+    summary = checkpoint.summary()
+    log("🧾 本次探测: " + "，".join(f"{k} {n} 次 (平均 {t / n:.1f}s)" for k, (n, t) in summary.items()))
+
+    # 没探完的、以及有端口被拦截/出错没得出结论的目标，都留给下次续跑：
+    # 不结束本次运行（下次 resume() 会取回它们，已判关闭的端口不再重试），也不在队列里标记为已处理
+    leftover = {ip for ip, _ in stats["unprobed"]} | set(stats["inconclusive"])
+    message = scheduler.report(scope, deadline, stats["unprobed"])
+    if message:
+        log(message)
+    if stats["inconclusive"]:
+        log(f"🛡️ {len(stats['inconclusive'])} 个目标有端口被拦截或代理出错，结论未定，下次运行续跑")
+    if not leftover:
+        checkpoint.finish()
+    checkpoint.prune()
+    checkpoint.close()
+
+    for ip in pending_ips:
+        if ip in leftover:
+            continue
+        queue.done(kind, ip, ip in found)
+        if ip not in found:
+            log(f"❌ {ip} 扫描结束，没有可用的服务")
+    queue.close()
+    return found
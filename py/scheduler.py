@@ -0,0 +1,110 @@
+import os
+import time
+import threading
+from collections import Counter
+
+import instrument
+from port_rank import LEVEL_WEIGHTS
+
+# ===============================
+# 配置区：按截止时间与期望收益调度探测（zubo_final / hotel / zubobsk 共用）
+# ===============================
+# 单次运行的墙钟预算（秒），工作流里用 SCAN_DEADLINE 覆盖；到点前停止派发新探测，留出收尾时间
+# 工作流 job 的 timeout-minutes 必须明显大于该预算（预算之后还有合并与提交），
+# 否则任务在收尾前就被杀掉；两者要一起改（zubo.yml / hotel.yml 当前为 2400s 对 55 分钟）
+RUN_BUDGET = float(os.environ.get("SCAN_DEADLINE", 40 * 60))
+RESERVE = 60.0          # 收尾预留：在飞探测的超时 + 保存结果 / 压缩历史 / 写断点
+PROBE_COST = 10.0       # 还没有观测值时，一次代理探测的预估耗时（秒）
+COST_SMOOTHING = 0.2    # 探测耗时的指数滑动平均系数
+BASE_HIT = 0.02         # 没有任何历史信号的端口的命中概率
+# 直连预筛识别出的服务类型，对应的命中概率下限
+LABEL_HIT = {"udpxy": 0.6, "msd_lite": 0.6, "hotel": 0.5, "http": 0.1}
+# 目标新颖度：页面标记新上线的 > 上次没扫完的（已排除一部分关闭端口）> 其他
+NOVELTY_NEW = 2.0
+NOVELTY_RESUMED = 1.5
+
+
+class Deadline:
+    """
+    一次运行的截止时间。allows() 判断剩余时间是否还够再发一次探测（按观测到的平均耗时估计），
+    不够时扫描引擎停止派发新探测，已发出的探测在 reserve 预留的时间内收尾。
+    """
+
+    def __init__(self, budget=RUN_BUDGET, reserve=RESERVE, cost=PROBE_COST):
+        self.budget = budget
+        self.reserve = reserve
+        self.cost = cost
+        self.started = time.monotonic()
+        self.stopped = False
+        self._lock = threading.Lock()
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def remaining(self):
+        return self.budget - self.elapsed()
+
+    def allows(self, cost=None):
+        """剩余时间扣掉预留后，还够不够一次耗时为 cost（缺省为平均探测耗时）的操作"""
+        if self.remaining() - self.reserve >= (self.cost if cost is None else cost):
+            return True
+        self.stopped = True
+        return False
+
+    def observe(self, elapsed):
+        """记一次探测的实际耗时，更新平均耗时"""
+        with self._lock:
+            self.cost += COST_SMOOTHING * (elapsed - self.cost)
+
+
+def novelty_of(targets=(), resumed=()):
+    """由页面目标（discovery.Target）与续跑列表 [(ip, isp)] 得出 {ip: 新颖度}"""
+    novelty = {ip: NOVELTY_RESUMED for ip, _ in resumed}
+    for t in targets:
+        if "新" in t.status:
+            novelty[t.ip] = max(novelty.get(t.ip, 1.0), NOVELTY_NEW)
+    return novelty
+
+
+def hit_probability(scores, port, label=None):
+    """端口命中概率：port_rank 的加权命中率归一化后叠加在先验上，预筛指纹给出下限"""
+    share = min(1.0, scores.get(port, 0.0) / sum(LEVEL_WEIGHTS.values()))
+    return max(BASE_HIT + (1 - BASE_HIT) * share, LABEL_HIT.get(label, 0.0))
+
+
+def value_order(ranker, isp_of=None, novelty=None, labels=None):
+    """
+    返回 scanner.build_plan 用的排序函数：把 {ip: [端口...]} 展开成按期望收益降序的 (ip, port) 序列。
+    期望收益 = 目标新颖度 × 该端口命中概率 × 该 IP 排在前面的端口都没命中的概率
+    （同一 IP 命中后其余端口会被取消，越靠后的端口越可能白跑）。
+    labels 为 prefilter 的 {(ip, port): 指纹}。
+    """
+    isp_of = isp_of or {}
+    novelty = novelty or {}
+    labels = labels or {}
+
+    def order(per_target):
+        scored = []
+        for pos, (ip, ports) in enumerate(per_target.items()):
+            scores = ranker.scores(ip, isp_of.get(ip))
+            probs = sorted(((hit_probability(scores, port, labels.get((ip, port))), rank, port)
+                            for rank, port in enumerate(ports)), key=lambda x: (-x[0], x[1]))
+            survive = novelty.get(ip, 1.0)
+            for rank, (p, _, port) in enumerate(probs):
+                scored.append((-survive * p, rank, pos, ip, port))
+                survive *= 1 - p
+        scored.sort()
+        return [(ip, port) for _, _, _, ip, port in scored]
+
+    return order
+
+
+def report(scope, deadline, unprobed):
+    """到点停止时汇总没来得及探测的工作并写一条 deadline 事件；返回给日志用的一句话（没有剩余时为 None）"""
+    if not unprobed:
+        return None
+    per_ip = Counter(ip for ip, _ in unprobed)
+    instrument.emit("deadline", scope=scope, budget=deadline.budget, elapsed=round(deadline.elapsed(), 1),
+                    targets=len(per_ip), pairs=len(unprobed), cost=round(deadline.cost, 2))
+    return (f"⏳ 时间预算 {deadline.budget:.0f}s 即将用尽（已用 {deadline.elapsed():.0f}s，收尾预留 {deadline.reserve:.0f}s）："
+            f"{len(per_ip)} 个目标的 {len(unprobed)} 个端口未探测，下次运行续跑")
@@ -0,0 +1,397 @@
+import sys
+import json
+import math
+import time
+import base64
+import random
+import hashlib
+import argparse
+import threading
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ===============================
+# 配置区：离线替身服务器
+# 模拟 cqshushu 代理站 / fofa / udpxy、msd_lite 组播转发 / 酒店 HLS / Cloudflare API。
+# 启动后设置 IPTV_SIM_URL=http://127.0.0.1:8765 再运行任意脚本，
+# http_client 会把所有请求经由它转发（它本身就是一个 HTTP 代理），prefilter 的 TCP 预筛也改问它。
+# ===============================
+HOST = "127.0.0.1"
+PORT = 8765
+PROXY_HOSTS = ("iptv.cqshushu.com",)
+FOFA_HOST = "fofa.info"
+CLOUDFLARE_HOST = "api.cloudflare.com"
+TS_PACKET = 188
+# 目标服务器上可能开放的端口（取扫描脚本端口表里最常见的几个）
+TARGET_PORTS = [8188, 8222, 8888, 4000, 6636, 9999, 8001, 55555, 10000, 4022, 85, 808, 9901, 9003, 8181]
+
+SCENARIOS = {
+    # 接近线上的常态
+    "default": {
+        "seed": 1,
+        "targets": 1000,                 # 首页列出的目标数（一半 hotel，一半 multicast）
+        "target_open_rate": 0.6,         # 首页目标有一个端口开放的概率
+        "open_rate": 0.01,               # 其余任意 ip:port 开放的概率
+        "open": {},                      # 指定开放端口 {"1.2.3.4": [8188, 4022]}，优先于概率
+        "closed": {},                    # 指定关闭端口，优先于概率
+        "services": {"udpxy": 0.6, "msd_lite": 0.2, "http": 0.2},    # 组播端口上的服务类型
+        "latency": {"median_ms": 80, "sigma": 0.8, "max_ms": 8000},  # 每个请求的对数正态延迟
+        "proxy_closed_ms": 2000,         # 代理站探测关闭端口时额外的等待（代理自己在等超时）
+        "blocked_rate": 0.02,            # 代理站返回 "请稍候" 防刷页的概率
+        "error_rate": 0.01,              # 返回 HTTP 错误的概率
+        "error_codes": [500, 502, 503, 429],
+        # 直播流的表现：正常 / 慢速滴流 / 中途截断 / HTTP 错误 / HTML 错误页
+        "streams": {"ok": 0.75, "slow_drip": 0.08, "truncated": 0.07, "error": 0.05, "html": 0.05},
+        "bitrate": 4000000,              # 正常流码率（bit/s）
+        "stream_seconds": 8,             # 正常流最长持续时间
+        "drip_interval": 1.5,            # 慢速滴流：每隔多少秒发一个 TS 包
+        "truncate_packets": 20,          # 截断流：发这么多包后断开
+        "channels": 60,                  # 代理站返回的列表频道数
+    },
+    # 代理站频繁拦截、出错，用来压测退避与断点续跑
+    "hostile": {"blocked_rate": 0.3, "error_rate": 0.15, "latency": {"median_ms": 400, "sigma": 1.2, "max_ms": 15000}},
+    # 长尾延迟明显，用来看 p99
+    "slow": {"latency": {"median_ms": 300, "sigma": 1.5, "max_ms": 20000}, "proxy_closed_ms": 8000,
+             "streams": {"ok": 0.5, "slow_drip": 0.3, "truncated": 0.1, "error": 0.05, "html": 0.05}},
+    # 全部可用，测吞吐上限
+    "fast": {"latency": {"median_ms": 5, "sigma": 0.1, "max_ms": 50}, "proxy_closed_ms": 0, "blocked_rate": 0,
+             "error_rate": 0, "streams": {"ok": 1.0}, "target_open_rate": 1.0},
+}
+
+
+def load_scenario(name_or_path):
+    """内置场景名，或 JSON 文件（其中的键覆盖 default）"""
+    scenario = json.loads(json.dumps(SCENARIOS["default"]))
+    if name_or_path in SCENARIOS:
+        overrides = SCENARIOS[name_or_path]
+    else:
+        with open(name_or_path, "r", encoding="utf-8") as f:
+            overrides = json.load(f)
+    scenario.update(overrides)
+    return scenario
+
+
+def uniform(*parts):
+    """由参数确定的 [0, 1) 伪随机数：同一场景下每个 ip:port 的行为固定，便于复现"""
+    digest = hashlib.md5("|".join(map(str, parts)).encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+
+def pick(weights, u):
+    total = sum(weights.values())
+    acc = 0.0
+    for key, weight in weights.items():
+        acc += weight / total
+        if u < acc:
+            return key
+    return key
+
+
+def ts_packets(count, counter=0):
+    """count 个合法 TS 包（0x47 同步字节 + PID 0x100 + 连续计数器）"""
+    out = bytearray()
+    for i in range(count):
+        out += bytes((0x47, 0x01, 0x00, 0x10 | ((counter + i) & 0x0F))) + b"\xff" * (TS_PACKET - 4)
+    return bytes(out)
+
+
+class World:
+    """场景对应的 "互联网"：首页目标、各 ip:port 是否开放、跑什么服务、流的表现"""
+
+    def __init__(self, scenario):
+        self.s = scenario
+        self.seed = scenario["seed"]
+        self.targets = []
+        self.target_port = {}
+        for i in range(scenario["targets"]):
+            ip = ".".join(str(1 + int(uniform(self.seed, "ip", i, k) * 222)) for k in range(4))
+            kind = "hotel" if i % 2 else "multicast"
+            self.targets.append((ip, kind, i))
+            if uniform(self.seed, "target_open", ip) < scenario["target_open_rate"]:
+                self.target_port[ip] = TARGET_PORTS[int(uniform(self.seed, "port", ip) * len(TARGET_PORTS))]
+        self.kind_of = {ip: kind for ip, kind, _ in self.targets}
+        self.stats = defaultdict(Counter)
+        self.lock = threading.Lock()
+
+    def count(self, route, outcome):
+        with self.lock:
+            self.stats[route][outcome] += 1
+
+    def is_open(self, ip, port):
+        port = int(port)
+        if port in self.s["closed"].get(ip, ()):
+            return False
+        if port in self.s["open"].get(ip, ()):
+            return True
+        if ip in self.target_port:
+            return self.target_port[ip] == port
+        return uniform(self.seed, "open", ip, port) < self.s["open_rate"]
+
+    def service(self, ip, port):
+        if self.kind_of.get(ip) == "hotel":
+            return "hotel"
+        return pick(self.s["services"], uniform(self.seed, "service", ip, port))
+
+    def stream_mode(self, ip, port, path):
+        return pick(self.s["streams"], uniform(self.seed, "stream", ip, port, path))
+
+    def latency(self, rng):
+        lat = self.s["latency"]
+        return min(lat["median_ms"] * math.exp(lat["sigma"] * rng.gauss(0, 1)), lat["max_ms"]) / 1000
+
+    def home_page(self):
+        rows = []
+        for ip, kind, i in self.targets:
+            region = "广东省梅州市五华县酒店 广东电信" if kind == "hotel" else "上海市杨浦区组播 上海电信"
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time() - i * 60))
+            rows.append(
+                "<tr>\n"
+                f"<td data-label=\"IP:\"><a href=\"javascript:void(0)\" onclick=\"gotoIP('{base64.b64encode(ip.encode()).decode()}', '{kind}')\">{ip}</a></td>\n"
+                f"<td data-label=\"节目数:\"><strong>{30 + i % 200}</strong></td>\n"
+                f"<td data-label=\"类型:\">{region}</td>\n"
+                f"<td data-label=\"上线时间:\">{stamp}</td>\n"
+                f"<td data-label=\"更新时间:\">{stamp}</td>\n"
+                f"<td data-label=\"状态:\"><span>{'新上线' if i % 7 == 0 else '在线'}</span></td>\n"
+                "</tr>")
+        return ("<html><body><table class=\"iptv-table\"><tbody>\n" + "\n".join(rows)
+                + "\n</tbody></table></body></html>\n")
+
+    def playlist(self, ip, port, kind):
+        group = "广东省梅州市五华县酒店 广东电信" if kind == "hotel" else "上海市杨浦区组播 上海电信"
+        lines = ['#EXTM3U x-tvg-url="https://fy.188766.xyz/e.xml" tvg-shift="0"']
+        for i in range(self.s["channels"]):
+            name = f"CCTV{i + 1}" if i < 17 else f"频道{i + 1}"
+            lines.append(f'#EXTINF:-1 tvg-id="{name}" tvg-logo="" group-title="{group}",{name}')
+            if kind == "hotel":
+                lines.append(f"http://{ip}:{port}/tsfile/live/{i + 1:04d}_1.m3u8?key=txiptv&amp;playlive=1&amp;authid=0")
+            else:
+                lines.append(f"http://{ip}:{port}/rtp/239.{i // 250}.{i % 250}.{1 + i % 200}:5140")
+        return "\n".join(lines) + "\n"
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    world = None
+
+    def log_message(self, fmt, *args):
+        pass
+
+    # ---------- 基础 ----------
+    def target(self):
+        """代理形式的请求行带完整 URL；直连时用 Host 头"""
+        if self.path.startswith("http"):
+            parts = urlsplit(self.path)
+        else:
+            parts = urlsplit(f"http://{self.headers.get('Host', '')}{self.path}")
+        return parts.hostname or "", parts.port or 80, parts.path or "/", parse_qs(parts.query)
+
+    def reply(self, status, body=b"", content_type="text/plain; charset=utf-8", headers=None):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def refuse(self):
+        """模拟端口不通：不回任何响应直接断开"""
+        self.close_connection = True
+        try:
+            self.connection.shutdown(2)
+        except OSError:
+            pass
+
+    def do_GET(self):
+        rng = random.Random()
+        world = self.world
+        host, port, path, query = self.target()
+        try:
+            if path.startswith("/__sim/"):
+                return self.control(path)
+            time.sleep(world.latency(rng))
+            if host in PROXY_HOSTS:
+                return self.proxy(path, query, rng)
+            if host == FOFA_HOST:
+                return self.fofa(query)
+            if host == CLOUDFLARE_HOST:
+                return self.cloudflare(path)
+            return self.upstream(host, port, path)
+        except (BrokenPipeError, ConnectionResetError):
+            world.count("client", "disconnected")
+
+    do_HEAD = do_GET
+    do_POST = do_GET
+    do_DELETE = do_GET
+
+    def body_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    # ---------- 控制接口 ----------
+    def control(self, path):
+        world = self.world
+        if path == "/__sim/tcp":
+            pairs = self.body_json().get("pairs", [])
+            opened = [[ip, port] for ip, port in pairs if world.is_open(ip, port)]
+            world.count("tcp", "open")
+            return self.reply(200, json.dumps({"open": opened}), "application/json")
+        if path == "/__sim/stats":
+            with world.lock:
+                data = {route: dict(c) for route, c in world.stats.items()}
+            return self.reply(200, json.dumps(data, ensure_ascii=False), "application/json")
+        if path == "/__sim/reset":
+            with world.lock:
+                world.stats.clear()
+            return self.reply(200, "ok")
+        return self.reply(404, "unknown control path")
+
+    # ---------- cqshushu ----------
+    def proxy(self, path, query, rng):
+        world = self.world
+        s = world.s
+        target = query.get("s", [""])[0]
+        if not target:
+            world.count("home", "ok")
+            return self.reply(200, world.home_page(), "text/html; charset=utf-8")
+        if rng.random() < s["blocked_rate"]:
+            world.count("proxy", "blocked")
+            return self.reply(200, "<html><body>请稍候，正在验证您的访问...</body></html>", "text/html; charset=utf-8")
+        if rng.random() < s["error_rate"]:
+            code = rng.choice(s["error_codes"])
+            world.count("proxy", f"http_{code}")
+            return self.reply(code, f"error {code}", headers={"Retry-After": "1"} if code in (429, 503) else None)
+        ip, _, port = target.rpartition(":")
+        if not port.isdigit() or not world.is_open(ip, port):
+            time.sleep(s["proxy_closed_ms"] / 1000)
+            world.count("proxy", "closed")
+            return self.reply(200, "未找到可用频道", "text/html; charset=utf-8")
+        kind = query.get("t", ["multicast"])[0]
+        world.count("proxy", "hit")
+        return self.reply(200, world.playlist(ip, port, kind), "audio/x-mpegurl; charset=utf-8")
+
+    # ---------- fofa ----------
+    def fofa(self, query):
+        world = self.world
+        try:
+            ip = base64.b64decode(query.get("qbase64", [""])[0]).decode()
+        except Exception:
+            ip = ""
+        ports = [p for p in TARGET_PORTS if world.is_open(ip, p)]
+        world.count("fofa", "ok")
+        items = "".join(f'<a class="port-item" href="#">{p}</a><span>{ip}:{p}</span>' for p in ports)
+        return self.reply(200, f"<html><body>{items}</body></html>", "text/html; charset=utf-8")
+
+    # ---------- Cloudflare ----------
+    def cloudflare(self, path):
+        world = self.world
+        world.count("cloudflare", self.command)
+        if self.command in ("POST", "PUT"):
+            self.body_json()
+        if path.endswith("/zones"):
+            result = [{"id": "sim-zone", "name": "example.com"}]
+        elif self.command == "GET":
+            result = []
+        else:
+            result = {"id": "sim-record"}
+        return self.reply(200, json.dumps({"success": True, "errors": [], "result": result}), "application/json")
+
+    # ---------- 上游服务器（udpxy / msd_lite / 酒店） ----------
+    def upstream(self, host, port, path):
+        world = self.world
+        if path.endswith(".txt"):
+            # test.py 下载的 IP 列表之类的一次性文件
+            world.count("download", "ok")
+            return self.reply(200, "\n".join(ip for ip, _, _ in world.targets) + "\n")
+        if not world.is_open(host, port):
+            world.count("upstream", "refused")
+            return self.refuse()
+        service = world.service(host, port)
+        if path in ("/status", "/stat", "/"):
+            banner = {"udpxy": "udpxy status", "msd_lite": "msd_lite: Multi stream daemon",
+                      "hotel": "ZHGXTV iptv", "http": "It works"}[service]
+            world.count("fingerprint", service)
+            return self.reply(200, f"<html><body>{banner}</body></html>", "text/html", {"Server": service})
+        mode = world.stream_mode(host, port, path)
+        world.count("stream", mode)
+        if mode == "error":
+            return self.reply(503, "Service Unavailable")
+        if mode == "html":
+            return self.reply(200, "<html><body>404 Not Found</body></html>", "text/html")
+        if path.endswith(".m3u8"):
+            body = "#EXTM3U\n#EXT-X-VERSION:3\n#EXT-X-TARGETDURATION:2\n" + "".join(
+                f"#EXTINF:2.0,\nseg{n}.ts\n" for n in range(3))
+            return self.reply(200, body, "application/vnd.apple.mpegurl")
+        return self.stream(mode, path.endswith(".ts"))
+
+    def stream(self, mode, finite):
+        s = self.world.s
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "video/mp2t")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        if mode == "truncated":
+            self.wfile.write(ts_packets(s["truncate_packets"]))
+            return
+        if mode == "slow_drip":
+            for n in range(int(s["stream_seconds"] / s["drip_interval"]) + 1):
+                self.wfile.write(ts_packets(1, n))
+                self.wfile.flush()
+                time.sleep(s["drip_interval"])
+            return
+        # 正常流：按码率每 0.1 秒发一批包；分片只发 2 秒
+        per_tick = max(1, int(s["bitrate"] / 8 / TS_PACKET / 10))
+        seconds = 2 if finite else s["stream_seconds"]
+        began = time.monotonic()
+        n = 0
+        while time.monotonic() - began < seconds:
+            self.wfile.write(ts_packets(per_tick, n))
+            self.wfile.flush()
+            n += per_tick
+            time.sleep(0.1)
+
+
+class SimServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def serve(scenario, host=HOST, port=PORT):
+    """在后台线程启动替身服务器，返回 server（server.shutdown() 结束）"""
+    handler = type("SimHandler", (Handler,), {"world": World(scenario)})
+    server = SimServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="cqshushu / udpxy / 酒店 / Cloudflare 离线替身服务器")
+    parser.add_argument("scenario", nargs="?", default="default", help=f"内置场景 {list(SCENARIOS)} 或 JSON 文件")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--write-home", metavar="PATH", help="把模拟首页写到文件（如 data/shushu_home.html）后继续运行")
+    args = parser.parse_args()
+
+    scenario = load_scenario(args.scenario)
+    server = serve(scenario, args.host, args.port)
+    world = server.RequestHandlerClass.world
+    if args.write_home:
+        with open(args.write_home, "w", encoding="utf-8") as f:
+            f.write(world.home_page())
+    print(f"🧪 替身服务器已启动: http://{args.host}:{args.port}  场景: {args.scenario}  目标 {len(world.targets)} 个")
+    print(f"   使用方法: IPTV_SIM_URL=http://{args.host}:{args.port} python py/zubo_final.py")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
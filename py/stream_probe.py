@@ -0,0 +1,225 @@
+import time
+from urllib.parse import urljoin
+
+import http_client
+
+# ===============================
+# 配置区：MPEG-TS 流探测
+# ===============================
+TS_PACKET = 188             # TS 包长
+TS_SYNC = 0x47              # TS 同步字节
+CONNECT_TIMEOUT = 10        # 建连超时（秒）
+READ_TIMEOUT = 10           # 等响应头、以及读流数据时两次数据之间的超时（秒）
+# 单次探测从发出请求算起的总时长上限（秒）：慢速滴流每次都在读超时之内送来一点数据，单靠读超时永远等不完
+MAX_SECONDS = 20.0
+CHUNK_BYTES = 16 * 1024
+WINDOW_BYTES = 512 * 1024   # 最多读取的字节数
+WINDOW_SECONDS = 4.0        # 最长测速窗口（秒）
+MIN_PACKETS = 64            # 连续对齐这么多个 TS 包才算确认是 TS 流
+MIN_SECONDS = 1.0           # 确认后至少再测这么久，码率才有参考价值
+HLS_DEPTH = 2               # m3u8 最多向下跟两层（主列表 → 子列表 → 分片）
+HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
+
+
+class StreamMetrics:
+    """一次流探测的结构化结果，供清理脚本判存活、合并脚本排序使用"""
+    __slots__ = ("url", "ok", "reason", "status", "content_type", "ttfb", "bytes",
+                 "duration", "bitrate", "packets", "sync_ratio")
+
+    def __init__(self, url):
+        self.url = url
+        self.ok = False
+        self.reason = ""          # ts / html / not_ts / empty / too_slow / http_xxx / hls_* / http_client 的错误类别
+        self.status = None        # HTTP 状态码
+        self.content_type = ""
+        self.ttfb = None          # 发出请求到收到首个数据块（秒）
+        self.bytes = 0            # 测速窗口内读到的字节数
+        self.duration = 0.0       # 测速窗口时长（首字节之后，秒）
+        self.bitrate = None       # 持续码率（bit/s）
+        self.packets = 0          # 对齐的 TS 包数
+        self.sync_ratio = 0.0     # 188 字节步长上 0x47 命中比例
+
+    def __bool__(self):
+        return self.ok
+
+    def __repr__(self):
+        rate = f"{self.bitrate / 1e6:.2f}Mbps" if self.bitrate else "-"
+        ttfb = f"{self.ttfb * 1000:.0f}ms" if self.ttfb is not None else "-"
+        return f"StreamMetrics({self.reason}, ttfb={ttfb}, rate={rate})"
+
+
+class TSScanner:
+    """增量检查 188 字节步长上的 0x47 同步字节"""
+
+    def __init__(self):
+        self.buf = b""
+        self.offset = None     # 首个对齐位置
+        self.checked = 0
+        self.synced = 0
+
+    def feed(self, chunk):
+        self.buf += chunk
+        if self.offset is None:
+            self.offset = self._find_offset()
+            if self.offset is None:
+                # 保留尾部不足三个包的数据，下次继续找
+                self.buf = self.buf[-TS_PACKET * 3:]
+                return
+            self.buf = self.buf[self.offset:]
+        usable = len(self.buf) - len(self.buf) % TS_PACKET
+        for pos in range(0, usable, TS_PACKET):
+            self.checked += 1
+            if self.buf[pos] == TS_SYNC:
+                self.synced += 1
+        self.buf = self.buf[usable:]
+
+    def _find_offset(self):
+        limit = min(len(self.buf) - TS_PACKET * 2, TS_PACKET)
+        for i in range(max(limit, 0)):
+            if (self.buf[i] == TS_SYNC and self.buf[i + TS_PACKET] == TS_SYNC
+                    and self.buf[i + TS_PACKET * 2] == TS_SYNC):
+                return i
+        return None
+
+    @property
+    def ratio(self):
+        return self.synced / self.checked if self.checked else 0.0
+
+
+def hls_next_uri(text, base_url):
+    """m3u8：取第一个子列表或分片地址"""
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            return urljoin(base_url, line)
+    return None
+
+
+def iter_chunks(response, size=CHUNK_BYTES):
+    """
+    逐块读响应体。urllib3 2.x 的 read1 有多少数据就返回多少，慢速滴流也能及时回到调用方检查总时长；
+    没有 read1 的旧版 urllib3 退回 iter_content（凑满一块才返回）
+    """
+    read1 = getattr(response.raw, "read1", None)
+    if read1 is None:
+        yield from response.iter_content(chunk_size=size)
+        return
+    while True:
+        chunk = read1(size, decode_content=True)
+        if not chunk:
+            return
+        yield chunk
+
+
+def probe_stream(url, headers=HEADERS, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 window_bytes=WINDOW_BYTES, window_seconds=WINDOW_SECONDS,
+                 min_packets=MIN_PACKETS, min_seconds=MIN_SECONDS, client=None,
+                 max_seconds=MAX_SECONDS, _depth=0):
+    """
+    读取一个有限窗口的数据：记录首字节时间、持续码率，并校验 TS 同步字节。
+    确认是 TS 流且测够 min_seconds 后提前结束。
+    HTML 错误页、非 TS 数据都判为不可用；m3u8 会跟到分片再测。
+    read_timeout 经 (connect, read) 超时元组作用于每一次读；整次探测另受 max_seconds 限制，
+    到点还没确认是 TS 流的判为 too_slow。
+    """
+    metrics = StreamMetrics(url)
+    http = client or http_client.client()
+    began = time.monotonic()
+    stop_at = began + max_seconds
+    response = None
+    try:
+        response = http.get(url, "stream", headers=headers, stream=True, timeout=(connect_timeout, read_timeout))
+        metrics.status = response.status_code
+        metrics.content_type = response.headers.get("Content-Type", "").lower()
+        if response.status_code != 200:
+            metrics.reason = f"http_{response.status_code}"
+            return metrics
+
+        scanner = TSScanner()
+        first_at = None
+        first_len = 0
+        expired = False
+        for chunk in iter_chunks(response):
+            now = time.monotonic()
+            if not chunk:
+                continue
+            if first_at is None:
+                first_at = now
+                first_len = len(chunk)
+                metrics.ttfb = now - began
+                stripped = chunk[:512].lstrip()
+                if stripped.startswith(b"#EXTM3U"):
+                    return probe_hls(metrics, response, chunk, url, headers, connect_timeout, read_timeout,
+                                     window_bytes, window_seconds, min_packets, min_seconds, client,
+                                     stop_at, _depth)
+                if stripped[:1] == b"<" or "text/html" in metrics.content_type:
+                    metrics.reason = "html"
+                    return metrics
+            metrics.bytes += len(chunk)
+            scanner.feed(chunk)
+            metrics.duration = now - first_at
+            confident = scanner.synced >= min_packets and scanner.ratio >= 0.95
+            if confident and metrics.duration >= min_seconds:
+                break
+            if metrics.bytes >= window_bytes or metrics.duration >= window_seconds:
+                break
+            if now >= stop_at:
+                expired = True
+                break
+
+        metrics.packets = scanner.synced
+        metrics.sync_ratio = scanner.ratio
+        if metrics.bytes == 0:
+            metrics.reason = "empty"
+        elif scanner.synced >= min_packets and scanner.ratio >= 0.95:
+            metrics.ok = True
+            metrics.reason = "ts"
+        elif expired:
+            metrics.reason = "too_slow"
+        else:
+            metrics.reason = "not_ts"
+        if metrics.duration > 0:
+            # 首块数据多为服务端缓冲，码率只按首块之后的数据计算
+            metrics.bitrate = (metrics.bytes - first_len) * 8 / metrics.duration
+        return metrics
+    except Exception as e:
+        # 建连/读流过程中的网络错误按类别记录（dns / connect / read_timeout ...）
+        metrics.reason = http_client.classify(e)
+        return metrics
+    finally:
+        if response is not None:
+            response.close()
+
+
+def probe_hls(metrics, response, first_chunk, url, headers, connect_timeout, read_timeout,
+              window_bytes, window_seconds, min_packets, min_seconds, client, stop_at, depth):
+    """
+    m3u8 列表：读完列表文本，跟进第一个子列表/分片，沿用其测速结果，首字节时间取列表本身的。
+    stop_at 为整次探测的截止时刻（time.monotonic），子探测只用剩下的时间
+    """
+    body = first_chunk
+    for chunk in iter_chunks(response):
+        body += chunk
+        if len(body) > 256 * 1024 or time.monotonic() >= stop_at:
+            break
+    next_url = hls_next_uri(body.decode("utf-8", "replace"), response.url or url)
+    if next_url is None:
+        metrics.reason = "hls_empty"
+        return metrics
+    if depth >= HLS_DEPTH:
+        metrics.reason = "hls_too_deep"
+        return metrics
+    remaining = stop_at - time.monotonic()
+    if remaining <= 0:
+        metrics.reason = "too_slow"
+        return metrics
+    inner = probe_stream(next_url, headers, connect_timeout, read_timeout, window_bytes, window_seconds,
+                         min_packets, min_seconds, client, remaining, depth + 1)
+    metrics.ok = inner.ok
+    metrics.reason = f"hls_{inner.reason}" if not inner.reason.startswith("hls_") else inner.reason
+    metrics.bytes = inner.bytes
+    metrics.duration = inner.duration
+    metrics.bitrate = inner.bitrate
+    metrics.packets = inner.packets
+    metrics.sync_ratio = inner.sync_ratio
+    return metrics
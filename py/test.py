@@ -1,10 +1,12 @@
-import requests
 import random
 import time
 import os
 import sys
 import json
 
+import http_client
+import instrument
+
 # ============ 强制实时输出（关键！让 GitHub Actions 日志实时滚动） ============
 sys.stdout.reconfigure(line_buffering=True)
 
@@ -38,8 +40,7 @@ print(f"✅ 共 {len(CF_ACCOUNTS)} 个 Cloudflare 账号，涉及 {sum(len(acc['
 def get_random_ips_from_url(ip_url, count):
     print(f"正在从 {ip_url} 下载 IP 列表...", flush=True)
     try:
-        r = requests.get(ip_url, timeout=15)
-        r.raise_for_status()
+        r = http_client.get(ip_url, "download", raise_for_status=True)
         ips = [line.strip() for line in r.text.splitlines() if line.strip()]
         if len(ips) < count:
             raise Exception(f"IP 数量不足（需要 {count}，实际 {len(ips)}）")
@@ -52,8 +53,7 @@ def get_random_ips_from_url(ip_url, count):
 def get_zone_id(domain, token):
     url = f"https://api.cloudflare.com/client/v4/zones?name={domain}"
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    r = requests.get(url, headers=headers, timeout=10)
-    r.raise_for_status()
+    r = http_client.get(url, "api", headers=headers, raise_for_status=True)
     data = r.json()
     if data["success"] and data["result"]:
         return data["result"][0]["id"]
@@ -62,15 +62,13 @@ def get_zone_id(domain, token):
 def get_existing_a_records(zone_id, subdomain, token):
     url = f"https://api.cloudflare.com/client/v4/zones/{zone_id}/dns_records?type=A&name={subdomain}"
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    r = requests.get(url, headers=headers, timeout=10)
-    r.raise_for_status()
+    r = http_client.get(url, "api", headers=headers, raise_for_status=True)
     return r.json().get("result", [])
 
 def delete_record(zone_id, record_id, token):
     url = f"https://api.cloudflare.com/client/v4/zones/{zone_id}/dns_records/{record_id}"
     headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-    r = requests.delete(url, headers=headers, timeout=10)
-    r.raise_for_status()
+    r = http_client.delete(url, "api", headers=headers, raise_for_status=True)
     data = r.json()
     if data["success"]:
         print(f"✅ 删除旧记录成功: {record_id}", flush=True)
@@ -87,8 +85,7 @@ def add_a_record(zone_id, subdomain, ip, token):
         "ttl": TTL,
         "proxied": PROXIED
     }
-    r = requests.post(url, headers=headers, json=payload, timeout=10)
-    r.raise_for_status()
+    r = http_client.post(url, "api", headers=headers, json=payload, raise_for_status=True)
     data = r.json()
     if data["success"]:
         print(f"✅ 添加成功: {subdomain} -> {ip}", flush=True)
@@ -127,7 +124,7 @@ def main():
             print(f"   发现 {len(existing)} 条旧 A 记录，正在删除...", flush=True)
             for rec in existing:
                 delete_record(zone_id, rec["id"], token)
-                time.sleep(0.2)
+                instrument.sleep(0.2, "pacing")
 
             # 添加新记录
             print(f"   添加 {RECORDS_PER_DOMAIN} 条新 A 记录...", flush=True)
@@ -139,7 +136,7 @@ def main():
                 ip_index += 1
                 try:
                     add_a_record(zone_id, subdomain, ip, token)
-                    time.sleep(0.2)
+                    instrument.sleep(0.2, "pacing")
                 except Exception as e:
                     print(f"❌ 添加失败: {e}", flush=True)
 
@@ -1,69 +1,33 @@
 import os
-import re
-import requests
-import time
+
+from liveness import check_files
+from stream_probe import probe_stream
+from probe_cache import ProbeCache
+from history_store import HistoryStore
+import atomic_output
+from merge_zubo import MERGED_FILES
 
 # ===============================
 # 配置区
 # ===============================
 ZUBO_DIR = "zubo"
-# 明确不参与清理的文件名
-EXCLUDE_FILES = ["zuboall.m3u"] 
+# 明确不参与清理的文件名（merge_zubo 的合并产物）
+EXCLUDE_FILES = list(MERGED_FILES)
 
 SAMPLE_COUNT = 3               # 每个文件抽测 3 个频道
 CHECK_TIMEOUT = 15             # 连接超时 15s
 STREAM_READ_TIMEOUT = 10       # 读取流数据等待 10s
+MAX_CONNECTIONS = 32           # 所有文件一起并发检测时的全局连接上限
+PER_HOST_LIMIT = 2             # 同一 udpxy 服务器的并发上限
+HISTORY_DIR = os.path.join(ZUBO_DIR, "history")   # 与扫描脚本共用的历史目录（本脚本写 zubo_cleanup 分段）
 HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
 
 def check_zubo_stream(url):
     """
-    深度检测：连通性 + 缓冲推流检测
+    深度检测：连通性 + TS 推流检测
+    读一个有限窗口，校验 0x47 同步字节，返回首字节时间/码率等结构化结果（StreamMetrics）
     """
-    try:
-        # 1. 尝试建立连接
-        response = requests.get(url, headers=HEADERS, timeout=CHECK_TIMEOUT, stream=True)
-        
-        if response.status_code == 200:
-            # 2. 核心：给流一点起步时间（2秒）
-            time.sleep(2) 
-            
-            # 3. 尝试读取数据块
-            # 只要能在 10s 内读到任何内容，说明此源在推流，即为有效
-            for chunk in response.iter_content(chunk_size=1024):
-                if chunk:
-                    return True 
-                break 
-        return False
-    except:
-        return False
-    finally:
-        try:
-            response.close()
-        except:
-            pass
-
-def is_zubo_file_alive(file_path):
-    """判断组播 m3u 文件是否有效"""
-    try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-        
-        # 提取链接
-        links = re.findall(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', content)
-        if not links:
-            return False
-        
-        # 顺序抽测样本，只要有一个频道通了，整个 IP 文件就保留
-        test_links = links[:SAMPLE_COUNT]
-        for link in test_links:
-            if check_zubo_stream(link):
-                return True
-            time.sleep(1.5) # 频道间稍作停顿
-            
-        return False
-    except Exception as e:
-        print(f" ⚠️ 读档异常: {e}", end="")
-        return False
+    return probe_stream(url, headers=HEADERS, connect_timeout=CHECK_TIMEOUT, read_timeout=STREAM_READ_TIMEOUT)
 
 def main():
     if not os.path.exists(ZUBO_DIR):
@@ -71,7 +35,7 @@ def main():
         return
 
     print(f"🔍 开始深度维护组播源目录: {ZUBO_DIR}")
-    # 获取所有 m3u 文件，但排除掉 zuboall.m3u
+    # 获取所有 m3u 文件，但排除掉汇总文件 zuboall.m3u / zuboall_backup.m3u
     files = [f for f in os.listdir(ZUBO_DIR) if f.endswith(".m3u") and f not in EXCLUDE_FILES]
     
     # 打印一下排除信息，心里有底
@@ -79,20 +43,38 @@ def main():
         if os.path.exists(os.path.join(ZUBO_DIR, ex_file)):
             print(f"🛡️  已保护文件: {ex_file} (跳过清理)")
 
+    # 所有文件一起并发检测，每个文件顺序抽测前 SAMPLE_COUNT 个频道，只要有一个频道通了整个 IP 文件就保留
+    def report(result):
+        status = "✅ 正常" if result.alive else "❌ 无推流 (已清理)"
+        passed = [m for m in result.metrics if m.ok]
+        if passed:
+            best = passed[0]
+            status += f" (首字节 {best.ttfb * 1000:.0f}ms, 码率 {(best.bitrate or 0) / 1e6:.2f}Mbps)"
+        print(f"📡 {os.path.basename(result.path)} ... {status}", flush=True)
+
+    paths = [os.path.join(ZUBO_DIR, filename) for filename in files]
+    # 新鲜的历史结论（见 probe_cache 的正/负 TTL）直接复用，不再重复探测
+    cache = ProbeCache()
+    cache.prune()
+    stats = {}
+    results = check_files(paths, check_zubo_stream, sample=SAMPLE_COUNT,
+                          max_connections=MAX_CONNECTIONS, per_host=PER_HOST_LIMIT, on_result=report, stats=stats,
+                          cache=cache)
+    cache.close()
+    print(f"🔗 {stats['files']} 个文件共引用 {stats['hosts']} 个上游 host:port，实际探测 {stats['probes']} 次，命中缓存 {stats['cached']} 个")
+
+    # 检测结论按 host 写回历史：失效的 ip:port 不再被扫描脚本当作"已存"跳过
+    history = HistoryStore(HISTORY_DIR, "zubo_cleanup")
     removed_count = 0
-    for filename in files:
-        file_path = os.path.join(ZUBO_DIR, filename)
-        print(f"📡 正在检测状态: {filename} ... ", end="", flush=True)
-        
-        if not is_zubo_file_alive(file_path):
-            print("❌ 无推流 (已清理)")
-            os.remove(file_path)
+    verdicts = {}
+    for file_path in paths:
+        result = results[file_path]
+        verdicts.update(result.verdicts)
+        if not result.alive:
+            atomic_output.remove(file_path)
             removed_count += 1
-        else:
-            print("✅ 正常")
-        
-        # 文件间冷却，防止请求太密集
-        time.sleep(2)
+    history.record_verdicts(verdicts)
+    history.compact()
 
     print(f"\n✨ 清理工作结束！共移除 {removed_count} 个失效源文件。")
 
@@ -1,23 +1,33 @@
-import requests
 import re
 import os
-import time
-import base64
 import random
 import sys
 from datetime import datetime
 
+from scanner import run_batch, ProbeError
+from history_store import HistoryStore
+from discovery import load_targets
+import atomic_output
+import http_client
+from http_client import HttpError
+
 # ======================
 # 配置区
 # ======================
 LOCAL_SOURCE = "data/shushu_home.html"
 OUTPUT_DIR = "zubo"
-HISTORY_FILE = os.path.join(OUTPUT_DIR, "history.txt")
+# 历史记录：每个脚本一个追加分段，按 ip / ip:port 索引，过期时间见 history_store.HISTORY_TTL
+HISTORY_DIR = os.path.join(OUTPUT_DIR, "history")
+HISTORY_WRITER = "zubo_final"
 TIMEOUT = 25  # 增加超时容忍度
+# 先直连做 TCP 建连 + udpxy/msd_lite 指纹预筛，只把开放的端口交给限速的代理站（见 prefilter.py）
+PREFILTER = True
+# 每次运行从持久队列里按优先级领取的目标数（原先固定取页面最后 10 个）
+SCAN_BUDGET = 10
 
-# 重新排列端口：把你确定的 8880 放在最前面，增加成功率
-PRIMARY_PORTS = [6636, 16888, 5002, 3333, 8188, 8055, 8288, 8822, 5050, 8880, 5555, 55555, 58888, 7000, 7700, 6003, 9988, 9999, 8012, 6011, 8888, 4022, 8188, 8022, 7777, 5146, 5140, 4056, 12320, 
-    10000, 8080, 8000, 9901, 8090, 8181, 1234, 4000, 4001, 5148, 12345, 8805, 8187, 9926, 8222, 8808, 8883, 8686, 8188, 4023, 8848, 6666, 
+# 候选端口（已去重）；实际探测顺序由 port_rank 根据历史命中按目标重新排序
+PRIMARY_PORTS = [6636, 16888, 5002, 3333, 8188, 8055, 8288, 8822, 5050, 8880, 5555, 55555, 58888, 7000, 7700, 6003, 9988, 9999, 8012, 6011, 8888, 4022, 8022, 7777, 5146, 5140, 4056, 12320, 
+    10000, 8080, 8000, 9901, 8090, 8181, 1234, 4000, 4001, 5148, 12345, 8805, 8187, 9926, 8222, 8808, 8883, 8686, 4023, 8848, 6666, 
     9000, 9001, 888, 9003, 8082, 20443, 85, 8081, 8001, 8003, 6001, 8899
 ]
 
@@ -37,13 +47,10 @@ def log_process(msg, end='\n'):
 
 def scan_zubo(ip, port):
     url = f"https://iptv.cqshushu.com/index.php?s={ip}:{port}&t=multicast&channels=1&download=m3u"
-    sys.stdout.write(f"    🔎 尝试端口 {port: <5} ... ")
-    sys.stdout.flush()
+    tag = f"    🔎 {ip}:{port: <5} ... "
     
     try:
-        # 更加随机的等待，模拟人工操作
-        time.sleep(random.uniform(4, 7))
-        
+        # 节奏控制交给扫描引擎的全局/单 IP 限速，这里不再逐端口 sleep
         headers = {
             "User-Agent": get_random_ua(),
             "Referer": "https://iptv.cqshushu.com/",
@@ -51,7 +58,7 @@ def scan_zubo(ip, port):
         }
         
         # 组播探测
-        res = requests.get(url, headers=headers, timeout=TIMEOUT)
+        res = http_client.get(url, "proxy", headers=headers, timeout=TIMEOUT)
         
         if res.status_code == 200:
             content = res.text
@@ -62,87 +69,54 @@ def scan_zubo(ip, port):
                 total = rtp_count + http_count
                 
                 if total > 0:
-                    sys.stdout.write(f"【✅ 成功: 发现 {total} 条频道】\n")
+                    log_process(f"{tag}【✅ 成功: 发现 {total} 条频道】")
                     return content
                 else:
-                    sys.stdout.write("【✕ 列表为空】\n")
+                    log_process(f"{tag}【✕ 列表为空】")
             elif "请稍候" in content:
-                sys.stdout.write("【🛡️ 被拦截/需验证】\n")
+                log_process(f"{tag}【🛡️ 被拦截/需验证】")
+                # 被拦截不代表端口关闭，不能记进断点，下次续跑再试
+                raise ProbeError("blocked")
             else:
-                sys.stdout.write("【✕ 非直播流文件】\n")
+                log_process(f"{tag}【✕ 非直播流文件】")
         else:
-            sys.stdout.write(f"【✕ 状态码 {res.status_code}】\n")
+            log_process(f"{tag}【✕ 状态码 {res.status_code}】")
+            if res.status_code >= 500:
+                raise ProbeError(f"http_{res.status_code}")
             
-    except Exception as e:
-        sys.stdout.write(f"【⏰ 失败/超时】\n")
+    except HttpError as e:
+        log_process(f"{tag}【⏰ 失败/超时: {e.category}】")
+        # 代理读超时说明目标端口不通；其他网络错误出在代理站本身，不算关闭
+        if e.category != http_client.READ_TIMEOUT:
+            raise ProbeError(e.category)
     
-    sys.stdout.flush()
     return None
 
+def save_result(ip, port, content, history):
+    # 寻找供应商标签
+    m = re.search(r'group-title="([^"]+)"', content)
+    tag = re.sub(r'[\\/:*?"<>|]', '', m.group(1).split()[-1] if m else "Zubo")
+    
+    filename = f"{tag}_{ip.replace('.', '_')}_{port}.m3u"
+    atomic_output.write_text(os.path.join(OUTPUT_DIR, filename), content)
+    
+    history.success(ip, port)
+
 def main():
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     log_process("🚀 组播源深度采集任务启动")
     
-    history_ips = set()
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-            for line in f:
-                if ":" in line:
-                    history_ips.add(line.split(':')[0].strip())
+    history = HistoryStore(HISTORY_DIR, HISTORY_WRITER)
 
     if not os.path.exists(LOCAL_SOURCE):
         log_process(f"❌ 找不到源码: {LOCAL_SOURCE}")
         return
 
-    with open(LOCAL_SOURCE, "r", encoding="utf-8") as f:
-        html = f.read()
-
-    # 提取所有 gotoIP 里面的 multicast IP
-    matches = re.findall(r"gotoIP\('([^']+)',\s*'multicast'\)", html)
-    
-    extracted_ips = []
-    for b64_str in matches:
-        try:
-            b64_str += '=' * (-len(b64_str) % 4)
-            ip = base64.b64decode(b64_str).decode('utf-8')
-            if re.match(r"^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$", ip):
-                if ip not in extracted_ips:
-                    extracted_ips.append(ip)
-        except: continue
-
-    # 取最新的 10 个组播源
-    target_ips = extracted_ips[::-1][:10]
-    log_process(f"📊 扫描到 {len(target_ips)} 个有效 IP 目标")
-
-    for idx, ip in enumerate(target_ips, 1):
-        if ip in history_ips:
-            log_process(f"⏭️  [{idx}/{len(target_ips)}] 跳过已存 IP: {ip}")
-            continue
-        
-        log_process(f"📡 [{idx}/{len(target_ips)}] 扫描目标: {ip}")
-        found = False
-        
-        for port in PRIMARY_PORTS:
-            content = scan_zubo(ip, port)
-            if content:
-                # 寻找供应商标签
-                m = re.search(r'group-title="([^"]+)"', content)
-                tag = re.sub(r'[\\/:*?"<>|]', '', m.group(1).split()[-1] if m else "Zubo")
-                
-                filename = f"{tag}_{ip.replace('.', '_')}_{port}.m3u"
-                with open(os.path.join(OUTPUT_DIR, filename), "w", encoding="utf-8") as f:
-                    f.write(content)
-                
-                with open(HISTORY_FILE, "a", encoding="utf-8") as hf:
-                    hf.write(f"{ip}:{port}\n")
-                
-                found = True
-                break
-        
-        if not found:
-            log_process(f"❌ {ip} 暂未探测到开放的组播服务")
-        
-        time.sleep(3)
+    # 解析页面里所有 multicast 目标，与历史比对后放进持久队列，再按优先级领取 SCAN_BUDGET 个（流程见 scanner.run_batch）
+    targets = load_targets(LOCAL_SOURCE, ("multicast",))
+    run_batch("multicast", HISTORY_WRITER, targets, scan_zubo, PRIMARY_PORTS, history, OUTPUT_DIR,
+              on_hit=lambda ip, port, content: save_result(ip, port, content, history),
+              budget=SCAN_BUDGET, prefilter=PREFILTER, log=log_process)
 
     log_process("✨ 任务结束")
 
@@ -1,11 +1,25 @@
 import os
 import re
 
+import merge_cache
+import atomic_output
+from m3u_parser import iter_channels
+import m3u_parser
+import rtp_index
+from rtp_index import RtpIndex
+from merge_zubo import MERGED_FILES
+
 # 配置路径
 SOURCE_DIR = "zubo"
 RTP_TARGET_DIR = "py/rtp"
 LOG_FILE = "py/rtp/mapping_log.txt"
 
+SD_RE = re.compile(r'(SD|标清)')
+SUFFIX_RE = re.compile(r'(HD|SD|4K|8K|高清|标清|超清|超高|频道)$')
+DIGITS_RE = re.compile(r'(\d+)')
+QUALITY_RE = re.compile(r'(HD|高清|标清|SD)')
+HD_SUFFIX_RE = re.compile(r'(HD|高清)$', re.IGNORECASE)
+
 def get_sort_key(line):
     """
     智能排序与分类逻辑：
@@ -14,75 +28,78 @@ def get_sort_key(line):
     channel_name = line.split(',')[0].upper()
     
     # 1. 优先级判断：如果是 SD/标清，第一项设为 1，否则为 0。这样排序时 SD 会在最后。
-    is_sd = 1 if re.search(r'(SD|标清)', channel_name) else 0
+    is_sd = 1 if SD_RE.search(channel_name) else 0
     
     # 2. 提取核心名用于自然排序 (CCTV1 < CCTV10)
-    core_name = re.sub(r'(HD|SD|4K|8K|高清|标清|超清|超高|频道)$', '', channel_name).strip()
-    parts = [int(s) if s.isdigit() else s for s in re.split(r'(\d+)', core_name)]
+    core_name = SUFFIX_RE.sub('', channel_name).strip()
+    parts = [int(s) if s.isdigit() else s for s in DIGITS_RE.split(core_name)]
     
     return (is_sd, parts, channel_name)
 
+def parse_file(file_path):
+    """一个 zubo 文件里的 [(运营商, 组播地址, 服务器, 频道名), ...]"""
+    rows = []
+    try:
+        for ch in iter_channels(file_path):
+            if not ch.line or "/rtp/" not in ch.url:
+                continue
+            head, rtp_addr = ch.url.split("/rtp/", 1)
+            isp_name = ch.group.split()[-1] if ch.group.split() else "未知运营商"
+            server = head.split("://", 1)[-1]
+            rows.append((isp_name, rtp_addr.strip(), server, ch.name.strip().replace("-", "")))
+    except OSError:
+        pass
+    return rows
+
+def render_isp(rtp_map):
+    """{组播地址: [频道名, ...]} -> 列表文本（同源去重 + 自然排序 + SD 沉底）"""
+    processed_entries = []
+
+    for rtp_addr, names in rtp_map.items():
+        # 同源去重逻辑：如果一个地址对应多个名字（全纪实、全纪实HD）
+        if len(names) > 1:
+            # 优先保留不带 HD/高清 后缀的最短名字，使名字规范化
+            # 例如：['全纪实', '全纪实HD'] -> 保留 '全纪实'
+            best_name = sorted(names, key=lambda x: len(QUALITY_RE.sub('', x)))[0]
+            # 再次清理一次 best_name，去掉可能残留的后缀
+            best_name = HD_SUFFIX_RE.sub('', best_name).strip()
+        else:
+            best_name = names[0]
+
+        processed_entries.append(f"{best_name},rtp://{rtp_addr}")
+
+    # 应用自定义排序：自然排序 + SD 沉底
+    return "".join(line + "\n" for line in sorted(processed_entries, key=get_sort_key))
+
 def extract_and_classify():
     if not os.path.exists(RTP_TARGET_DIR):
         os.makedirs(RTP_TARGET_DIR, exist_ok=True)
 
-    rtp_data_storage = {} # { isp: { rtp_url: [name1, name2] } }
-    
     if not os.path.exists(SOURCE_DIR):
         return
 
-    for filename in os.listdir(SOURCE_DIR):
-        if not filename.endswith(".m3u"): continue
-        file_path = os.path.join(SOURCE_DIR, filename)
-        
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except: continue
-
-        pattern = re.compile(r'#EXTINF:-1.*?group-title="(.*?)",(.*?)\n.*?/rtp/(.*)')
-        matches = pattern.findall(content)
-
-        for group_info, channel_name, rtp_addr in matches:
-            isp_name = group_info.split()[-1] if group_info.split() else "未知运营商"
-            clean_name = channel_name.strip().replace("-", "")
-            clean_rtp = f"rtp://{rtp_addr.strip()}"
-            
-            if isp_name not in rtp_data_storage:
-                rtp_data_storage[isp_name] = {}
-            
-            # --- 核心改进：以 RTP 地址为 Key 收集频道名 ---
-            if clean_rtp not in rtp_data_storage[isp_name]:
-                rtp_data_storage[isp_name][clean_rtp] = []
-            rtp_data_storage[isp_name][clean_rtp].append(clean_name)
+    # 索引里只重新解析变化过的 zubo 文件，也只重写受影响的运营商列表；合并产物不是地区源，排除
+    files = sorted(f for f in os.listdir(SOURCE_DIR) if f.endswith(".m3u") and f not in MERGED_FILES)
+    index = RtpIndex()
+    rules = merge_cache.rules_fingerprint(__file__, m3u_parser.__file__, rtp_index.__file__)
+    affected, stats = index.sync(SOURCE_DIR, files, parse_file, rules)
+    print(f"♻️  复用 {stats['reused']} 个 / 重新解析 {stats['parsed']} 个 / 移除 {stats['removed']} 个 zubo 文件")
 
     # --- 写入与高级去重阶段 ---
     print("💾 正在执行同源去重与 SD 沉底排序...")
-    for isp_name, rtp_map in rtp_data_storage.items():
-        processed_entries = []
-        
-        for rtp_url, names in rtp_map.items():
-            # 同源去重逻辑：如果一个地址对应多个名字（全纪实、全纪实HD）
-            if len(names) > 1:
-                # 优先保留不带 HD/高清 后缀的最短名字，使名字规范化
-                # 例如：['全纪实', '全纪实HD'] -> 保留 '全纪实'
-                best_name = sorted(names, key=lambda x: len(re.sub(r'(HD|高清|标清|SD)', '', x)))[0]
-                # 再次清理一次 best_name，去掉可能残留的后缀
-                best_name = re.sub(r'(HD|高清)$', '', best_name, flags=re.IGNORECASE).strip()
-            else:
-                best_name = names[0]
-            
-            processed_entries.append(f"{best_name},{rtp_url}")
-
-        # 应用自定义排序：自然排序 + SD 沉底
-        sorted_entries = sorted(processed_entries, key=get_sort_key)
-        
+    written = 0
+    for isp_name in sorted(affected):
         target_file = os.path.join(RTP_TARGET_DIR, f"{isp_name}.txt")
-        with open(target_file, 'w', encoding='utf-8') as tf:
-            for line in sorted_entries:
-                tf.write(line + "\n")
+        rtp_map = index.isp_channels(isp_name)
+        if not rtp_map:
+            # 该运营商的源全部消失
+            written += atomic_output.remove(target_file)
+            continue
+        written += atomic_output.write_text(target_file, render_isp(rtp_map))
+    index.prune()
+    index.close()
 
-    print(f"✅ 处理完成！同源 HD 已合并，SD 频道已移至文件末尾。")
+    print(f"✅ 处理完成！{len(affected)} 个运营商受影响，更新 {written} 个列表。")
 
 if __name__ == "__main__":
     extract_and_classify()
@@ -1,23 +1,38 @@
-import requests
 import re
 import os
-import time
 import base64
 import random
-from datetime import datetime
+
+from scanner import run_batch, ProbeError
+from history_store import HistoryStore
+from discovery import parse_targets
+import scheduler
+import atomic_output
+import instrument
+import http_client
+from http_client import HttpError
 
 # ======================
 # 配置区 (保持你原来的)
 # ======================
 HOME_URL = "https://iptv.cqshushu.com/"
 OUTPUT_DIR = "zubo"
-HISTORY_FILE = os.path.join(OUTPUT_DIR, "history.txt")
-MAX_IP_COUNT = 6  
+# 历史记录与 zubo_final 共用 zubo/history 目录，但写自己的分段；
+# 旧版每周一整体删除 history.txt，现在改为每条记录按 HISTORY_TTL 自然过期
+HISTORY_DIR = os.path.join(OUTPUT_DIR, "history")
+HISTORY_WRITER = "zubobsk"
+# 每次运行从持久队列里按优先级领取的目标数（与 zubo_final 共用 multicast 队列）
+SCAN_BUDGET = 6
 TIMEOUT = 12
+# 先直连做 TCP 建连 + udpxy/msd_lite 指纹预筛，只把开放的端口交给代理站（见 prefilter.py）
+PREFILTER = True
+# 一次 fofa 查询的预估耗时（含 8~15 秒的人工节奏）；剩余预算不够时后面的目标不再查 fofa
+FOFA_COST = 20
 
+# 候选端口（已去重）；实际探测顺序由 port_rank 根据历史命中按目标重新排序
 PRIMARY_MULTICAST_PORTS = [
-    6636, 16888, 5002, 3333, 8188, 8055, 8288, 8880, 5555, 55555, 58888, 7000, 7700, 6003, 9988, 9999, 8012, 10000, 8888, 4022, 8188, 8022, 7777, 5146, 5140, 4056, 12320, 
-    10000, 8080, 8000, 9901, 8090, 8181, 1234, 4000, 4001, 5148, 12345, 8805, 8187, 9926, 8222, 8808, 8883, 8686, 8188, 4023, 8848, 6666, 
+    6636, 16888, 5002, 3333, 8188, 8055, 8288, 8880, 5555, 55555, 58888, 7000, 7700, 6003, 9988, 9999, 8012, 10000, 8888, 4022, 8022, 7777, 5146, 5140, 4056, 12320, 
+    8080, 8000, 9901, 8090, 8181, 1234, 4000, 4001, 5148, 12345, 8805, 8187, 9926, 8222, 8808, 8883, 8686, 4023, 8848, 6666, 
     9000, 9001, 888, 9003, 8082, 20443, 85, 8081, 8001, 8003, 6001, 8899
 ]
 
@@ -26,81 +41,78 @@ UA_LIST = [
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36"
 ]
 
-def manage_history():
-    if datetime.now().weekday() == 0:
-        if os.path.exists(HISTORY_FILE):
-            os.remove(HISTORY_FILE)
-    history_ips = set()
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-            for line in f:
-                if ":" in line:
-                    history_ips.add(line.split(':')[0].strip())
-    return history_ips
-
-def save_history(ip, port):
-    with open(HISTORY_FILE, "a", encoding="utf-8") as f:
-        f.write(f"{ip}:{port}\n")
-
 def get_headers():
     return {"User-Agent": random.choice(UA_LIST), "Referer": "https://fofa.info/"}
 
 def get_fofa_ports(ip):
-    time.sleep(random.uniform(8, 15))
+    instrument.sleep(random.uniform(8, 15), "pacing")
     try:
         query = base64.b64encode(ip.encode()).decode()
-        res = requests.get(f"https://fofa.info/result?qbase64={query}", headers=get_headers(), timeout=15)
+        res = http_client.get(f"https://fofa.info/result?qbase64={query}", "page", headers=get_headers(), timeout=15)
         ports = set(re.findall(rf'{ip}:(\d+)', res.text) + re.findall(r'port-item.*?(\d+)</a>', res.text, re.S))
         return sorted([int(p) for p in ports if int(p) not in {22, 23, 443, 80, 53, 3306, 3389}])
-    except: return []
+    except HttpError as e:
+        print(f"⚠️ fofa 查询 {ip} 失败: {e.category}")
+        return []
 
 def scan_ip_port(ip, port):
     url = f"https://iptv.cqshushu.com/?s={ip}:{port}&t=multicast&channels=1&download=m3u"
     try:
-        time.sleep(random.uniform(2, 4))
-        res = requests.get(url, headers=get_headers(), timeout=TIMEOUT)
+        res = http_client.get(url, "proxy", headers=get_headers(), timeout=TIMEOUT)
         if res.status_code == 200 and "#EXTINF" in res.text:
             return res.text
-    except: pass
+        if "请稍候" in res.text or res.status_code >= 500:
+            # 被拦截/代理出错不代表端口关闭，不能记进断点
+            raise ProbeError("blocked" if res.status_code < 500 else f"http_{res.status_code}")
+    except HttpError as e:
+        if e.category != http_client.READ_TIMEOUT:
+            raise ProbeError(e.category)
     return None
 
+def save_result(ip, port, content, history):
+    # --- 重点：只在这里增加提取地区运营商的逻辑 ---
+    provider = "未知"
+    match = re.search(r'group-title="([^"]+)"', content)
+    if match:
+        # 提取 group-title 的内容并简单清洗
+        title = match.group(1).replace("组播", "").strip()
+        provider = title.split()[-1] if " " in title else title
+    
+    # 按照你的要求命名
+    filename = f"{provider}-{ip.replace('.', '_')}.m3u"
+    
+    atomic_output.write_text(os.path.join(OUTPUT_DIR, filename), content)
+    history.success(ip, port)
+    print(f"✅ 成功! 保存为: {filename}")
+
+def fofa_lookup(ips, novelty, deadline):
+    """fofa 查询很慢：按新颖度先查最有价值的目标，预算只够扫描时剩下的目标直接用端口字典"""
+    fofa_ports = {}
+    for ip in sorted(ips, key=lambda ip: -novelty.get(ip, 1.0)):
+        if not deadline.allows(FOFA_COST):
+            print(f"⏳ 时间预算不足，跳过 {len(ips) - len(fofa_ports)} 个目标的 fofa 查询")
+            break
+        fofa_ports[ip] = get_fofa_ports(ip)
+    return fofa_ports
+
 def main():
+    # 首页抓取也算进时间预算
+    deadline = scheduler.Deadline()
     os.makedirs(OUTPUT_DIR, exist_ok=True)
-    history_ips = manage_history()
+    history = HistoryStore(HISTORY_DIR, HISTORY_WRITER)
     
     try:
-        r = requests.get(HOME_URL, headers=get_headers(), timeout=TIMEOUT)
-        # 这里用你最原始的正则逻辑
-        ips = list(dict.fromkeys(re.findall(r"\b(?:\d{1,3}\.){3}\d{1,3}\b", r.text)))
-        target_ips = [ip for ip in ips if not ip.startswith("127")][-MAX_IP_COUNT:]
-    except: return
+        r = http_client.get(HOME_URL, "page", headers=get_headers(), timeout=TIMEOUT)
+        # 页面上显示的 IP 是打码的，真实地址在 gotoIP('<base64>', 'multicast') 里
+        targets = parse_targets(r.text, ("multicast",))
+    except HttpError as e:
+        print(f"❌ 首页抓取失败: {e.category}")
+        return
 
-    for ip in target_ips:
-        if ip in history_ips: continue
-        
-        f_ports = get_fofa_ports(ip)
-        test_ports = f_ports + [p for p in PRIMARY_MULTICAST_PORTS if p not in f_ports]
-        
-        for port in test_ports:
-            content = scan_ip_port(ip, port)
-            if content:
-                # --- 重点：只在这里增加提取地区运营商的逻辑 ---
-                provider = "未知"
-                match = re.search(r'group-title="([^"]+)"', content)
-                if match:
-                    # 提取 group-title 的内容并简单清洗
-                    title = match.group(1).replace("组播", "").strip()
-                    provider = title.split()[-1] if " " in title else title
-                
-                # 按照你的要求命名
-                filename = f"{provider}-{ip.replace('.', '_')}.m3u"
-                
-                with open(os.path.join(OUTPUT_DIR, filename), "w", encoding="utf-8") as f:
-                    f.write(content)
-                save_history(ip, port)
-                print(f"✅ 成功! 保存为: {filename}")
-                break
-        time.sleep(random.uniform(5, 10))
+    # fofa 报告的端口排在端口字典前面，并作为"已知开放"参与期望收益排序（流程见 scanner.run_batch）
+    run_batch("multicast", HISTORY_WRITER, targets, scan_ip_port, PRIMARY_MULTICAST_PORTS, history, OUTPUT_DIR,
+              on_hit=lambda ip, port, content: save_result(ip, port, content, history),
+              budget=SCAN_BUDGET, deadline=deadline, prefilter=PREFILTER, known_ports=fofa_lookup)
 
 if __name__ == "__main__":
     main()